@@ -11,6 +11,7 @@ sys.path.append(os.path.dirname(__file__))
 from database.plot_api import PlotAPI
 from database.database_api import CharacterAPI
 from database.storyline_database import StorylineAPI
+from database.async_api import AsyncStorylineAPI, get_database_executor
 from agents import Agent, Runner
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
@@ -77,14 +78,13 @@ class AILongTermPlanner:
     def _get_story_context(self) -> str:
         """获取当前故事上下文"""
         
-        # 获取最新章节
+        # 获取最新章节（从第1章起连续的章节）
         all_chapters = []
-        for i in range(1, 100):  # 假设最多100章
-            ch = self.plot_api.get_chapter_by_number(i)
-            if ch:
-                all_chapters.append(ch)
-            else:
+        for ch in self.plot_api.get_chapters_in_range(
+                1, columns=['title', 'summary', 'plot_point']):
+            if ch['chapter_number'] != len(all_chapters) + 1:
                 break
+            all_chapters.append(ch)
         
         if not all_chapters:
             return "当前没有任何章节"
@@ -110,7 +110,7 @@ class AILongTermPlanner:
         
         print(f"🎬 AI长期规划师正在规划第{current_chapter}章之后的故事弧线...")
         
-        context = self._get_story_context()
+        context = await get_database_executor().read(self._get_story_context)
         
         prompt = f"""
 {context}
@@ -235,8 +235,13 @@ class AIShortTermPlanner:
         
         context = []
         
+        # 最近3章（一次查询）
+        recent = self.plot_api.get_chapters_in_range(
+            max(1, chapter_number - 3), chapter_number - 1,
+            columns=['title', 'summary', 'key_events', 'mood'])
+        
         # 前一章
-        prev_ch = self.plot_api.get_chapter_by_number(chapter_number - 1)
+        prev_ch = recent[-1] if recent and recent[-1]['chapter_number'] == chapter_number - 1 else None
         if prev_ch:
             context.append(f"上一章（第{chapter_number-1}章）: {prev_ch['title']}")
             context.append(f"摘要: {prev_ch.get('summary', '')[:300]}")
@@ -244,10 +249,8 @@ class AIShortTermPlanner:
         
         # 最近3章趋势
         context.append("\n最近章节趋势:")
-        for i in range(max(1, chapter_number - 3), chapter_number):
-            ch = self.plot_api.get_chapter_by_number(i)
-            if ch:
-                context.append(f"  第{i}章: {ch['title']} - {ch.get('mood', '')}")
+        for ch in recent:
+            context.append(f"  第{ch['chapter_number']}章: {ch['title']} - {ch.get('mood', '')}")
         
         return "\n".join(context)
     
@@ -290,8 +293,11 @@ class AIShortTermPlanner:
         
         print(f"📋 AI短期规划师正在为第{chapter_number}章生成指导...")
         
-        chapter_context = self._get_chapter_context(chapter_number)
-        character_notes = self._get_character_notes(arc_plan.get('character_focus', []))
+        executor = get_database_executor()
+        chapter_context, character_notes = await asyncio.gather(
+            executor.read(self._get_chapter_context, chapter_number),
+            executor.read(self._get_character_notes, arc_plan.get('character_focus', []))
+        )
         
         # 计算在弧线中的位置
         end_chapter = arc_plan.get('estimated_end_chapter') or arc_plan.get('end_chapter', chapter_number + 10)
@@ -439,6 +445,7 @@ class AIStoryPlanningManager:
         self.long_term_planner = AILongTermPlanner()
         self.short_term_planner = AIShortTermPlanner()
         self.current_arc_plan = None
+        self.async_storyline_api = AsyncStorylineAPI(self.long_term_planner.storyline_api)
     
     async def get_chapter_guidance(self, chapter_number: int) -> str:
         """获取章节的完整规划指导"""
@@ -447,11 +454,11 @@ class AIStoryPlanningManager:
         print(f"🎯 AI规划系统：为第{chapter_number}章生成规划")
         print("=" * 60)
         
-        # 1. 从数据库获取主线/支线上下文
-        storyline_context = self.long_term_planner.storyline_api.format_context_for_ai(chapter_number)
-        
-        # 2. 获取当前活跃支线
-        active_storyline = self.long_term_planner.storyline_api.db.get_active_storyline(chapter_number)
+        # 1. 从数据库获取主线/支线上下文，2. 获取当前活跃支线（并发查询）
+        storyline_context, active_storyline = await asyncio.gather(
+            self.async_storyline_api.format_context_for_ai(chapter_number),
+            self.async_storyline_api.get_active_storyline(chapter_number)
+        )
         
         if active_storyline is None:
             print("⚠️ 没有活跃支线，需要AI生成新支线")
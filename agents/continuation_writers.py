@@ -15,6 +15,7 @@ sys.path.append(os.path.dirname(__file__))
 
 from database.plot_api import PlotAPI
 from database.database_api import CharacterAPI
+from database.async_api import AsyncPlotAPI, AsyncCharacterAPI, get_database_executor
 from ai_story_planner import AIStoryPlanningManager
 from agents import Agent, Runner
 from pydantic import BaseModel
@@ -168,24 +169,29 @@ class StoryPlanner:
         context.append("=" * 50)
         
         start = max(1, current_chapter - num_chapters)
-        for ch_num in range(start, current_chapter):
-            chapter = self.plot_api.get_chapter_by_number(ch_num)
-            if chapter:
-                context.append(f"\n第{ch_num}章: {chapter['title']}")
-                
-                # 优先使用notes字段（完整正文或详细总结），否则使用summary
-                detailed_content = chapter.get('notes', '') or chapter.get('summary', '')
-                
-                # 如果是最后一章（即上一章），提供更详细的内容
-                if ch_num == current_chapter - 1 and detailed_content:
-                    context.append(f"详细内容: {detailed_content[:2000]}...")  # 最多显示2000字
-                else:
-                    context.append(f"摘要: {chapter['summary']}")
-                
-                context.append(f"情节要点: {chapter['plot_point']}")
-                context.append(f"关键事件: {chapter['key_events']}")
-                context.append(f"角色焦点: {chapter['character_focus']}")
-                context.append(f"场景: {chapter['setting']}")
+        chapters = self.plot_api.get_chapters_in_range(
+            start, current_chapter - 1,
+            columns=['id', 'title', 'summary', 'plot_point', 'key_events',
+                     'character_focus', 'setting'])
+        for chapter in chapters:
+            ch_num = chapter['chapter_number']
+            context.append(f"\n第{ch_num}章: {chapter['title']}")
+            
+            # 如果是最后一章（即上一章），提供正文开头（最多2000字，无正文时使用summary）
+            detailed_content = ""
+            if ch_num == current_chapter - 1:
+                detailed_content = (self.plot_api.get_chapter_text_head(chapter['id'], 2000)
+                                    or chapter.get('summary', ''))
+            
+            if detailed_content:
+                context.append(f"详细内容: {detailed_content}...")
+            else:
+                context.append(f"摘要: {chapter['summary']}")
+            
+            context.append(f"情节要点: {chapter['plot_point']}")
+            context.append(f"关键事件: {chapter['key_events']}")
+            context.append(f"角色焦点: {chapter['character_focus']}")
+            context.append(f"场景: {chapter['setting']}")
         
         return "\n".join(context)
     
@@ -200,10 +206,10 @@ class StoryPlanner:
         context.append("=" * 50)
         
         # 直接列出早期章节的标题和简要信息
-        for ch_num in range(1, current_chapter - 10):
-            chapter = self.plot_api.get_chapter_by_number(ch_num)
-            if chapter:
-                context.append(f"第{ch_num}章: {chapter['title']} - {chapter.get('plot_point', '')}")
+        chapters = self.plot_api.get_chapters_in_range(
+            1, current_chapter - 11, columns=['title', 'plot_point'])
+        for chapter in chapters:
+            context.append(f"第{chapter['chapter_number']}章: {chapter['title']} - {chapter.get('plot_point', '')}")
         
         return "\n".join(context)
     
@@ -281,23 +287,11 @@ class StoryPlanner:
         context.append("\n👥 相关角色信息：")
         context.append("=" * 50)
         
+        # 预渲染的500字角色卡片，一次读取
+        cards = self.character_api.get_character_cards(character_names, 500)
         for name in character_names:
-            character = self.character_api.get_character(name)
-            if character and isinstance(character, dict):
-                context.append(f"\n{name}:")
-                context.append(f"  背景: {character.get('background_story', '')[:200]}")
-                
-                if 'bloodline' in character and character['bloodline']:
-                    bloodline = character['bloodline']
-                    if isinstance(bloodline, dict):
-                        context.append(f"  血统: {bloodline.get('bloodline_level', '')}级")
-                        context.append(f"  言灵: {bloodline.get('spirit_words', '')}")
-                
-                if 'personality_traits' in character and character['personality_traits']:
-                    traits = character['personality_traits']
-                    if isinstance(traits, list):
-                        trait_list = [t.get('trait', str(t)) if isinstance(t, dict) else str(t) for t in traits[:5]]
-                        context.append(f"  性格: {', '.join(trait_list)}")
+            if name in cards:
+                context.append(f"\n{cards[name]}")
         
         return "\n".join(context)
     
@@ -309,17 +303,24 @@ class StoryPlanner:
         # 构建上下文
         context_parts = []
         
+        # AI双层规划（LLM调用）与数据库上下文查询并发进行，查询在数据库线程池中执行
+        main_characters = ["路明非", "芬格尔", "诺诺", "楚子航", "恺撒"]
+        executor = get_database_executor()
+        ai_guidance, earlier_summary, recent_chapters, character_info = await asyncio.gather(
+            self.ai_planning_manager.get_chapter_guidance(next_chapter_number),
+            executor.read(self._get_earlier_chapters_summary, next_chapter_number),
+            executor.read(self._get_recent_chapters_context, next_chapter_number, 10),
+            executor.read(self._get_character_info, main_characters)
+        )
+        
         # ========== AI生成的双层规划 ==========
-        ai_guidance = await self.ai_planning_manager.get_chapter_guidance(next_chapter_number)
         context_parts.append(ai_guidance)
         
         # 早期章节概览
-        earlier_summary = self._get_earlier_chapters_summary(next_chapter_number)
         if earlier_summary:
             context_parts.append(earlier_summary)
         
         # 最近章节详细
-        recent_chapters = self._get_recent_chapters_context(next_chapter_number, 10)
         context_parts.append(recent_chapters)
         
         # 原文最后几段参考（用于保持文风一致）
@@ -328,8 +329,6 @@ class StoryPlanner:
             context_parts.append(original_text)
         
         # 主要角色信息
-        main_characters = ["路明非", "芬格尔", "诺诺", "楚子航", "恺撒"]
-        character_info = self._get_character_info(main_characters)
         context_parts.append(character_info)
         
         context = "\n".join(context_parts)
@@ -432,6 +431,8 @@ class StoryWriter:
     def __init__(self):
         self.plot_api = PlotAPI()
         self.character_api = CharacterAPI()
+        self.async_plot_api = AsyncPlotAPI(self.plot_api)
+        self.async_character_api = AsyncCharacterAPI(self.character_api)
         
         self.agent = Agent(
             name="龙族写作师",
@@ -551,19 +552,26 @@ class StoryWriter:
         
         print(f"✍️ 开始写作第{outline.chapter_number}章...")
         
+        # 上一章和涉及角色并发查询（不阻塞事件循环）
+        char_names = list(outline.character_arcs.keys())
+        lookups = [self.async_character_api.get_character_cards(char_names, 150)]
+        if outline.chapter_number > 1:
+            # 上一章正文的最后1000字直接从正文存储的结尾片段读取，无需解压全文
+            lookups.append(self.async_plot_api.get_chapter_tail_by_number(
+                outline.chapter_number - 1, 1000))
+        results = await asyncio.gather(*lookups)
+        cards = results[0]
+        prev_ch = results[1] if outline.chapter_number > 1 else None
+        
         # 获取上一章的详细内容作为衔接
         prev_chapter_context = ""
         if outline.chapter_number > 1:
-            prev_ch = self.plot_api.get_chapter_by_number(outline.chapter_number - 1)
             if prev_ch:
-                # 优先使用notes字段存储的完整文本，否则使用summary
-                full_text = prev_ch.get('notes', '') or prev_ch.get('summary', '')
-                
-                # 如果文本很长，取最后1000字作为衔接参考
-                if len(full_text) > 1000:
-                    text_excerpt = "..." + full_text[-1000:]
+                # 优先使用正文结尾，没有保存正文时使用summary
+                if prev_ch['text_tail']:
+                    text_excerpt = "..." + prev_ch['text_tail']
                 else:
-                    text_excerpt = full_text
+                    text_excerpt = prev_ch.get('summary') or ''
                 
                 prev_chapter_context = f"""
 上一章详细内容（第{outline.chapter_number-1}章: {prev_ch['title']}）：
@@ -572,21 +580,8 @@ class StoryWriter:
 注：请根据上一章的结尾，自然地展开第{outline.chapter_number}章的内容。
 """
         
-        # 获取角色信息
-        character_details = []
-        for char_name in outline.character_arcs.keys():
-            character = self.character_api.get_character(char_name)
-            if character and isinstance(character, dict):
-                char_info = f"{char_name}: {character.get('background_story', '')[:150]}"
-                
-                # 添加性格特征
-                if 'personality_traits' in character and character['personality_traits']:
-                    traits = character['personality_traits']
-                    if isinstance(traits, list) and traits:
-                        trait_list = [t.get('trait', str(t)) if isinstance(t, dict) else str(t) for t in traits[:3]]
-                        char_info += f"  性格: {', '.join(trait_list)}"
-                
-                character_details.append(char_info)
+        # 获取角色信息（预渲染的150字角色卡片）
+        character_details = [cards[char_name] for char_name in char_names if char_name in cards]
         
         character_context = "\n".join(character_details) if character_details else "无特定角色信息"
         
@@ -697,6 +692,7 @@ class ContinuationManager:
         self.planner = StoryPlanner()
         self.writer = StoryWriter()
         self.plot_api = PlotAPI()
+        self.async_plot_api = AsyncPlotAPI(self.plot_api)
     
     async def continue_next_chapter(self, next_chapter_number: int) -> ChapterContent:
         """续写下一章（完整流程）"""
@@ -750,7 +746,7 @@ class ContinuationManager:
         print(f"\n💾 Step 3/3: 保存到数据库...")
         print("-" * 60)
         
-        self._save_to_database(chapter_content)
+        await self._save_to_database(chapter_content, outline)
         
         print(f"✅ 已保存到数据库")
         
@@ -774,10 +770,16 @@ class ContinuationManager:
         
         return summary
     
-    def _save_to_database(self, chapter: ChapterContent):
-        """保存到数据库"""
+    async def _save_to_database(self, chapter: ChapterContent, outline: Optional[PlotOutline] = None):
+        """
+        保存到数据库（经由单写线程队列）
         
-        chapter_id = self.plot_api.add_chapter(
+        章节信息、正文、角色发展轨迹和合并摘要失效在同一个事务中提交，
+        中途出错不会留下只写了一半的章节。
+        """
+        
+        session = self.plot_api.session()
+        staged = session.add_chapter(
             chapter_number=chapter.chapter_number,
             title=chapter.title,
             summary=chapter.summary,
@@ -788,12 +790,21 @@ class ContinuationManager:
             setting=chapter.setting,
             mood=chapter.mood,
             themes=chapter.themes,
-            notes=f"AI续写于{datetime.now().isoformat()}\n\n完整内容见文件: chapter_{chapter.chapter_number}_content.txt"
+            notes=f"AI续写于{datetime.now().isoformat()}",
+            make_canonical=True
         )
+        session.save_chapter_text(staged, chapter.content)
+        if outline:
+            for character_name, development in outline.character_arcs.items():
+                session.add_character_arc(character_name, staged, development=development)
+        # 新章节改变了包含它的合并摘要
+        session.invalidate_merge_summaries(chapter.chapter_number)
+        
+        await self.async_plot_api.commit_session(session)
         
-        print(f"  ✅ 章节信息已保存 (ID: {chapter_id})")
+        print(f"  ✅ 章节信息、正文和角色轨迹已保存 (ID: {staged.id})")
         
-        return chapter_id
+        return staged.id
     
     def _save_to_file(self, chapter: ChapterContent):
         """保存章节文本到文件"""
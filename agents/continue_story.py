@@ -16,12 +16,10 @@ async def continue_story(chapter_number: int = None):
     
     # 获取当前最新章节
     api = PlotAPI()
-    all_chapters = api.get_all_chapters()
     
     if not chapter_number:
         # 自动续写下一章
-        max_chapter = max(ch['chapter_number'] for ch in all_chapters) if all_chapters else 0
-        chapter_number = max_chapter + 1
+        chapter_number = api.get_max_chapter_number() + 1
     
     print(f"\n🚀 龙族续写工具")
     print("=" * 80)
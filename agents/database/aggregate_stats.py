@@ -0,0 +1,79 @@
+"""
+触发器维护的汇总统计
+统计值存放在 (name, value) 形式的统计表中，由来源表上的插入/更新/删除触发器
+增量维护（纯SQL，任何连接写入都会生效），读取统计只需一次主键查询
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+# 统计项：(统计名, 来源表, 键表达式, 数值表达式, 更新时需要重新计算的列)
+# 表达式中的 {row} 在触发器里替换为 new/old，在重建统计时替换为来源表名
+Counter = Tuple[str, str, str, str, Optional[List[str]]]
+
+
+def create_stats_table(cursor, stats_table: str):
+    """创建统计表"""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {stats_table} (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _add_sql(stats_table: str, key: str, amount: str) -> str:
+    """把amount累加到key对应统计值的语句"""
+    return (f"INSERT INTO {stats_table} (name, value) VALUES ({key}, {amount}) "
+            f"ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;")
+
+
+def create_counter(cursor, stats_table: str, counter: Counter):
+    """
+    为一个统计项创建插入/删除/更新触发器
+
+    注意：INSERT OR REPLACE 替换旧行时不会触发删除触发器，统计会偏大；
+    来源表的写入应使用 INSERT ... ON CONFLICT DO UPDATE，经过更新触发器。
+    """
+    name, source, key, amount, watch = counter
+    new_key, new_amount = key.format(row="new"), amount.format(row="new")
+    old_key, old_amount = key.format(row="old"), amount.format(row="old")
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {source}_{name}_ai AFTER INSERT ON {source}
+        BEGIN
+            {_add_sql(stats_table, new_key, new_amount)}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {source}_{name}_ad AFTER DELETE ON {source}
+        BEGIN
+            {_add_sql(stats_table, old_key, f"-({old_amount})")}
+        END
+    ''')
+    if watch:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {source}_{name}_au
+            AFTER UPDATE OF {", ".join(watch)} ON {source}
+            BEGIN
+                {_add_sql(stats_table, old_key, f"-({old_amount})")}
+                {_add_sql(stats_table, new_key, new_amount)}
+            END
+        ''')
+
+
+def rebuild_stats(cursor, stats_table: str, counters: List[Counter]):
+    """按来源表重新计算全部统计值（创建统计时回填，或数据不一致时修复）"""
+    cursor.execute(f'DELETE FROM {stats_table}')
+    for _, source, key, amount, _ in counters:
+        cursor.execute(f'''
+            INSERT INTO {stats_table} (name, value)
+            SELECT {key.format(row=source)}, SUM({amount.format(row=source)})
+            FROM {source} WHERE true GROUP BY 1
+            ON CONFLICT (name) DO UPDATE SET value = value + excluded.value
+        ''')
+
+
+def read_stats(cursor, stats_table: str) -> Dict[str, int]:
+    """读取全部统计值 {统计名: 值}"""
+    cursor.execute(f'SELECT name, value FROM {stats_table}')
+    return {row[0]: row[1] for row in cursor.fetchall()}
@@ -9,6 +9,7 @@ sys.path.append(os.path.dirname(__file__))
 from typing import List, Dict, Any, Optional
 import json
 import asyncio
+from extractive_summarizer import GENERATOR_ID as EXTRACTIVE_GENERATOR_ID, extract_merge_node
 from agents import Agent, Runner
 from pydantic import BaseModel
 
@@ -23,6 +24,23 @@ class ChapterAnalysisResult(BaseModel):
     mood: str
     themes: str
 
+def run_sync(coroutine):
+    """
+    在同步代码中运行协程（供保留同步接口的旧调用方使用）
+    
+    只能在没有运行中事件循环的线程中调用：在事件循环中同步等待会阻塞整个循环，
+    此时抛出RuntimeError，异步代码应直接await对应的*_async方法
+    （如PlotMergeSystem.merge_chapters_async）
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    coroutine.close()
+    raise RuntimeError("不能在运行中的事件循环里调用同步合并接口（会阻塞事件循环），"
+                       "请改为await对应的异步方法，如merge_chapters_async、"
+                       "format_merged_plot_summary_async、generate_merge_node_async")
+
 class AIMergeInterface:
     """AI合并接口"""
     
@@ -75,7 +93,24 @@ class AIMergeInterface:
         else:
             print("警告: 未提供OpenAI API密钥，将使用模拟模式")
     
+    @property
+    def generator_id(self) -> str:
+        """生成合并节点的方式（模型名，模拟模式为extractive），用于区分不同来源的缓存结果"""
+        return self.model if self.agent else EXTRACTIVE_GENERATOR_ID
+    
     def generate_merge_node(self, chapters: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        使用AI生成合并节点（同步包装，异步代码中请使用generate_merge_node_async）
+        
+        Args:
+            chapters: 章节信息列表
+            
+        Returns:
+            合并后的节点信息
+        """
+        return run_sync(self.generate_merge_node_async(chapters))
+    
+    async def generate_merge_node_async(self, chapters: List[Dict[str, Any]]) -> Dict[str, str]:
         """
         使用AI生成合并节点
         
@@ -92,19 +127,27 @@ class AIMergeInterface:
         if len(chapters) == 1:
             return self._single_chapter_merge(chapters[0])
         
-        # 检查是否已在事件循环中
-        try:
-            loop = asyncio.get_running_loop()
-            # 如果已在事件循环中，使用nest_asyncio
-            try:
-                import nest_asyncio
-                nest_asyncio.apply()
-            except ImportError:
-                print("⚠️ nest_asyncio未安装，尝试直接创建任务")
-            return asyncio.run(self._generate_merge_node_async(chapters))
-        except RuntimeError:
-            # 没有运行中的事件循环，正常运行
-            return asyncio.run(self._generate_merge_node_async(chapters))
+        return await self._generate_merge_node_async(chapters)
+    
+    async def generate_merge_nodes_async(self, chapter_groups: List[List[Dict[str, Any]]],
+                                         max_concurrency: int = 4) -> List[Dict[str, str]]:
+        """
+        并发生成多个互不依赖的合并节点
+        
+        Args:
+            chapter_groups: 每个合并节点的章节信息列表
+            max_concurrency: 同时进行的AI调用数上限
+            
+        Returns:
+            与chapter_groups顺序一致的合并节点
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def generate(chapters):
+            async with semaphore:
+                return await self.generate_merge_node_async(chapters)
+        
+        return await asyncio.gather(*(generate(chapters) for chapters in chapter_groups))
     
     async def _generate_merge_node_async(self, chapters: List[Dict[str, Any]]) -> Dict[str, str]:
         """异步生成合并节点"""
@@ -259,103 +302,8 @@ class AIMergeInterface:
         return validated_info
     
     def _simulate_ai_response(self, chapters: List[Dict[str, Any]]) -> Dict[str, str]:
-        """模拟AI响应（用于测试）"""
-        
-        # 使用简单的启发式规则生成合并节点
-        chapter_count = len(chapters)
-        
-        # 分析章节内容
-        all_summaries = " ".join([ch.get('summary', '') for ch in chapters])
-        all_titles = [ch.get('title', '') for ch in chapters]
-        
-        # 生成智能标题
-        if "龙王" in all_summaries:
-            title = f"龙王篇章（第{chapter_count}章合并）"
-        elif "学院" in all_summaries:
-            title = f"学院篇章（第{chapter_count}章合并）"
-        elif "血统" in all_summaries:
-            title = f"血统觉醒（第{chapter_count}章合并）"
-        elif "任务" in all_summaries:
-            title = f"任务篇章（第{chapter_count}章合并）"
-        else:
-            # 使用第一个和最后一个标题的关键词
-            first_title = all_titles[0] if all_titles else "未知"
-            last_title = all_titles[-1] if all_titles else "未知"
-            title = f"{first_title} → {last_title}"
-        
-        # 生成智能摘要
-        summary = f"【{chapter_count}个章节的合并摘要】"
-        
-        # 提取关键信息
-        key_themes = self._extract_themes(all_summaries)
-        key_characters = self._extract_characters(all_summaries)
-        
-        if key_themes:
-            summary += f" 核心围绕{', '.join(key_themes)}展开，"
-        
-        if key_characters:
-            summary += f" 主要角色{', '.join(key_characters)}经历了重要发展，"
-        
-        # 添加开头和结尾信息
-        if len(chapters) >= 2:
-            start_summary = chapters[0].get('summary', '')[:100]
-            end_summary = chapters[-1].get('summary', '')[:100]
-            summary += f" 从{start_summary}...发展到{end_summary}..."
-        
-        # 合并其他信息
-        plot_point = " → ".join([ch.get('plot_point', '') for ch in chapters if ch.get('plot_point')])
-        key_events = " → ".join([ch.get('key_events', '') for ch in chapters if ch.get('key_events')])
-        
-        # 合并角色焦点
-        characters = []
-        for ch in chapters:
-            if ch.get('character_focus'):
-                characters.extend(ch['character_focus'].split('，'))
-        character_focus = "，".join(list(set([c.strip() for c in characters if c.strip()])))
-        
-        setting = " → ".join([ch.get('setting', '') for ch in chapters if ch.get('setting')])
-        mood = "、".join(list(set([ch.get('mood', '') for ch in chapters if ch.get('mood')])))
-        themes = "、".join(list(set([ch.get('themes', '') for ch in chapters if ch.get('themes')])))
-        
-        return {
-            "title": title,
-            "summary": summary,
-            "plot_point": plot_point,
-            "key_events": key_events,
-            "character_focus": character_focus,
-            "setting": setting,
-            "mood": mood,
-            "themes": themes
-        }
-    
-    def _extract_themes(self, text: str) -> List[str]:
-        """提取主题关键词"""
-        themes = []
-        theme_keywords = {
-            "成长": ["成长", "发展", "变化", "成熟"],
-            "友谊": ["友谊", "朋友", "关系", "合作"],
-            "战斗": ["战斗", "对决", "攻击", "击败"],
-            "探索": ["探索", "发现", "寻找", "调查"],
-            "危机": ["危机", "危险", "威胁", "困境"],
-            "爱情": ["爱情", "感情", "喜欢", "心动"]
-        }
-        
-        for theme, keywords in theme_keywords.items():
-            if any(keyword in text for keyword in keywords):
-                themes.append(theme)
-        
-        return themes
-    
-    def _extract_characters(self, text: str) -> List[str]:
-        """提取角色关键词"""
-        characters = []
-        character_keywords = ["路明非", "诺诺", "恺撒", "楚子航", "昂热", "龙王", "叶胜", "亚纪"]
-        
-        for char in character_keywords:
-            if char in text:
-                characters.append(char)
-        
-        return characters
+        """模拟AI响应：没有API密钥或调用失败时用离线抽取式摘要生成合并节点"""
+        return extract_merge_node(chapters)
     
     def _fallback_merge(self, ai_content: str) -> Dict[str, str]:
         """AI响应解析失败时的备用方案"""
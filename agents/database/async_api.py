@@ -0,0 +1,157 @@
+"""
+数据库API的异步版本
+供异步的规划/写作流程使用：读操作在有界线程池中执行，写操作进入单写线程的队列
+按提交顺序串行执行。数据库访问不再阻塞事件循环，可以与LLM调用并发进行。
+"""
+
+import asyncio
+import functools
+import os
+import sys
+import threading
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+sys.path.append(os.path.dirname(__file__))
+
+from db_connection import is_write_method
+from plot_api import PlotAPI
+from database_api import CharacterAPI
+from storyline_database import StorylineAPI
+
+
+class DatabaseExecutor:
+    """数据库执行器：有界读线程池 + 单写线程队列"""
+
+    def __init__(self, max_readers: int = 4):
+        """
+        初始化执行器
+
+        Args:
+            max_readers: 并发读线程数量上限
+        """
+        self.max_readers = max_readers
+        self._readers = ThreadPoolExecutor(max_workers=max_readers,
+                                           thread_name_prefix="db-reader")
+        # 只有一个工作线程的线程池就是FIFO写队列：写操作按提交顺序逐个执行，
+        # SQLite同一时间本来也只允许一个写者，这样可以避免写者之间争锁
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
+    async def read(self, func: Callable, *args, **kwargs) -> Any:
+        """在读线程池中执行同步函数"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(func, *args, **kwargs))
+
+    async def write(self, func: Callable, *args, **kwargs) -> Any:
+        """把同步函数放入写队列执行（返回时写入已提交）"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True):
+        """关闭执行器"""
+        self._readers.shutdown(wait=wait)
+        self._writer.shutdown(wait=wait)
+
+
+# 全局执行器（所有异步API共享同一个写队列）
+_executor: Optional[DatabaseExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_database_executor() -> DatabaseExecutor:
+    """获取全局数据库执行器"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = DatabaseExecutor()
+        return _executor
+
+def shutdown_database_executor(wait: bool = True):
+    """关闭全局数据库执行器（下次使用时重新创建）"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def _materialize(result: Any) -> Any:
+    """
+    在执行器线程中读完惰性结果
+
+    迭代器（iter_*方法、get_plot_summary的'chapters'）在消费时才查询数据库，
+    原样返回会让查询在事件循环线程上执行，这里转为列表（字典中的迭代器值同样处理）。
+    """
+    if isinstance(result, Iterator):
+        return list(result)
+    if isinstance(result, dict) and any(isinstance(value, Iterator) for value in result.values()):
+        return {key: list(value) if isinstance(value, Iterator) else value
+                for key, value in result.items()}
+    return result
+
+
+def _call(func: Callable, *args, **kwargs) -> Any:
+    """调用同步方法并读完其中的惰性结果"""
+    return _materialize(func(*args, **kwargs))
+
+
+class _AsyncAPI:
+    """
+    同步API的异步包装
+
+    访问任意方法都返回对应的协程函数：用 @writes 标记的写方法进入写队列，
+    其余方法在读线程池中执行。返回迭代器的方法在执行器线程中读完，协程得到列表。
+    非方法属性原样返回。
+    """
+
+    def __init__(self, api: Any, executor: Optional[DatabaseExecutor] = None):
+        self.api = api
+        self.executor = executor or get_database_executor()
+
+    def _resolve(self, name: str) -> Any:
+        """查找同步API上的属性"""
+        return getattr(self.api, name)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        attr = self._resolve(name)
+        if not callable(attr):
+            return attr
+
+        run = self.executor.write if is_write_method(attr) else self.executor.read
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await run(_call, attr, *args, **kwargs)
+
+        return method
+
+
+class AsyncPlotAPI(_AsyncAPI):
+    """PlotAPI的异步版本"""
+
+    def __init__(self, api: Optional[PlotAPI] = None, executor: Optional[DatabaseExecutor] = None):
+        super().__init__(api or PlotAPI(), executor)
+
+
+class AsyncCharacterAPI(_AsyncAPI):
+    """CharacterAPI的异步版本（CharacterAPI只提供查询，全部在读线程池中执行）"""
+
+    def __init__(self, api: Optional[CharacterAPI] = None,
+                 executor: Optional[DatabaseExecutor] = None):
+        super().__init__(api or CharacterAPI(), executor)
+
+
+class AsyncStorylineAPI(_AsyncAPI):
+    """StorylineAPI的异步版本，同时提供底层StorylineDatabase的方法"""
+
+    def __init__(self, api: Optional[StorylineAPI] = None,
+                 executor: Optional[DatabaseExecutor] = None):
+        super().__init__(api or StorylineAPI(), executor)
+
+    def _resolve(self, name: str) -> Any:
+        if hasattr(self.api, name):
+            return getattr(self.api, name)
+        return getattr(self.api.db, name)
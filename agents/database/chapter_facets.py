@@ -0,0 +1,122 @@
+"""
+章节标签（facet）的拆分与索引
+章节的主要角色、场景、氛围、主题和关键事件以拼接字符串保存（不同写入方用“, ”“，”“、”“ → ”等分隔），
+这里统一拆分为单个取值，写入chapter_facets表并建索引，
+“某角色出现在哪些章节”“各主题出现的频率”等查询不再需要全表扫描和临时拆分字符串
+"""
+
+import re
+from typing import Iterable, List, Optional, Tuple
+
+# 建立标签索引的章节列
+FACET_COLUMNS = ("character_focus", "setting", "mood", "themes", "key_events")
+
+# 取值之间的分隔符
+_SEPARATORS = re.compile(r"\s*(?:[,，、;；|｜\n]|→|->)\s*")
+
+# 取值末尾的括号注释，如“路明非（梦境中的男子）”
+_ANNOTATION = re.compile(r"\s*[（(][^（）()]*[）)]\s*$")
+
+# 只去掉括号注释的列：角色名带注释时仍按角色名索引
+_NAME_FACETS = frozenset({"character_focus"})
+
+
+def split_facet_values(text: Optional[str], facet: Optional[str] = None) -> List[str]:
+    """
+    把拼接的标签字符串拆分为取值列表（去空白、去重，保持原顺序）
+
+    Args:
+        text: 拼接的字符串
+        facet: 所属的列；character_focus会去掉取值末尾的括号注释
+
+    Returns:
+        取值列表
+    """
+    if not text:
+        return []
+    # 先去掉括号内的分隔符，避免把注释拆开
+    text = re.sub(r"[（(][^（）()]*[）)]",
+                  lambda match: _SEPARATORS.sub(" ", match.group(0)), text)
+    values = []
+    for value in _SEPARATORS.split(text):
+        if facet in _NAME_FACETS:
+            value = _ANNOTATION.sub("", value)
+        value = value.strip()
+        if value:
+            values.append(value)
+    return list(dict.fromkeys(values))
+
+
+def merge_facet_values(texts: Iterable[Optional[str]], facet: Optional[str] = None) -> List[str]:
+    """拆分多个拼接字符串并合并取值（去重，保持首次出现的顺序）"""
+    values = []
+    for text in texts:
+        values.extend(split_facet_values(text, facet))
+    return list(dict.fromkeys(values))
+
+
+def create_facet_table(cursor):
+    """创建chapter_facets表和索引"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chapter_facets (
+            chapter_id INTEGER NOT NULL,
+            facet TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            value TEXT NOT NULL,
+            chapter_number INTEGER NOT NULL,
+            PRIMARY KEY (chapter_id, facet, position)
+        )
+    ''')
+    # 按取值查章节：(标签, 取值, 章节编号)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chapter_facets_value
+        ON chapter_facets (facet, value, chapter_number)
+    ''')
+    # 按章节范围统计取值：(标签, 章节编号)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chapter_facets_range
+        ON chapter_facets (facet, chapter_number, value)
+    ''')
+
+
+def facet_rows(chapter_id: int, chapter_number: int,
+               texts: Iterable[Optional[str]]) -> List[Tuple[int, str, int, str, int]]:
+    """章节对应的chapter_facets行，texts为按FACET_COLUMNS顺序的各列内容"""
+    rows = []
+    for facet, text in zip(FACET_COLUMNS, texts):
+        for position, value in enumerate(split_facet_values(text, facet)):
+            rows.append((chapter_id, facet, position, value, chapter_number))
+    return rows
+
+
+def index_chapter_facets(cursor, chapter_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    按chapters中的当前内容重建章节的标签行
+
+    Args:
+        cursor: 数据库游标（在调用方的事务中执行）
+        chapter_ids: 要重建的章节ID，None表示全部章节
+
+    Returns:
+        写入的标签行数
+    """
+    select = f"SELECT id, chapter_number, {', '.join(FACET_COLUMNS)} FROM chapters"
+    if chapter_ids is None:
+        cursor.execute("DELETE FROM chapter_facets")
+        chapters = cursor.execute(select).fetchall()
+    else:
+        chapters = []
+        for chapter_id in chapter_ids:
+            cursor.execute("DELETE FROM chapter_facets WHERE chapter_id = ?", (chapter_id,))
+            chapters.extend(cursor.execute(f"{select} WHERE id = ?", (chapter_id,)).fetchall())
+
+    rows = []
+    for chapter in chapters:
+        # 按列序号取值，普通元组和Record都适用
+        texts = [chapter[index] for index in range(2, 2 + len(FACET_COLUMNS))]
+        rows.extend(facet_rows(chapter[0], chapter[1], texts))
+    cursor.executemany('''
+        INSERT INTO chapter_facets (chapter_id, facet, position, value, chapter_number)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    return len(rows)
@@ -0,0 +1,66 @@
+"""
+章节正文存储格式
+正文以zlib压缩后按SHA-256内容寻址存放（相同正文只存一份），
+同时保存段落偏移和未压缩的开头/结尾片段，读取开头或结尾时无需解压全文
+"""
+
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, List, Tuple
+
+# 压缩格式（写入text_blobs.codec，以后更换压缩算法时旧数据仍可读取）
+TEXT_CODEC = "zlib"
+
+# 不压缩保存的开头/结尾长度（字符数）
+TEXT_EDGE_CHARS = 2000
+
+
+def content_hash(text: str) -> str:
+    """正文的SHA-256（十六进制）"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def paragraph_offsets(text: str) -> List[Tuple[int, int]]:
+    """
+    计算段落在正文中的位置
+
+    每个非空行算作一个段落（小说正文一行即一段），偏移不含行首尾空白。
+
+    Returns:
+        [(起始字符位置, 结束字符位置), ...]
+    """
+    offsets = []
+    position = 0
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if stripped:
+            start = position + line.index(stripped[0])
+            offsets.append((start, start + len(stripped)))
+        position += len(line) + 1
+    return offsets
+
+
+def pack_text(text: str) -> Dict[str, Any]:
+    """
+    把正文打包为text_blobs表的一行
+
+    Returns:
+        {hash, codec, content, char_length, paragraph_offsets, head, tail}
+    """
+    return {
+        "hash": content_hash(text),
+        "codec": TEXT_CODEC,
+        "content": zlib.compress(text.encode("utf-8"), 6),
+        "char_length": len(text),
+        "paragraph_offsets": json.dumps(paragraph_offsets(text), separators=(",", ":")),
+        "head": text[:TEXT_EDGE_CHARS],
+        "tail": text[-TEXT_EDGE_CHARS:],
+    }
+
+
+def unpack_text(codec: str, content: bytes) -> str:
+    """解压text_blobs.content"""
+    if codec != TEXT_CODEC:
+        raise ValueError(f"不支持的正文压缩格式: {codec}")
+    return zlib.decompress(content).decode("utf-8")
@@ -0,0 +1,154 @@
+"""
+章节树的惰性游标
+只在访问子节点时才查询数据库，用于展开大纲中的一部分而不加载整棵树
+"""
+
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class ChapterNode:
+    """
+    章节树节点
+
+    节点只持有本章节的一行数据；children/parent在首次访问时查询并缓存，
+    祖先、子孙、兄弟查询每次都直接走递归CTE。
+    """
+
+    def __init__(self, db, row: Dict[str, Any], columns: Optional[List[str]] = None):
+        """
+        Args:
+            db: PlotDatabase 实例
+            row: 章节数据（至少包含id、chapter_number、parent_chapter_id）
+            columns: 展开子节点时查询的列，None表示PlotDatabase.TREE_COLUMNS
+        """
+        self.db = db
+        self.row = row
+        self.columns = columns or db.TREE_COLUMNS
+        self._children: Optional[List['ChapterNode']] = None
+        self._parent: Optional['ChapterNode'] = None
+
+    def __getitem__(self, key: str) -> Any:
+        return self.row[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.row.get(key, default)
+
+    @property
+    def id(self) -> int:
+        return self.row['id']
+
+    @property
+    def chapter_number(self) -> int:
+        return self.row['chapter_number']
+
+    @property
+    def title(self) -> str:
+        return self.row.get('title', '')
+
+    @property
+    def has_children(self) -> bool:
+        """是否有子章节（不触发查询时依据child_count）"""
+        if self._children is not None:
+            return bool(self._children)
+        if 'child_count' in self.row:
+            return self.row['child_count'] > 0
+        return bool(self.children)
+
+    @property
+    def children(self) -> List['ChapterNode']:
+        """直接子章节（首次访问时查询）"""
+        if self._children is None:
+            self._children = [self._node(row) for row in
+                              self.db.get_child_chapters(self.id, self.columns)]
+            for child in self._children:
+                child._parent = self
+        return self._children
+
+    @property
+    def parent(self) -> Optional['ChapterNode']:
+        """父章节（首次访问时查询），根章节返回None"""
+        parent_id = self.row.get('parent_chapter_id')
+        if parent_id is None:
+            return None
+        if self._parent is None:
+            ancestors = self.db.get_chapter_ancestors(self.id, self.columns)
+            self._parent = self._node(ancestors[-1]) if ancestors else None
+        return self._parent
+
+    def ancestors(self) -> List['ChapterNode']:
+        """从根章节到父章节的路径"""
+        return [self._node(row) for row in self.db.get_chapter_ancestors(self.id, self.columns)]
+
+    def siblings(self, include_self: bool = False) -> List['ChapterNode']:
+        """兄弟章节"""
+        return [self._node(row) for row in
+                self.db.get_chapter_siblings(self.id, include_self, self.columns)]
+
+    def descendants(self, max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+        """子孙章节（一次递归查询，先序排列，带relative_depth）"""
+        return self.db.get_chapter_descendants(self.id, max_depth, self.columns)
+
+    def walk(self, max_depth: Optional[int] = None) -> Iterator['ChapterNode']:
+        """
+        先序遍历子树（不包含本节点），逐层按需展开
+
+        Args:
+            max_depth: 最多展开的层数，None表示不限
+        """
+        if max_depth is not None and max_depth <= 0:
+            return
+        for child in self.children:
+            yield child
+            if child.has_children:
+                yield from child.walk(None if max_depth is None else max_depth - 1)
+
+    def _node(self, row: Dict[str, Any]) -> 'ChapterNode':
+        return ChapterNode(self.db, row, self.columns)
+
+    def __repr__(self) -> str:
+        return f"ChapterNode(id={self.id}, chapter_number={self.chapter_number}, title={self.title!r})"
+
+
+class ChapterTreeCursor:
+    """
+    章节树游标
+
+    从根章节（或任一章节）出发逐层展开，只查询实际访问到的节点。
+    """
+
+    def __init__(self, db, columns: Optional[List[str]] = None):
+        """
+        Args:
+            db: PlotDatabase 实例
+            columns: 节点携带的列，None表示PlotDatabase.TREE_COLUMNS
+        """
+        self.db = db
+        self.columns = columns or db.TREE_COLUMNS
+        self._roots: Optional[List[ChapterNode]] = None
+
+    @property
+    def roots(self) -> List[ChapterNode]:
+        """根章节（首次访问时查询）"""
+        if self._roots is None:
+            self._roots = [ChapterNode(self.db, row, self.columns)
+                           for row in self.db.get_child_chapters(None, self.columns)]
+        return self._roots
+
+    def node(self, chapter_id: int) -> Optional[ChapterNode]:
+        """定位到指定章节"""
+        row = self.db.get_chapter(chapter_id)
+        return ChapterNode(self.db, row, self.columns) if row else None
+
+    def walk(self, max_depth: Optional[int] = None) -> Iterator[ChapterNode]:
+        """
+        先序遍历整片森林，逐层按需展开
+
+        Args:
+            max_depth: 最多展开的层数（1表示只列出根章节），None表示不限
+        """
+        if max_depth is not None and max_depth <= 0:
+            return
+        for root in self.roots:
+            yield root
+            if root.has_children:
+                yield from root.walk(None if max_depth is None else max_depth - 1)
@@ -0,0 +1,186 @@
+"""
+角色卡片渲染
+把角色档案渲染为完整版、500字版和150字版三种长度的文本卡片，
+由CharacterDatabase物化到character_cards表中
+"""
+
+from typing import Any, Dict, List, Optional
+
+from relationship_graph import edge_strength
+
+# 卡片格式版本，修改渲染逻辑后递增，已物化的旧卡片会自动重新生成
+CARD_FORMAT_VERSION = 2
+
+# 卡片长度 → character_cards表中的列（None表示完整版）
+CARD_COLUMNS = {None: "full_card", 500: "card_500", 150: "card_150"}
+
+MAIN_CHARACTERS = ["路明非", "路鸣泽", "凯撒", "诺诺", "楚子航"]
+
+
+def character_importance(name: str, relationship_count: int) -> str:
+    """根据是否主角和关系数量判断角色重要性等级"""
+    if name in MAIN_CHARACTERS:
+        return "主角"
+    if relationship_count >= 5:
+        return "重要配角"
+    elif relationship_count >= 2:
+        return "配角"
+    else:
+        return "龙套"
+
+
+def _clip(text: str, limit: int) -> str:
+    """截断到limit个字符以内（超出时以省略号结尾）"""
+    text = (text or "").strip()
+    if len(text) <= limit:
+        return text
+    return text[:max(limit - 1, 0)] + "…"
+
+
+def render_full_card(profile: Dict[str, Any]) -> str:
+    """
+    渲染完整角色卡片
+
+    Args:
+        profile: 角色档案（需包含bloodline和spirit_words）
+
+    Returns:
+        格式化的角色详细信息
+    """
+    # 格式化输出
+    detail = f"📖 角色档案: {profile['name']}\n"
+    detail += "=" * 50 + "\n"
+
+    # 基本信息
+    detail += f"🎭 背景故事:\n{profile['background_story']}\n\n"
+
+    if profile['character_arc']:
+        detail += f"📈 角色发展:\n{profile['character_arc']}\n\n"
+
+    # 性格特征
+    detail += f"🧠 性格特征:\n"
+    for i, trait in enumerate(profile['personality_traits'], 1):
+        detail += f"  {i}. {trait}\n"
+    detail += "\n"
+
+    # 说话特点
+    detail += f"💬 说话特点:\n"
+    for i, pattern in enumerate(profile['speech_patterns'], 1):
+        detail += f"  {i}. {pattern}\n"
+    detail += "\n"
+
+    # 经典台词
+    detail += f"🌟 经典台词:\n"
+    for i, quote_data in enumerate(profile['memorable_quotes'][:5], 1):
+        quote = quote_data['quote']
+        context = quote_data.get('context', '')
+        score = quote_data.get('score', 0)
+        detail += f"  {i}. \"{quote}\"\n"
+        if context:
+            detail += f"     情境: {context}\n"
+        if score > 0:
+            detail += f"     评分: {score}/10\n"
+        detail += "\n"
+
+    # 角色关系
+    relationships = profile['relationships']
+    if relationships:
+        detail += f"🔗 重要关系:\n"
+        for rel_name, rel_data in relationships.items():
+            rel_type = rel_data['type']
+            strength = rel_data['strength']
+            description = rel_data.get('description', '')
+            detail += f"  • {rel_name}: {rel_type} (强度: {strength}/10)\n"
+            if description:
+                detail += f"    描述: {description}\n"
+        detail += "\n"
+
+    # 血统信息
+    bloodline = profile.get('bloodline')
+    if bloodline:
+        detail += f"🩸 血统信息:\n"
+        detail += f"   等级: {bloodline['bloodline_level']}\n"
+        detail += f"   纯度: {bloodline['bloodline_percentage']}%\n"
+        if bloodline['dragon_heritage']:
+            detail += f"   龙族血统: {bloodline['dragon_heritage']}\n"
+        if bloodline['description']:
+            detail += f"   描述: {bloodline['description']}\n"
+        detail += "\n"
+
+    # 言灵信息
+    spirit_words = profile.get('spirit_words')
+    if spirit_words:
+        detail += f"⚡ 言灵能力:\n"
+        for i, sw in enumerate(spirit_words, 1):
+            detail += f"   {i}. {sw['name']} (序列{sw['sequence_number']})\n"
+            detail += f"      掌握等级: {sw['mastery_level']}/5\n"
+            detail += f"      稀有度: {sw['rarity_level']}\n"
+            if sw['effects']:
+                detail += f"      效果: {sw['effects']}\n"
+            if sw['activation_condition']:
+                detail += f"      激活条件: {sw['activation_condition']}\n"
+            detail += "\n"
+
+    # 角色重要性
+    relationship_count = len(relationships)
+    importance = character_importance(profile['name'], relationship_count)
+    detail += f"⭐ 角色重要性: {importance} (关系数: {relationship_count})\n"
+
+    return detail
+
+
+def render_compact_card(profile: Dict[str, Any], limit: int) -> str:
+    """
+    渲染压缩角色卡片
+
+    固定字段（性格、说话方式、台词、关系、血统、言灵）优先保留，
+    背景故事使用剩余的长度；短卡片只保留性格和说话方式两项固定字段。
+
+    Args:
+        profile: 角色档案（需包含bloodline和spirit_words）
+        limit: 最大字符数
+
+    Returns:
+        不超过limit个字符的卡片文本
+    """
+    importance = character_importance(profile['name'], len(profile['relationships']))
+    header = f"【{profile['name']}】{importance}"
+
+    # 150字级别的短卡片只保留性格和说话方式，其余长度留给背景
+    brief = limit < 300
+
+    lines: List[str] = []
+    if profile['personality_traits']:
+        lines.append("性格：" + "、".join(profile['personality_traits'][:3 if brief else 5]))
+    if profile['speech_patterns']:
+        lines.append("说话：" + "；".join(profile['speech_patterns'][:1 if brief else 2]))
+    if not brief:
+        if profile['memorable_quotes']:
+            lines.append(f"台词：“{profile['memorable_quotes'][0]['quote']}”")
+        if profile['relationships']:
+            relations = sorted(profile['relationships'].items(),
+                               key=lambda item: -edge_strength(item[1]['strength']))
+            lines.append("关系：" + "、".join(f"{name}（{data['type']}）"
+                                           for name, data in relations[:5]))
+        bloodline: Optional[Dict[str, Any]] = profile.get('bloodline')
+        if bloodline:
+            lines.append(f"血统：{bloodline['bloodline_level']}")
+        if profile.get('spirit_words'):
+            lines.append("言灵：" + "、".join(sw['name'] for sw in profile['spirit_words']))
+
+    # 背景故事占用剩余长度
+    fixed = "\n".join([header] + lines)
+    remaining = limit - len(fixed) - len("\n背景：")
+    if profile['background_story'] and remaining >= 20:
+        background = " ".join(profile['background_story'].split())
+        lines.insert(0, "背景：" + _clip(background, remaining))
+
+    return _clip("\n".join([header] + lines), limit)
+
+
+def render_character_cards(profile: Dict[str, Any]) -> Dict[Optional[int], str]:
+    """渲染所有长度的卡片 {长度: 卡片文本}，长度为None表示完整版"""
+    return {
+        size: render_full_card(profile) if size is None else render_compact_card(profile, size)
+        for size in CARD_COLUMNS
+    }
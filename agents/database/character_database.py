@@ -5,13 +5,75 @@
 
 import sqlite3
 import json
+import functools
+import threading
+import time
 from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime
 import os
+import sys
+sys.path.append(os.path.dirname(__file__))
+
+from db_connection import get_connection_manager, writes
+from schema_migrations import run_migrations
+from text_search import cjk_bigrams, build_fts_query
+from relationship_graph import RelationshipGraph
+from name_resolver import NameResolver
+from character_cards import CARD_COLUMNS, CARD_FORMAT_VERSION, render_character_cards
+
+
+def _writes(method):
+    """
+    标记写操作（异步API据此把调用放入写队列）
+    
+    在一个写事务中执行，提交前重新渲染本次写入失效的角色卡片，并把排队的变更
+    刷新到全文索引；执行后递增数据版本号，使上层缓存失效。
+    写操作已把变更增量更新到内存中的名称解析器和关系图，最外层提交后
+    让它们直接认可本次写入产生的变更计数，不必重新加载。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        outermost = not self.connections.in_transaction()
+        try:
+            with self.connections.transaction() as conn:
+                if outermost:
+                    # 最外层事务一开始就持有写锁，before和after之间只有本次写入；
+                    # 事务中change_count()固定返回before，本次写入不会触发重新加载
+                    before = self._read_change_count()
+                    self._write_base.count = before
+                try:
+                    result = method(self, *args, **kwargs)
+                    cursor = conn.cursor()
+                    if outermost:
+                        self._store_character_cards(cursor)
+                    self._sync_search_index(cursor)
+                finally:
+                    if outermost:
+                        self._write_base.count = None
+                after = self._read_change_count() if outermost else None
+        except BaseException:
+            if outermost:
+                # 事务已回滚，内存中的增量更新可能与数据库不一致
+                self.name_resolver.invalidate()
+                self.relationship_graph.invalidate()
+            raise
+        else:
+            if outermost:
+                self.name_resolver.advance_version(before, after)
+                self.relationship_graph.advance_version(before, after)
+            return result
+        finally:
+            self.connections.mark_written()
+    return writes(wrapper)
+
 
 class CharacterDatabase:
     """角色数据库管理类"""
     
+    # 两次读取数据库中变更计数的最短间隔（秒）：本进程的写入立即可见，
+    # 其他连接或进程的写入最多延迟这么久才会让内存缓存失效
+    EXTERNAL_CHECK_INTERVAL = 1.0
+    
     def __init__(self, db_path: str = "characters.db"):
         """
         初始化数据库连接
@@ -20,140 +82,450 @@ class CharacterDatabase:
             db_path: 数据库文件路径
         """
         self.db_path = db_path
+        # 共享连接管理器：每线程一个连接，WAL模式，复用预编译语句
+        self.connections = get_connection_manager(db_path)
+        # 当前线程正在执行的写事务开始时的数据变更计数
+        self._write_base = threading.local()
+        # 最近一次读取的变更计数：(读取时的写入版本号, 读取时间, 计数)
+        self._change_check = (None, 0.0, 0)
         self.init_database()
+        # 内存关系图和名称解析器：首次查询时加载，之后随写入增量更新
+        self.relationship_graph = RelationshipGraph(self)
+        self.name_resolver = NameResolver(self)
+        # 补齐缺失或格式过期的角色卡片（之后由写操作维护）
+        self.refresh_character_cards()
     
     def init_database(self):
-        """初始化数据库表结构"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # 角色基本信息表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS characters (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    background_story TEXT,
-                    character_arc TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # 角色性格特征表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS personality_traits (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    character_id INTEGER,
-                    trait TEXT NOT NULL,
-                    FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
-                )
-            ''')
-            
-            # 说话特点表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS speech_patterns (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    character_id INTEGER,
-                    pattern TEXT NOT NULL,
-                    FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
-                )
+        """初始化数据库表结构（执行尚未执行的迁移）"""
+        run_migrations(self.connections.get_connection(), [
+            (1, "角色基础表", self._create_base_tables),
+            (2, "FTS5全文索引", self._init_search_index),
+            (3, "物化的角色卡片", self._init_character_cards),
+            (4, "跨连接的数据变更计数", self._init_change_counter),
+        ])
+        # 其他连接直接写入后留在队列中的变更
+        self.sync_search_index()
+    
+    def _create_base_tables(self, cursor):
+        """创建角色基础表和索引"""
+        # 角色基本信息表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS characters (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL,
+                background_story TEXT,
+                character_arc TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 角色性格特征表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS personality_traits (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                character_id INTEGER,
+                trait TEXT NOT NULL,
+                FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # 说话特点表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS speech_patterns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                character_id INTEGER,
+                pattern TEXT NOT NULL,
+                FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # 经典台词表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS memorable_quotes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                character_id INTEGER,
+                quote TEXT NOT NULL,
+                context TEXT,
+                popularity_score INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # 角色别名表（昵称、英文名、称号等）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS character_aliases (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                character_id INTEGER NOT NULL,
+                alias TEXT NOT NULL UNIQUE COLLATE NOCASE,
+                alias_type TEXT DEFAULT '别名', -- 别名/昵称/英文名/称号
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # 角色关系表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS character_relationships (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                character1_id INTEGER,
+                character2_id INTEGER,
+                relationship_type TEXT NOT NULL,
+                description TEXT,
+                strength INTEGER DEFAULT 1, -- 关系强度 1-10
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (character1_id) REFERENCES characters (id) ON DELETE CASCADE,
+                FOREIGN KEY (character2_id) REFERENCES characters (id) ON DELETE CASCADE,
+                UNIQUE(character1_id, character2_id)
+            )
+        ''')
+        
+        # 角色发展轨迹表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS character_development (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                character_id INTEGER,
+                stage TEXT NOT NULL, -- 发展阶段
+                description TEXT,
+                chapter_range TEXT, -- 章节范围
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # 角色血统等级表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS character_bloodline (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                character_id INTEGER,
+                bloodline_level TEXT NOT NULL, -- 血统等级
+                bloodline_percentage INTEGER, -- 血统纯度百分比
+                dragon_heritage TEXT, -- 龙族血统来源
+                description TEXT,
+                FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # 言灵库表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS spirit_words (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL, -- 言灵名称
+                sequence_number INTEGER, -- 序列号
+                dragon_name TEXT, -- 对应龙王名称
+                description TEXT NOT NULL, -- 言灵描述
+                effects TEXT, -- 效果描述
+                limitations TEXT, -- 限制条件
+                rarity_level TEXT, -- 稀有度等级
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 角色言灵表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS character_spirit_words (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                character_id INTEGER,
+                spirit_word_id INTEGER,
+                mastery_level INTEGER DEFAULT 1, -- 掌握等级 1-5
+                activation_condition TEXT, -- 激活条件
+                notes TEXT, -- 备注
+                FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE,
+                FOREIGN KEY (spirit_word_id) REFERENCES spirit_words (id) ON DELETE CASCADE,
+                UNIQUE(character_id, spirit_word_id)
+            )
+        ''')
+        
+        # 创建索引
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_characters_name ON characters (name)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_relationships_char1 ON character_relationships (character1_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_relationships_char2 ON character_relationships (character2_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_aliases_character ON character_aliases (character_id)')
+    
+    # 角色全文索引的来源：(表名, 角色ID列, [(rowid编码, name列字段, body列字段), ...])
+    # 索引rowid = 来源行id * 8 + 编码，按rowid即可精确删除。
+    # 角色名单独成行，避免长篇背景故事稀释名称命中的相关度。
+    _CHARACTER_SEARCH_SOURCES = {
+        "characters": ("id", [(0, "name", None), (1, None, "background_story")]),
+        "personality_traits": ("character_id", [(2, None, "trait")]),
+        "speech_patterns": ("character_id", [(3, None, "pattern")]),
+        "memorable_quotes": ("character_id", [(4, None, "quote")]),
+        "character_aliases": ("character_id", [(5, "alias", None)]),
+    }
+    _SPIRIT_WORD_SEARCH_FIELDS = ("name", "dragon_name", "description")
+    
+    def _init_search_index(self, cursor):
+        """
+        创建FTS5全文索引
+        
+        SQLite自带的分词器不支持中文二元分词，分词在Python中完成（cjk_bigrams），
+        索引表中存放的是分好的词元。来源表上的触发器只把变更行记入
+        search_index_queue（纯SQL，任何连接写入都不受影响），
+        由本类的写操作在提交前统一刷新（搜索只读索引，不写入）；
+        其他连接直接写入的变更在下一次写操作、启动时或调用sync_search_index()时刷新。
+        """
+        cursor.execute('''
+            SELECT name FROM sqlite_master
+            WHERE type = 'table' AND name IN ('character_search', 'spirit_word_search')
+        ''')
+        existing = {row[0] for row in cursor.fetchall()}
+        
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS character_search USING fts5(
+                character_id UNINDEXED, name, body, tokenize = 'unicode61'
+            )
+        ''')
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS spirit_word_search USING fts5(
+                name, dragon_name, description, tokenize = 'unicode61'
+            )
+        ''')
+        
+        # 待刷新的来源行
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS search_index_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                row_id INTEGER NOT NULL
+            )
+        ''')
+        
+        for table in list(self._CHARACTER_SEARCH_SOURCES) + ["spirit_words"]:
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table}
+                BEGIN
+                    INSERT INTO search_index_queue (source, row_id) VALUES ('{table}', new.id);
+                END
             ''')
-            
-            # 经典台词表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS memorable_quotes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    character_id INTEGER,
-                    quote TEXT NOT NULL,
-                    context TEXT,
-                    popularity_score INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
-                )
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table}
+                BEGIN
+                    INSERT INTO search_index_queue (source, row_id) VALUES ('{table}', old.id);
+                END
             ''')
-            
-            # 角色关系表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS character_relationships (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    character1_id INTEGER,
-                    character2_id INTEGER,
-                    relationship_type TEXT NOT NULL,
-                    description TEXT,
-                    strength INTEGER DEFAULT 1, -- 关系强度 1-10
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (character1_id) REFERENCES characters (id) ON DELETE CASCADE,
-                    FOREIGN KEY (character2_id) REFERENCES characters (id) ON DELETE CASCADE,
-                    UNIQUE(character1_id, character2_id)
-                )
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE ON {table}
+                BEGIN
+                    INSERT INTO search_index_queue (source, row_id) VALUES ('{table}', old.id);
+                    INSERT INTO search_index_queue (source, row_id) VALUES ('{table}', new.id);
+                END
             ''')
-            
-            # 角色发展轨迹表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS character_development (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    character_id INTEGER,
-                    stage TEXT NOT NULL, -- 发展阶段
-                    description TEXT,
-                    chapter_range TEXT, -- 章节范围
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
-                )
+        
+        if 'character_search' not in existing or 'spirit_word_search' not in existing:
+            self._rebuild_search_index(cursor)
+    
+    # 角色卡片依赖的子表：(表名, 角色ID列)
+    _CARD_SOURCES = {
+        "personality_traits": "character_id",
+        "speech_patterns": "character_id",
+        "memorable_quotes": "character_id",
+        "character_relationships": "character1_id",
+        "character_bloodline": "character_id",
+        "character_spirit_words": "character_id",
+    }
+    
+    def _init_character_cards(self, cursor):
+        """
+        创建物化的角色卡片表
+        
+        来源表上的触发器在对应角色的数据变化时删除该角色的卡片（纯SQL，任何连接
+        写入都会生效）；写操作在提交前重新渲染缺失的卡片。读取时遇到缺失的卡片
+        （如其他连接直接写入后）只在内存中渲染，不写数据库。
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS character_cards (
+                character_id INTEGER PRIMARY KEY,
+                format_version INTEGER NOT NULL,
+                full_card TEXT NOT NULL,
+                card_500 TEXT NOT NULL,
+                card_150 TEXT NOT NULL,
+                rendered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        for table, id_column in self._CARD_SOURCES.items():
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_card_ai AFTER INSERT ON {table}
+                BEGIN
+                    DELETE FROM character_cards WHERE character_id = new.{id_column};
+                END
             ''')
-            
-            # 角色血统等级表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS character_bloodline (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    character_id INTEGER,
-                    bloodline_level TEXT NOT NULL, -- 血统等级
-                    bloodline_percentage INTEGER, -- 血统纯度百分比
-                    dragon_heritage TEXT, -- 龙族血统来源
-                    description TEXT,
-                    FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
-                )
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_card_ad AFTER DELETE ON {table}
+                BEGIN
+                    DELETE FROM character_cards WHERE character_id = old.{id_column};
+                END
             ''')
-            
-            # 言灵库表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS spirit_words (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL, -- 言灵名称
-                    sequence_number INTEGER, -- 序列号
-                    dragon_name TEXT, -- 对应龙王名称
-                    description TEXT NOT NULL, -- 言灵描述
-                    effects TEXT, -- 效果描述
-                    limitations TEXT, -- 限制条件
-                    rarity_level TEXT, -- 稀有度等级
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_card_au AFTER UPDATE ON {table}
+                BEGIN
+                    DELETE FROM character_cards
+                    WHERE character_id IN (old.{id_column}, new.{id_column});
+                END
             ''')
-            
-            # 角色言灵表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS character_spirit_words (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    character_id INTEGER,
-                    spirit_word_id INTEGER,
-                    mastery_level INTEGER DEFAULT 1, -- 掌握等级 1-5
-                    activation_condition TEXT, -- 激活条件
-                    notes TEXT, -- 备注
-                    FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE,
-                    FOREIGN KEY (spirit_word_id) REFERENCES spirit_words (id) ON DELETE CASCADE,
-                    UNIQUE(character_id, spirit_word_id)
-                )
+        
+        # 角色本身变化时，关系中显示其名字的其他角色卡片也一并失效
+        for suffix, event in (("ad", "DELETE"), ("au", "UPDATE")):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS characters_card_{suffix} AFTER {event} ON characters
+                BEGIN
+                    DELETE FROM character_cards
+                    WHERE character_id = old.id
+                       OR character_id IN (SELECT character1_id FROM character_relationships
+                                           WHERE character2_id = old.id);
+                END
             ''')
+        
+        # 言灵库条目变化时，掌握该言灵的角色卡片失效
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS spirit_words_card_au AFTER UPDATE ON spirit_words
+            BEGIN
+                DELETE FROM character_cards WHERE character_id IN (
+                    SELECT character_id FROM character_spirit_words WHERE spirit_word_id = old.id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS spirit_words_card_ad AFTER DELETE ON spirit_words
+            BEGIN
+                DELETE FROM character_cards WHERE character_id IN (
+                    SELECT character_id FROM character_spirit_words WHERE spirit_word_id = old.id);
+            END
+        ''')
+    
+    # 变更时递增数据变更计数的表（派生的索引、卡片和队列表除外）
+    _VERSIONED_TABLES = (
+        "characters", "personality_traits", "speech_patterns", "memorable_quotes",
+        "character_aliases", "character_relationships", "character_development",
+        "character_bloodline", "spirit_words", "character_spirit_words",
+    )
+    
+    def _init_change_counter(self, cursor):
+        """
+        创建数据变更计数
+        
+        来源表上的触发器在每次行变更时递增data_changes中的计数（纯SQL，任何连接、
+        任何进程写入都会生效）。计数保存在数据库中，在任何线程的连接上读到的都是同一个值，
+        供内存缓存判断其他连接或进程是否修改过数据。
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_changes (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO data_changes (id, version) VALUES (1, 0)')
+        
+        for table in self._VERSIONED_TABLES:
+            for suffix, event in (("ai", "INSERT"), ("ad", "DELETE"), ("au", "UPDATE")):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_version_{suffix} AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE data_changes SET version = version + 1 WHERE id = 1;
+                    END
+                ''')
+    
+    def _refresh_search_rows(self, cursor, table: str, row_ids: Optional[List[int]] = None):
+        """
+        重新索引来源表中的指定行
+        
+        Args:
+            cursor: 数据库游标
+            table: 来源表名
+            row_ids: 来源行ID列表，为None时重建该表的全部索引
+        """
+        if row_ids is not None and not row_ids:
+            return
+        
+        if table == "spirit_words":
+            fields = ", ".join(self._SPIRIT_WORD_SEARCH_FIELDS)
+            select_sql = f"SELECT id, {fields} FROM spirit_words"
+        else:
+            id_column, columns = self._CHARACTER_SEARCH_SOURCES[table]
+            fields = [field for _, name_field, body_field in columns
+                      for field in (name_field, body_field) if field]
+            select_sql = f"SELECT id, {id_column}, {', '.join(fields)} FROM {table}"
+        
+        # 分批处理，避免超出SQLite的参数数量限制
+        batches = [None] if row_ids is None else [
+            row_ids[i:i + 500] for i in range(0, len(row_ids), 500)]
+        for batch in batches:
+            if batch is None:
+                cursor.execute(select_sql)
+            else:
+                placeholders = ', '.join('?' * len(batch))
+                cursor.execute(f"{select_sql} WHERE id IN ({placeholders})", batch)
+            rows = cursor.fetchall()
             
-            # 创建索引
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_characters_name ON characters (name)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_relationships_char1 ON character_relationships (character1_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_relationships_char2 ON character_relationships (character2_id)')
+            if table == "spirit_words":
+                if batch is not None:
+                    cursor.executemany('DELETE FROM spirit_word_search WHERE rowid = ?',
+                                       [(row_id,) for row_id in batch])
+                cursor.executemany('''
+                    INSERT INTO spirit_word_search (rowid, name, dragon_name, description)
+                    VALUES (?, ?, ?, ?)
+                ''', [(row[0],) + tuple(cjk_bigrams(value) for value in row[1:]) for row in rows])
+                continue
             
-            conn.commit()
+            if batch is not None:
+                cursor.executemany('DELETE FROM character_search WHERE rowid = ?',
+                                   [(row_id * 8 + code,) for row_id in batch
+                                    for code, _, _ in columns])
+            index_rows = []
+            for row in rows:
+                values = dict(zip(fields, row[2:]))
+                for code, name_field, body_field in columns:
+                    index_rows.append((
+                        row[0] * 8 + code, row[1],
+                        cjk_bigrams(values[name_field]) if name_field else "",
+                        cjk_bigrams(values[body_field]) if body_field else ""
+                    ))
+            cursor.executemany('''
+                INSERT INTO character_search (rowid, character_id, name, body)
+                VALUES (?, ?, ?, ?)
+            ''', index_rows)
+    
+    def _rebuild_search_index(self, cursor):
+        """根据来源表重建全文索引"""
+        cursor.execute('DELETE FROM search_index_queue')
+        cursor.execute('DELETE FROM character_search')
+        cursor.execute('DELETE FROM spirit_word_search')
+        for table in list(self._CHARACTER_SEARCH_SOURCES) + ["spirit_words"]:
+            self._refresh_search_rows(cursor, table)
+    
+    def _sync_search_index(self, cursor):
+        """把search_index_queue中记录的变更刷新到全文索引（在写事务中调用）"""
+        cursor.execute('SELECT DISTINCT source, row_id FROM search_index_queue')
+        pending = {}
+        for source, row_id in cursor.fetchall():
+            pending.setdefault(source, []).append(row_id)
+        if not pending:
+            return
+        
+        for table, row_ids in pending.items():
+            self._refresh_search_rows(cursor, table, row_ids)
+        
+        cursor.execute('DELETE FROM search_index_queue')
+    
+    @writes
+    def sync_search_index(self):
+        """刷新其他连接（如迁移脚本）直接写入后排队的全文索引变更"""
+        with self.connections.connection() as conn:
+            if conn.execute('SELECT 1 FROM search_index_queue LIMIT 1').fetchone() is None:
+                return
+        with self.connections.transaction() as conn:
+            self._sync_search_index(conn.cursor())
     
+    @writes
+    def rebuild_search_index(self):
+        """重建全文索引"""
+        with self.connections.transaction() as conn:
+            self._rebuild_search_index(conn.cursor())
+    
+    @_writes
     def add_character(self, name: str, background_story: str = "", character_arc: str = "") -> int:
         """
-        添加新角色
+        添加新角色（同名角色已存在时更新其背景故事和发展轨迹）
         
         Args:
             name: 角色名称
@@ -163,17 +535,28 @@ class CharacterDatabase:
         Returns:
             角色ID
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
+            # 已有同名角色时原地更新（保留角色ID及其别名、关系等子表数据）；
+            # INSERT OR REPLACE会先删除旧行且不触发删除触发器，留下过期的索引和卡片
             cursor.execute('''
-                INSERT OR REPLACE INTO characters (name, background_story, character_arc, updated_at)
+                INSERT INTO characters (name, background_story, character_arc, updated_at)
                 VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(name) DO UPDATE SET
+                    background_story = excluded.background_story,
+                    character_arc = excluded.character_arc,
+                    updated_at = CURRENT_TIMESTAMP
             ''', (name, background_story, character_arc))
-            return cursor.lastrowid
+            cursor.execute('SELECT id FROM characters WHERE name = ?', (name,))
+            char_id = cursor.fetchone()[0]
+        
+        self.name_resolver.add_name(char_id, name)
+        return char_id
     
+    @_writes
     def add_personality_traits(self, character_id: int, traits: List[str]):
         """添加角色性格特征"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM personality_traits WHERE character_id = ?', (character_id,))
             for trait in traits:
@@ -182,9 +565,10 @@ class CharacterDatabase:
                     VALUES (?, ?)
                 ''', (character_id, trait))
     
+    @_writes
     def add_speech_patterns(self, character_id: int, patterns: List[str]):
         """添加说话特点"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM speech_patterns WHERE character_id = ?', (character_id,))
             for pattern in patterns:
@@ -193,6 +577,7 @@ class CharacterDatabase:
                     VALUES (?, ?)
                 ''', (character_id, pattern))
     
+    @_writes
     def add_memorable_quotes(self, character_id: int, quotes: List[Tuple[str, str, int]]):
         """
         添加经典台词
@@ -201,7 +586,7 @@ class CharacterDatabase:
             character_id: 角色ID
             quotes: [(quote, context, popularity_score), ...]
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM memorable_quotes WHERE character_id = ?', (character_id,))
             for quote, context, score in quotes:
@@ -210,10 +595,11 @@ class CharacterDatabase:
                     VALUES (?, ?, ?, ?)
                 ''', (character_id, quote, context, score))
     
+    @_writes
     def add_relationship(self, char1_name: str, char2_name: str, relationship_type: str, 
                         description: str = "", strength: int = 1):
         """添加角色关系"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             
             # 获取角色ID
@@ -228,7 +614,12 @@ class CharacterDatabase:
                 (character1_id, character2_id, relationship_type, description, strength)
                 VALUES (?, ?, ?, ?, ?)
             ''', (char1_id, char2_id, relationship_type, description, strength))
+        
+        self.relationship_graph.set_relationship(self.name_resolver.get_name(char1_id),
+                                                 self.name_resolver.get_name(char2_id),
+                                                 relationship_type, description, strength)
     
+    @_writes
     def add_bloodline_info(self, character_name: str, bloodline_level: str, 
                           bloodline_percentage: int, dragon_heritage: str = "", 
                           description: str = ""):
@@ -237,7 +628,7 @@ class CharacterDatabase:
         if not char_id:
             raise ValueError(f"角色不存在: {character_name}")
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO character_bloodline 
@@ -245,18 +636,27 @@ class CharacterDatabase:
                 VALUES (?, ?, ?, ?, ?)
             ''', (char_id, bloodline_level, bloodline_percentage, dragon_heritage, description))
     
+    @_writes
     def add_spirit_word(self, name: str, sequence_number: int, dragon_name: str,
                        description: str, effects: str = "", limitations: str = "",
                        rarity_level: str = "普通"):
-        """添加言灵到言灵库"""
-        with sqlite3.connect(self.db_path) as conn:
+        """添加言灵到言灵库（已存在时原地更新，保留ID及角色与它的关联）"""
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT OR REPLACE INTO spirit_words 
+                INSERT INTO spirit_words 
                 (name, sequence_number, dragon_name, description, effects, limitations, rarity_level)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    sequence_number = excluded.sequence_number,
+                    dragon_name = excluded.dragon_name,
+                    description = excluded.description,
+                    effects = excluded.effects,
+                    limitations = excluded.limitations,
+                    rarity_level = excluded.rarity_level
             ''', (name, sequence_number, dragon_name, description, effects, limitations, rarity_level))
     
+    @_writes
     def add_character_spirit_word(self, character_name: str, spirit_word_name: str,
                                  mastery_level: int = 1, activation_condition: str = "",
                                  notes: str = ""):
@@ -266,7 +666,7 @@ class CharacterDatabase:
             raise ValueError(f"角色不存在: {character_name}")
         
         # 获取言灵ID
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT id FROM spirit_words WHERE name = ?', (spirit_word_name,))
             result = cursor.fetchone()
@@ -280,30 +680,232 @@ class CharacterDatabase:
                 VALUES (?, ?, ?, ?, ?)
             ''', (char_id, spirit_word_id, mastery_level, activation_condition, notes))
     
+    def change_count(self) -> int:
+        """
+        数据变更计数（任何连接或进程修改来源表后都会变化，与读取的线程无关）
+        
+        在写操作的事务中返回事务开始时的计数：本次写入由写操作自己增量更新到内存缓存，
+        与PRAGMA data_version一样不计入本连接尚未完成的写入。
+        
+        内存查询的热路径每次都会调用，因此先比较进程内的写入版本号：本进程没有新的写入
+        且距上次读取不到EXTERNAL_CHECK_INTERVAL秒时直接返回上次读取的计数，不查询数据库。
+        """
+        count = getattr(self._write_base, 'count', None)
+        if count is not None:
+            return count
+        
+        write_version = self.connections.write_version
+        now = time.monotonic()
+        checked_version, checked_at, count = self._change_check
+        if checked_version == write_version and now - checked_at < self.EXTERNAL_CHECK_INTERVAL:
+            return count
+        # 先取写入版本号再读计数：读取期间完成的写入会让下次调用重新读取
+        count = self._read_change_count()
+        self._change_check = (write_version, now, count)
+        return count
+    
+    def _read_change_count(self) -> int:
+        """从数据库读取数据变更计数"""
+        with self.connections.connection() as conn:
+            return conn.execute('SELECT version FROM data_changes WHERE id = 1').fetchone()[0]
+    
+    @property
+    def data_version(self) -> Tuple[int, int]:
+        """
+        当前数据版本（任何写入后都会变化）
+        
+        由本进程的写入版本号和数据库中的变更计数组成，两者都与线程无关。
+        """
+        return self.connections.write_version, self.change_count()
+    
     def get_character_id(self, name: str) -> Optional[int]:
-        """获取角色ID"""
-        with sqlite3.connect(self.db_path) as conn:
+        """获取角色ID（支持别名，由内存中的名称解析器直接返回）"""
+        return self.name_resolver.resolve_id(name)
+    
+    def resolve_character_name(self, name: str) -> Optional[str]:
+        """把角色名或别名解析为正式名，未知名称返回None"""
+        return self.name_resolver.resolve(name)
+    
+    def resolve_character_names(self, names: List[str]) -> Dict[str, Optional[str]]:
+        """批量解析角色名或别名 {输入名称: 正式名或None}"""
+        return self.name_resolver.resolve_many(names)
+    
+    def find_character_mentions(self, text: str) -> Dict[str, int]:
+        """一次扫描找出文本中提到的已知角色 {正式名: 提及次数}"""
+        return self.name_resolver.find_mentions(text)
+    
+    @_writes
+    def add_character_alias(self, name: str, alias: str, alias_type: str = "别名"):
+        """
+        为角色添加别名
+        
+        Args:
+            name: 角色名称（或已有别名）
+            alias: 新别名
+            alias_type: 别名类型（别名/昵称/英文名/称号）
+        """
+        char_id = self.get_character_id(name)
+        if not char_id:
+            raise ValueError(f"角色不存在: {name}")
+        
+        owner = self.get_character_id(alias)
+        if owner and owner != char_id:
+            raise ValueError(f"名称已被其他角色使用: {alias}")
+        
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT id FROM characters WHERE name = ?', (name,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+            cursor.execute('''
+                INSERT INTO character_aliases (character_id, alias, alias_type)
+                VALUES (?, ?, ?)
+                ON CONFLICT(alias) DO UPDATE SET alias_type = excluded.alias_type
+            ''', (char_id, alias, alias_type))
+        
+        self.name_resolver.add_name(char_id, alias, canonical=False)
+    
+    @_writes
+    def remove_character_alias(self, alias: str):
+        """删除别名"""
+        with self.connections.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM character_aliases WHERE alias = ?', (alias,))
+        
+        self.name_resolver.remove_name(alias)
+    
+    def get_character_aliases(self, name: str) -> List[Dict[str, str]]:
+        """获取角色的所有别名 [{alias, type}]"""
+        char_id = self.get_character_id(name)
+        if not char_id:
+            return []
+        
+        with self.connections.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT alias, alias_type FROM character_aliases
+                WHERE character_id = ? ORDER BY id
+            ''', (char_id,))
+            return [{"alias": row[0], "type": row[1]} for row in cursor.fetchall()]
+    
+    def get_character_card(self, name: str, size: Optional[int] = None) -> Optional[str]:
+        """
+        获取预渲染的角色卡片
+        
+        Args:
+            name: 角色名称（或别名）
+            size: 卡片长度，None为完整版，可选500或150
+            
+        Returns:
+            卡片文本，角色不存在时返回None
+        """
+        return self.get_character_cards([name], size).get(name)
+    
+    def get_character_cards(self, names: List[str], size: Optional[int] = None) -> Dict[str, str]:
+        """
+        批量获取预渲染的角色卡片
+        
+        已物化的卡片通过主键一次读取；缺失或格式过期的卡片在内存中批量渲染，
+        由下一次写操作（或refresh_character_cards）写回。
+        
+        Args:
+            names: 角色名称（或别名）列表
+            size: 卡片长度，None为完整版，可选500或150
+            
+        Returns:
+            {输入名称: 卡片文本}，不存在的角色不出现在结果中
+        """
+        if size not in CARD_COLUMNS:
+            raise ValueError(f"不支持的卡片长度: {size}，可选: {list(CARD_COLUMNS)}")
+        column = CARD_COLUMNS[size]
+        
+        ids = self.name_resolver.resolve_ids(names)
+        char_ids = sorted(set(ids.values()) - {None})
+        if not char_ids:
+            return {}
+        
+        placeholders = ', '.join('?' * len(char_ids))
+        with self.connections.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT character_id, {column} FROM character_cards
+                WHERE character_id IN ({placeholders}) AND format_version = ?
+            ''', char_ids + [CARD_FORMAT_VERSION])
+            cards = dict(cursor.fetchall())
+        
+        missing = [char_id for char_id in char_ids if char_id not in cards]
+        if missing:
+            rendered = self._render_character_cards(missing)
+            cards.update({char_id: card[size] for char_id, card in rendered.items()})
+        
+        return {name: cards[char_id] for name, char_id in ids.items() if char_id in cards}
+    
+    def _render_character_cards(self, char_ids: List[int]) -> Dict[int, Dict[Optional[int], str]]:
+        """在内存中渲染指定角色的卡片（不写数据库）"""
+        names = [self.name_resolver.get_name(char_id) for char_id in char_ids]
+        profiles = self.get_character_profiles([name for name in names if name],
+                                               include_abilities=True)
+        return {profile['id']: render_character_cards(profile) for profile in profiles}
+    
+    # 没有当前格式卡片的角色
+    _MISSING_CARDS_SQL = '''
+        SELECT c.id FROM characters c
+        LEFT JOIN character_cards cc ON cc.character_id = c.id AND cc.format_version = ?
+        WHERE cc.character_id IS NULL
+    '''
+    
+    def _store_character_cards(self, cursor) -> int:
+        """
+        渲染并写入缺失或格式过期的角色卡片，返回写入数量
+        
+        在写事务中调用：渲染期间其他写入会等待，不会出现基于旧数据的卡片
+        覆盖触发器删除的情况。
+        """
+        cursor.execute(self._MISSING_CARDS_SQL, (CARD_FORMAT_VERSION,))
+        char_ids = [row[0] for row in cursor.fetchall()]
+        if not char_ids:
+            return 0
+        
+        rendered = self._render_character_cards(char_ids)
+        cursor.executemany('''
+            INSERT OR REPLACE INTO character_cards
+            (character_id, format_version, full_card, card_500, card_150)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(char_id, CARD_FORMAT_VERSION, cards[None], cards[500], cards[150])
+              for char_id, cards in rendered.items()])
+        return len(rendered)
+    
+    @writes
+    def refresh_character_cards(self) -> int:
+        """物化缺失或格式过期的角色卡片（如其他连接直接写入后），返回写入数量"""
+        with self.connections.connection() as conn:
+            if conn.execute(self._MISSING_CARDS_SQL + ' LIMIT 1',
+                            (CARD_FORMAT_VERSION,)).fetchone() is None:
+                return 0
+        with self.connections.transaction() as conn:
+            return self._store_character_cards(conn.cursor())
     
     def get_character_profile(self, name: str) -> Optional[Dict[str, Any]]:
-        """获取完整的角色档案"""
-        with sqlite3.connect(self.db_path) as conn:
+        """获取完整的角色档案（name可以是别名）"""
+        char_id = self.get_character_id(name)
+        if not char_id:
+            return None
+        
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             
             # 获取基本信息
             cursor.execute('''
-                SELECT id, background_story, character_arc 
-                FROM characters WHERE name = ?
-            ''', (name,))
+                SELECT name, background_story, character_arc 
+                FROM characters WHERE id = ?
+            ''', (char_id,))
             basic_info = cursor.fetchone()
             
             if not basic_info:
                 return None
             
-            char_id = basic_info[0]
+            # 获取别名
+            cursor.execute('''
+                SELECT alias FROM character_aliases WHERE character_id = ? ORDER BY id
+            ''', (char_id,))
+            aliases = [row[0] for row in cursor.fetchall()]
             
             # 获取性格特征
             cursor.execute('''
@@ -337,7 +939,8 @@ class CharacterDatabase:
             
             return {
                 "id": char_id,
-                "name": name,
+                "name": basic_info[0],
+                "aliases": aliases,
                 "background_story": basic_info[1],
                 "character_arc": basic_info[2],
                 "personality_traits": traits,
@@ -348,28 +951,211 @@ class CharacterDatabase:
     
     def get_all_characters(self) -> List[Dict[str, Any]]:
         """获取所有角色档案"""
-        with sqlite3.connect(self.db_path) as conn:
+        return self.get_character_profiles()
+    
+    def get_character_names(self) -> List[str]:
+        """获取所有角色名称（只读取characters表的name列）"""
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT name FROM characters ORDER BY name')
-            names = [row[0] for row in cursor.fetchall()]
+            return [row[0] for row in cursor.fetchall()]
+    
+    def get_character_profiles(self, names: Optional[List[str]] = None,
+                               include_abilities: bool = False) -> List[Dict[str, Any]]:
+        """
+        批量获取角色档案
+        
+        每张子表只查询一次，再在内存中按character_id分组，
+        查询次数与角色数量无关。
+        
+        Args:
+            names: 角色名称（或别名）列表，为None时加载全部角色
+            include_abilities: 是否同时加载血统(bloodline)和言灵(spirit_words)
+            
+        Returns:
+            角色档案列表（按名称排序，结构与get_character_profile一致）
+        """
+        if names is not None and not names:
+            return []
+        
+        with self.connections.connection() as conn:
+            cursor = conn.cursor()
+            
+            # 基本信息
+            if names is None:
+                cursor.execute('''
+                    SELECT id, name, background_story, character_arc
+                    FROM characters ORDER BY name
+                ''')
+            else:
+                # 别名先解析为正式名（一次批量解析）
+                canonical = set(self.name_resolver.resolve_many(names).values()) - {None}
+                if not canonical:
+                    return []
+                placeholders = ', '.join('?' * len(canonical))
+                cursor.execute(f'''
+                    SELECT id, name, background_story, character_arc
+                    FROM characters WHERE name IN ({placeholders}) ORDER BY name
+                ''', list(canonical))
+            
+            profiles = {}
+            for char_id, name, background_story, character_arc in cursor.fetchall():
+                profile = {
+                    "id": char_id,
+                    "name": name,
+                    "aliases": [],
+                    "background_story": background_story,
+                    "character_arc": character_arc,
+                    "personality_traits": [],
+                    "speech_patterns": [],
+                    "memorable_quotes": [],
+                    "relationships": {}
+                }
+                if include_abilities:
+                    profile["bloodline"] = None
+                    profile["spirit_words"] = []
+                profiles[char_id] = profile
+            
+            if not profiles:
+                return []
+            
+            # 只加载部分角色时，用id过滤子表
+            if names is None:
+                id_filter, params = "", []
+            else:
+                id_filter = f"WHERE {{column}} IN ({', '.join('?' * len(profiles))})"
+                params = list(profiles.keys())
+            
+            def where(column: str) -> str:
+                return id_filter.format(column=column)
+            
+            # 别名
+            cursor.execute(f'''
+                SELECT character_id, alias FROM character_aliases
+                {where('character_id')} ORDER BY character_id, id
+            ''', params)
+            for char_id, alias in cursor.fetchall():
+                if char_id in profiles:
+                    profiles[char_id]["aliases"].append(alias)
             
-            return [self.get_character_profile(name) for name in names]
+            # 性格特征
+            cursor.execute(f'''
+                SELECT character_id, trait FROM personality_traits
+                {where('character_id')} ORDER BY character_id, id
+            ''', params)
+            for char_id, trait in cursor.fetchall():
+                if char_id in profiles:
+                    profiles[char_id]["personality_traits"].append(trait)
+            
+            # 说话特点
+            cursor.execute(f'''
+                SELECT character_id, pattern FROM speech_patterns
+                {where('character_id')} ORDER BY character_id, id
+            ''', params)
+            for char_id, pattern in cursor.fetchall():
+                if char_id in profiles:
+                    profiles[char_id]["speech_patterns"].append(pattern)
+            
+            # 经典台词
+            cursor.execute(f'''
+                SELECT character_id, quote, context, popularity_score FROM memorable_quotes
+                {where('character_id')} ORDER BY character_id, popularity_score DESC, id
+            ''', params)
+            for char_id, quote, context, score in cursor.fetchall():
+                if char_id in profiles:
+                    profiles[char_id]["memorable_quotes"].append(
+                        {"quote": quote, "context": context, "score": score})
+            
+            # 关系
+            cursor.execute(f'''
+                SELECT cr.character1_id, c2.name, cr.relationship_type, cr.description, cr.strength
+                FROM character_relationships cr
+                JOIN characters c2 ON cr.character2_id = c2.id
+                {where('cr.character1_id')}
+            ''', params)
+            for char_id, rel_name, rel_type, description, strength in cursor.fetchall():
+                if char_id in profiles:
+                    profiles[char_id]["relationships"][rel_name] = {
+                        "type": rel_type, "description": description, "strength": strength}
+            
+            if include_abilities:
+                # 血统（每个角色取最早的一条，与get_character_bloodline一致）
+                cursor.execute(f'''
+                    SELECT character_id, bloodline_level, bloodline_percentage,
+                           dragon_heritage, description
+                    FROM character_bloodline
+                    {where('character_id')} ORDER BY character_id, id
+                ''', params)
+                for char_id, level, percentage, heritage, description in cursor.fetchall():
+                    if char_id in profiles and profiles[char_id]["bloodline"] is None:
+                        profiles[char_id]["bloodline"] = {
+                            "bloodline_level": level,
+                            "bloodline_percentage": percentage,
+                            "dragon_heritage": heritage,
+                            "description": description
+                        }
+                
+                # 言灵
+                cursor.execute(f'''
+                    SELECT csw.character_id, sw.name, sw.sequence_number, sw.dragon_name,
+                           sw.description, sw.effects, sw.limitations, sw.rarity_level,
+                           csw.mastery_level, csw.activation_condition, csw.notes
+                    FROM character_spirit_words csw
+                    JOIN spirit_words sw ON csw.spirit_word_id = sw.id
+                    {where('csw.character_id')}
+                    ORDER BY csw.character_id, sw.sequence_number
+                ''', params)
+                for row in cursor.fetchall():
+                    if row[0] in profiles:
+                        profiles[row[0]]["spirit_words"].append({
+                            "name": row[1],
+                            "sequence_number": row[2],
+                            "dragon_name": row[3],
+                            "description": row[4],
+                            "effects": row[5],
+                            "limitations": row[6],
+                            "rarity_level": row[7],
+                            "mastery_level": row[8],
+                            "activation_condition": row[9],
+                            "notes": row[10]
+                        })
+            
+            return list(profiles.values())
     
-    def search_characters(self, keyword: str) -> List[Dict[str, Any]]:
-        """搜索角色"""
-        with sqlite3.connect(self.db_path) as conn:
+    def search_characters(self, keyword: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        搜索角色（基于FTS5全文索引，按相关度排序）
+        
+        检索范围：角色名、背景故事、性格特征、说话特点、经典台词。
+        角色名命中的权重高于其他字段。
+        
+        Args:
+            keyword: 搜索关键词
+            limit: 最多返回的角色数量，None表示不限制
+            
+        Returns:
+            匹配的角色档案列表，相关度高的在前
+        """
+        match_query = build_fts_query(keyword)
+        if not match_query:
+            return []
+        
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT DISTINCT c.name FROM characters c
-                LEFT JOIN personality_traits pt ON c.id = pt.character_id
-                LEFT JOIN speech_patterns sp ON c.id = sp.character_id
-                LEFT JOIN memorable_quotes mq ON c.id = mq.character_id
-                WHERE c.name LIKE ? OR c.background_story LIKE ? OR 
-                      pt.trait LIKE ? OR sp.pattern LIKE ? OR mq.quote LIKE ?
-            ''', (f'%{keyword}%', f'%{keyword}%', f'%{keyword}%', f'%{keyword}%', f'%{keyword}%'))
-            
+                SELECT c.name, MIN(character_search.rank) AS score
+                FROM character_search
+                JOIN characters c ON c.id = character_search.character_id
+                WHERE character_search MATCH ?
+                  AND character_search.rank MATCH 'bm25(0.0, 10.0, 1.0)'
+                GROUP BY c.id
+                ORDER BY score, c.name
+                LIMIT ?
+            ''', (match_query, -1 if limit is None else limit))
             names = [row[0] for row in cursor.fetchall()]
-            return [self.get_character_profile(name) for name in names]
+        
+        profiles = {profile['name']: profile for profile in self.get_character_profiles(names)}
+        return [profiles[name] for name in names if name in profiles]
     
     def get_character_relationships(self, name: str) -> Dict[str, Dict[str, Any]]:
         """获取角色的所有关系"""
@@ -377,7 +1163,7 @@ class CharacterDatabase:
         if not char_id:
             return {}
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT c2.name, cr.relationship_type, cr.description, cr.strength
@@ -389,13 +1175,14 @@ class CharacterDatabase:
             return {row[0]: {"type": row[1], "description": row[2], "strength": row[3]} 
                    for row in cursor.fetchall()}
     
+    @_writes
     def update_character(self, name: str, **kwargs):
         """更新角色信息"""
         char_id = self.get_character_id(name)
         if not char_id:
             raise ValueError(f"角色不存在: {name}")
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             
             # 更新基本信息
@@ -421,67 +1208,171 @@ class CharacterDatabase:
             if 'memorable_quotes' in kwargs:
                 self.add_memorable_quotes(char_id, kwargs['memorable_quotes'])
     
+    @_writes
     def delete_character(self, name: str):
         """删除角色"""
         char_id = self.get_character_id(name)
         if not char_id:
             raise ValueError(f"角色不存在: {name}")
         
-        with sqlite3.connect(self.db_path) as conn:
+        name = self.name_resolver.get_name(char_id)
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
+            cursor.execute('DELETE FROM character_aliases WHERE character_id = ?', (char_id,))
             cursor.execute('DELETE FROM characters WHERE id = ?', (char_id,))
+        
+        self.relationship_graph.remove_character(name)
+        self.name_resolver.remove_character(char_id)
     
-    def export_to_json(self, output_file: str = "characters_export.json"):
-        """导出所有角色数据到JSON文件"""
-        characters = self.get_all_characters()
+    def export_to_json(self, output_file: str = "characters_export.json", batch_size: int = 200):
+        """
+        导出所有角色数据到JSON文件
+        
+        按批加载角色档案并逐条写出，内存占用与单批大小相关，与角色总数无关。
+        输出格式与json.dump(角色列表, indent=2)一致。
+        
+        Args:
+            output_file: 输出文件路径
+            batch_size: 每批加载的角色数量
+        """
+        names = self.get_character_names()
         with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(characters, f, ensure_ascii=False, indent=2)
+            if not names:
+                f.write("[]")
+                return
+            
+            f.write("[\n")
+            first = True
+            for start in range(0, len(names), batch_size):
+                for profile in self.get_character_profiles(names[start:start + batch_size]):
+                    if not first:
+                        f.write(",\n")
+                    first = False
+                    encoded = json.dumps(profile, ensure_ascii=False, indent=2)
+                    f.write("\n".join("  " + line for line in encoded.split("\n")))
+            f.write("\n]")
     
-    def import_from_json(self, input_file: str):
-        """从JSON文件导入角色数据"""
+    def import_from_json(self, input_file: str) -> int:
+        """从JSON文件导入角色数据（单事务批量写入）"""
         with open(input_file, 'r', encoding='utf-8') as f:
             characters = json.load(f)
         
-        for char_data in characters:
-            name = char_data['name']
+        return self.import_characters(characters)
+    
+    @_writes
+    def import_characters(self, characters: List[Dict[str, Any]]) -> int:
+        """
+        批量导入角色数据
+        
+        所有写入在同一个事务中完成（只提交一次），各表使用executemany，
+        关系通过预先解析的 名称→ID 映射写入。任何一条数据出错都会整体回滚。
+        
+        Args:
+            characters: 角色数据列表，格式与export_to_json的输出一致
             
-            # 添加角色基本信息
-            char_id = self.add_character(
-                name, 
-                char_data.get('background_story', ''),
-                char_data.get('character_arc', '')
-            )
+        Returns:
+            导入的角色数量
+        """
+        if not characters:
+            return 0
+        
+        trait_rows, pattern_rows, quote_rows, relationship_rows, alias_rows = [], [], [], [], []
+        with self.connections.transaction() as conn:
+            cursor = conn.cursor()
+            
+            # 添加/更新角色基本信息（保留已有角色的ID）
+            cursor.executemany('''
+                INSERT INTO characters (name, background_story, character_arc, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(name) DO UPDATE SET
+                    background_story = excluded.background_story,
+                    character_arc = excluded.character_arc,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', [(char_data['name'],
+                   char_data.get('background_story', ''),
+                   char_data.get('character_arc', '')) for char_data in characters])
+            
+            cursor.execute('SELECT name, id FROM characters')
+            name_to_id = dict(cursor.fetchall())
+            
+            replaced = {"character_aliases": [], "personality_traits": [], "speech_patterns": [],
+                        "memorable_quotes": [], "character_relationships": []}
             
-            # 添加性格特征
-            if 'personality_traits' in char_data:
-                self.add_personality_traits(char_id, char_data['personality_traits'])
-            
-            # 添加说话特点
-            if 'speech_patterns' in char_data:
-                self.add_speech_patterns(char_id, char_data['speech_patterns'])
-            
-            # 添加经典台词
-            if 'memorable_quotes' in char_data:
-                quotes = []
-                for quote_data in char_data['memorable_quotes']:
-                    if isinstance(quote_data, dict):
-                        quotes.append((quote_data['quote'], quote_data.get('context', ''), quote_data.get('score', 0)))
-                    else:
-                        quotes.append((quote_data, '', 0))
-                self.add_memorable_quotes(char_id, quotes)
-            
-            # 添加关系
-            if 'relationships' in char_data:
-                for rel_name, rel_data in char_data['relationships'].items():
-                    if isinstance(rel_data, dict):
-                        self.add_relationship(name, rel_name, rel_data.get('type', ''), 
-                                            rel_data.get('description', ''), rel_data.get('strength', 1))
-                    else:
-                        self.add_relationship(name, rel_name, str(rel_data))
+            for char_data in characters:
+                char_id = name_to_id[char_data['name']]
+                
+                # 别名
+                if 'aliases' in char_data:
+                    replaced["character_aliases"].append((char_id,))
+                    alias_rows.extend((char_id, alias) for alias in char_data['aliases'])
+                
+                # 性格特征
+                if 'personality_traits' in char_data:
+                    replaced["personality_traits"].append((char_id,))
+                    trait_rows.extend((char_id, trait) for trait in char_data['personality_traits'])
+                
+                # 说话特点
+                if 'speech_patterns' in char_data:
+                    replaced["speech_patterns"].append((char_id,))
+                    pattern_rows.extend((char_id, pattern) for pattern in char_data['speech_patterns'])
+                
+                # 经典台词
+                if 'memorable_quotes' in char_data:
+                    replaced["memorable_quotes"].append((char_id,))
+                    for quote_data in char_data['memorable_quotes']:
+                        if isinstance(quote_data, dict):
+                            quote_rows.append((char_id, quote_data['quote'],
+                                               quote_data.get('context', ''), quote_data.get('score', 0)))
+                        else:
+                            quote_rows.append((char_id, quote_data, '', 0))
+                
+                # 关系
+                if 'relationships' in char_data:
+                    replaced["character_relationships"].append((char_id,))
+                    for rel_name, rel_data in char_data['relationships'].items():
+                        target_id = name_to_id.get(rel_name)
+                        if not target_id:
+                            raise ValueError(f"角色不存在: {char_data['name']} 或 {rel_name}")
+                        if isinstance(rel_data, dict):
+                            relationship_rows.append((char_id, target_id, rel_data.get('type', ''),
+                                                      rel_data.get('description', ''),
+                                                      rel_data.get('strength', 1)))
+                        else:
+                            relationship_rows.append((char_id, target_id, str(rel_data), '', 1))
+            
+            # 先清除将被覆盖的旧数据
+            id_columns = {"character_relationships": "character1_id"}
+            for table, ids in replaced.items():
+                if ids:
+                    column = id_columns.get(table, "character_id")
+                    cursor.executemany(f'DELETE FROM {table} WHERE {column} = ?', ids)
+            
+            cursor.executemany('''
+                INSERT INTO character_aliases (character_id, alias) VALUES (?, ?)
+            ''', alias_rows)
+            cursor.executemany('''
+                INSERT INTO personality_traits (character_id, trait) VALUES (?, ?)
+            ''', trait_rows)
+            cursor.executemany('''
+                INSERT INTO speech_patterns (character_id, pattern) VALUES (?, ?)
+            ''', pattern_rows)
+            cursor.executemany('''
+                INSERT INTO memorable_quotes (character_id, quote, context, popularity_score)
+                VALUES (?, ?, ?, ?)
+            ''', quote_rows)
+            cursor.executemany('''
+                INSERT OR REPLACE INTO character_relationships
+                (character1_id, character2_id, relationship_type, description, strength)
+                VALUES (?, ?, ?, ?, ?)
+            ''', relationship_rows)
+        
+        self.relationship_graph.invalidate()
+        self.name_resolver.invalidate()
+        return len(characters)
     
     def get_database_stats(self) -> Dict[str, Any]:
         """获取数据库统计信息"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute('SELECT COUNT(*) FROM characters')
@@ -496,14 +1387,14 @@ class CharacterDatabase:
             cursor.execute('SELECT AVG(popularity_score) FROM memorable_quotes')
             avg_score = cursor.fetchone()[0] or 0
             
-        cursor.execute('SELECT COUNT(*) FROM character_bloodline')
-        bloodline_count = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM spirit_words')
-        spirit_word_count = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM character_spirit_words')
-        character_spirit_word_count = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM character_bloodline')
+            bloodline_count = cursor.fetchone()[0]
+            
+            cursor.execute('SELECT COUNT(*) FROM spirit_words')
+            spirit_word_count = cursor.fetchone()[0]
+            
+            cursor.execute('SELECT COUNT(*) FROM character_spirit_words')
+            character_spirit_word_count = cursor.fetchone()[0]
         
         return {
             "character_count": char_count,
@@ -522,7 +1413,7 @@ class CharacterDatabase:
         if not char_id:
             return None
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT bloodline_level, bloodline_percentage, dragon_heritage, description
@@ -545,7 +1436,7 @@ class CharacterDatabase:
         if not char_id:
             return []
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT sw.name, sw.sequence_number, sw.dragon_name, sw.description,
@@ -576,7 +1467,7 @@ class CharacterDatabase:
     
     def get_all_spirit_words(self) -> List[Dict[str, Any]]:
         """获取所有言灵"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT name, sequence_number, dragon_name, description,
@@ -599,17 +1490,32 @@ class CharacterDatabase:
                 })
             return spirit_words
     
-    def search_spirit_words(self, keyword: str) -> List[Dict[str, Any]]:
-        """搜索言灵"""
-        with sqlite3.connect(self.db_path) as conn:
+    def search_spirit_words(self, keyword: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        搜索言灵（基于FTS5全文索引，按相关度排序）
+        
+        Args:
+            keyword: 搜索关键词（匹配名称、龙王名称、描述）
+            limit: 最多返回数量，None表示不限制
+            
+        Returns:
+            匹配的言灵列表，相关度高的在前
+        """
+        match_query = build_fts_query(keyword)
+        if not match_query:
+            return []
+        
+        with self.connections.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT name, sequence_number, dragon_name, description,
-                       effects, limitations, rarity_level
-                FROM spirit_words
-                WHERE name LIKE ? OR description LIKE ? OR dragon_name LIKE ?
-                ORDER BY sequence_number
-            ''', (f'%{keyword}%', f'%{keyword}%', f'%{keyword}%'))
+                SELECT sw.name, sw.sequence_number, sw.dragon_name, sw.description,
+                       sw.effects, sw.limitations, sw.rarity_level
+                FROM spirit_word_search
+                JOIN spirit_words sw ON sw.id = spirit_word_search.rowid
+                WHERE spirit_word_search MATCH ?
+                ORDER BY bm25(spirit_word_search, 10.0, 5.0, 1.0), sw.sequence_number
+                LIMIT ?
+            ''', (match_query, -1 if limit is None else limit))
             
             results = cursor.fetchall()
             spirit_words = []
@@ -625,7 +1531,6 @@ class CharacterDatabase:
                 })
             return spirit_words
 
-
 # 便捷函数
 def create_database(db_path: str = "characters.db") -> CharacterDatabase:
     """创建数据库实例"""
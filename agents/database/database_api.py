@@ -5,19 +5,23 @@
 
 import os
 import sys
+import threading
+from collections import OrderedDict
 sys.path.append(os.path.dirname(__file__))
 
 from character_database import CharacterDatabase, get_character_db
+from character_cards import MAIN_CHARACTERS, character_importance
 
 class CharacterAPI:
     """角色数据库API类"""
     
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, cache_size: int = 128):
         """
         初始化API
         
         Args:
             db_path: 数据库路径，默认使用database目录下的dragon_characters.db
+            cache_size: 角色档案缓存容量（LRU淘汰），0表示不缓存
         """
         if db_path is None:
             # 查找数据库文件
@@ -39,6 +43,20 @@ class CharacterAPI:
                 db_path = os.path.join(current_dir, "dragon_characters.db")
         
         self.db = CharacterDatabase(db_path)
+        
+        # 角色档案缓存：数据版本变化（任何写入）时整体失效
+        self.cache_size = cache_size
+        self._profile_cache = OrderedDict()
+        self._cache_version = None
+        self._cache_lock = threading.Lock()
+    
+    # ==================== 缓存管理 ====================
+    
+    def clear_cache(self):
+        """清空角色档案缓存"""
+        with self._cache_lock:
+            self._profile_cache.clear()
+            self._cache_version = None
     
     # ==================== 角色查询接口 ====================
     
@@ -46,13 +64,36 @@ class CharacterAPI:
         """
         获取角色档案
         
+        结果会被缓存，直到数据库发生写入。返回的字典为共享的缓存对象，请勿修改。
+        
         Args:
             name: 角色名称
             
         Returns:
             角色档案字典，如果不存在返回None
         """
-        return self.db.get_character_profile(name)
+        if self.cache_size <= 0:
+            return self.db.get_character_profile(name)
+        
+        version = self.db.data_version
+        with self._cache_lock:
+            if version != self._cache_version:
+                self._profile_cache.clear()
+                self._cache_version = version
+            elif name in self._profile_cache:
+                self._profile_cache.move_to_end(name)
+                return self._profile_cache[name]
+        
+        profile = self.db.get_character_profile(name)
+        
+        with self._cache_lock:
+            # 读取期间发生写入时不缓存，避免存入过期数据
+            if version == self._cache_version:
+                self._profile_cache[name] = profile
+                self._profile_cache.move_to_end(name)
+                while len(self._profile_cache) > self.cache_size:
+                    self._profile_cache.popitem(last=False)
+        return profile
     
     def get_character_detail(self, name: str) -> str:
         """
@@ -64,107 +105,86 @@ class CharacterAPI:
         Returns:
             格式化的角色详细信息字符串
         """
-        character = self.get_character(name)
-        if not character:
-            return f"角色 {name} 不存在"
-        
-        # 格式化输出
-        detail = f"📖 角色档案: {character['name']}\n"
-        detail += "=" * 50 + "\n"
-        
-        # 基本信息
-        detail += f"🎭 背景故事:\n{character['background_story']}\n\n"
-        
-        if character['character_arc']:
-            detail += f"📈 角色发展:\n{character['character_arc']}\n\n"
-        
-        # 性格特征
-        detail += f"🧠 性格特征:\n"
-        for i, trait in enumerate(character['personality_traits'], 1):
-            detail += f"  {i}. {trait}\n"
-        detail += "\n"
-        
-        # 说话特点
-        detail += f"💬 说话特点:\n"
-        for i, pattern in enumerate(character['speech_patterns'], 1):
-            detail += f"  {i}. {pattern}\n"
-        detail += "\n"
-        
-        # 经典台词
-        detail += f"🌟 经典台词:\n"
-        for i, quote_data in enumerate(character['memorable_quotes'][:5], 1):
-            quote = quote_data['quote']
-            context = quote_data.get('context', '')
-            score = quote_data.get('score', 0)
-            detail += f"  {i}. \"{quote}\"\n"
-            if context:
-                detail += f"     情境: {context}\n"
-            if score > 0:
-                detail += f"     评分: {score}/10\n"
-            detail += "\n"
+        card = self.db.get_character_card(name)
+        return card if card is not None else f"角色 {name} 不存在"
+    
+    def get_character_card(self, name: str, size: int = None) -> str:
+        """
+        获取预渲染的角色卡片（一次主键读取）
         
-        # 角色关系
-        relationships = character['relationships']
-        if relationships:
-            detail += f"🔗 重要关系:\n"
-            for rel_name, rel_data in relationships.items():
-                rel_type = rel_data['type']
-                strength = rel_data['strength']
-                description = rel_data.get('description', '')
-                detail += f"  • {rel_name}: {rel_type} (强度: {strength}/10)\n"
-                if description:
-                    detail += f"    描述: {description}\n"
-            detail += "\n"
+        Args:
+            name: 角色名称
+            size: 卡片长度，None为完整版（同get_character_detail），可选500或150
+            
+        Returns:
+            卡片文本，角色不存在时返回""
+        """
+        return self.db.get_character_card(name, size) or ""
+    
+    def get_character_cards(self, names: list, size: int = None) -> dict:
+        """
+        批量获取预渲染的角色卡片
         
-        # 血统信息
-        bloodline = self.get_character_bloodline(name)
-        if bloodline:
-            detail += f"🩸 血统信息:\n"
-            detail += f"   等级: {bloodline['bloodline_level']}\n"
-            detail += f"   纯度: {bloodline['bloodline_percentage']}%\n"
-            if bloodline['dragon_heritage']:
-                detail += f"   龙族血统: {bloodline['dragon_heritage']}\n"
-            if bloodline['description']:
-                detail += f"   描述: {bloodline['description']}\n"
-            detail += "\n"
+        Args:
+            names: 角色名称列表
+            size: 卡片长度，None为完整版，可选500或150
+            
+        Returns:
+            {角色名: 卡片文本}，不存在的角色不出现在结果中
+        """
+        return self.db.get_character_cards(names, size)
+    
+    def get_character_names(self) -> list:
+        """获取所有角色名称"""
+        return self.db.get_character_names()
+    
+    def resolve_name(self, name: str) -> str:
+        """
+        把角色名或别名（昵称、英文名、称号）解析为正式名
         
-        # 言灵信息
-        spirit_words = self.get_character_spirit_words(name)
-        if spirit_words:
-            detail += f"⚡ 言灵能力:\n"
-            for i, sw in enumerate(spirit_words, 1):
-                detail += f"   {i}. {sw['name']} (序列{sw['sequence_number']})\n"
-                detail += f"      掌握等级: {sw['mastery_level']}/5\n"
-                detail += f"      稀有度: {sw['rarity_level']}\n"
-                if sw['effects']:
-                    detail += f"      效果: {sw['effects']}\n"
-                if sw['activation_condition']:
-                    detail += f"      激活条件: {sw['activation_condition']}\n"
-                detail += "\n"
+        Returns:
+            角色正式名，未知名称返回None
+        """
+        return self.db.resolve_character_name(name)
+    
+    def resolve_names(self, names: list) -> dict:
+        """
+        批量解析角色名或别名
         
-        # 角色重要性
-        importance = self.get_character_importance(name)
-        relationship_count = len(relationships)
-        detail += f"⭐ 角色重要性: {importance} (关系数: {relationship_count})\n"
+        Returns:
+            {输入名称: 正式名或None}
+        """
+        return self.db.resolve_character_names(names)
+    
+    def find_character_mentions(self, text: str) -> dict:
+        """
+        找出文本中提到的已知角色（含别名写法）
         
-        return detail
+        Returns:
+            {角色正式名: 提及次数}
+        """
+        return self.db.find_character_mentions(text)
     
-    def get_character_names(self) -> list:
-        """获取所有角色名称"""
-        profiles = self.db.get_all_characters()
-        return [profile['name'] for profile in profiles if profile]
+    def get_character_aliases(self, name: str) -> list:
+        """获取角色的所有别名"""
+        return [item['alias'] for item in self.db.get_character_aliases(name)]
     
-    def search_characters(self, keyword: str) -> list:
+    def _canonical_name(self, name: str) -> str:
+        """别名转换为正式名，未知名称原样返回"""
+        return self.db.resolve_character_name(name) or name
+    
+    def search_characters(self, keyword: str, limit: int = None) -> list:
         """
         搜索角色
         
         Args:
             keyword: 搜索关键词
+            limit: 最多返回数量，默认不限制
             
         Returns:
-            匹配的角色档案列表
+            匹配的角色档案列表，按相关度排序
         """
-        return self.db.search_characters(keyword)
+        return self.db.search_characters(keyword, limit)
     
     # ==================== 关系查询接口 ====================
     
@@ -178,7 +198,7 @@ class CharacterAPI:
         Returns:
             关系字典 {角色名: {type, description, strength}}
         """
-        return self.db.get_character_relationships(character_name)
+        return self.db.relationship_graph.get_relationships(self._canonical_name(character_name))
     
     def get_relationship_strength(self, char1: str, char2: str) -> int:
         """
@@ -191,10 +211,9 @@ class CharacterAPI:
         Returns:
             关系强度 (1-10)，如果没有关系返回0
         """
-        relationships = self.get_relationships(char1)
-        if char2 in relationships:
-            return relationships[char2]['strength']
-        return 0
+        relationship = self.db.relationship_graph.get_relationship(
+            self._canonical_name(char1), self._canonical_name(char2))
+        return relationship['strength'] if relationship else 0
     
     def get_relationship_type(self, char1: str, char2: str) -> str:
         """
@@ -207,10 +226,9 @@ class CharacterAPI:
         Returns:
             关系类型，如果没有关系返回""
         """
-        relationships = self.get_relationships(char1)
-        if char2 in relationships:
-            return relationships[char2]['type']
-        return ""
+        relationship = self.db.relationship_graph.get_relationship(
+            self._canonical_name(char1), self._canonical_name(char2))
+        return relationship['type'] if relationship else ""
     
     def are_characters_related(self, char1: str, char2: str) -> bool:
         """
@@ -225,6 +243,53 @@ class CharacterAPI:
         """
         return self.get_relationship_strength(char1, char2) > 0
     
+    def get_related_characters(self, character_name: str, hops: int = 1,
+                               min_strength: int = 0) -> dict:
+        """
+        获取关系网络中的相关角色（不区分关系方向）
+        
+        Args:
+            character_name: 角色名称
+            hops: 最大跳数，1为直接关系
+            min_strength: 只沿强度不低于该值的关系扩展
+            
+        Returns:
+            {角色名: 跳数}，按由近到远排列
+        """
+        return self.db.relationship_graph.get_neighborhood(
+            self._canonical_name(character_name), hops, min_strength)
+    
+    def get_relationship_path(self, char1: str, char2: str) -> list:
+        """
+        获取两个角色之间关系最紧密的路径
+        
+        Args:
+            char1: 角色1名称
+            char2: 角色2名称
+            
+        Returns:
+            路径上的角色名列表（含两端），不连通时返回[]
+        """
+        result = self.db.relationship_graph.find_path(
+            self._canonical_name(char1), self._canonical_name(char2))
+        return result[0] if result else []
+    
+    def get_connecting_characters(self, char1: str, char2: str, max_hops: int = 2) -> list:
+        """
+        获取连接两个角色的中间人
+        
+        Args:
+            char1: 角色1名称
+            char2: 角色2名称
+            max_hops: 经过中间人的路径最大跳数，2为共同关系人
+            
+        Returns:
+            中间人名称列表，关系越近越靠前
+        """
+        connectors = self.db.relationship_graph.find_connectors(
+            self._canonical_name(char1), self._canonical_name(char2), max_hops)
+        return [connector['name'] for connector in connectors]
+    
     # ==================== 角色特征接口 ====================
     
     def get_personality_traits(self, character_name: str) -> list:
@@ -273,21 +338,11 @@ class CharacterAPI:
     
     def is_main_character(self, character_name: str) -> bool:
         """检查是否为主要角色"""
-        main_characters = ["路明非", "路鸣泽", "凯撒", "诺诺", "楚子航"]
-        return character_name in main_characters
+        return character_name in MAIN_CHARACTERS
     
     def get_character_importance(self, character_name: str) -> str:
         """获取角色重要性等级"""
-        if self.is_main_character(character_name):
-            return "主角"
-        
-        relationships = self.get_relationships(character_name)
-        if len(relationships) >= 5:
-            return "重要配角"
-        elif len(relationships) >= 2:
-            return "配角"
-        else:
-            return "龙套"
+        return character_importance(character_name, len(self.get_relationships(character_name)))
     
     # ==================== 血统和言灵接口 ====================
     
@@ -303,9 +358,9 @@ class CharacterAPI:
         """获取所有言灵"""
         return self.db.get_all_spirit_words()
     
-    def search_spirit_words(self, keyword: str) -> list:
-        """搜索言灵"""
-        return self.db.search_spirit_words(keyword)
+    def search_spirit_words(self, keyword: str, limit: int = None) -> list:
+        """搜索言灵（按相关度排序）"""
+        return self.db.search_spirit_words(keyword, limit)
     
     def get_spirit_word_info(self, spirit_word_name: str) -> dict:
         """获取特定言灵信息"""
@@ -0,0 +1,218 @@
+"""
+SQLite连接管理层
+为各个数据库提供线程级共享连接、WAL日志模式和统一的PRAGMA调优
+"""
+
+import sqlite3
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator
+
+
+class _ThreadConnection:
+    """一个线程持有的连接及其事务嵌套深度"""
+
+    __slots__ = ("conn", "depth", "generation", "finalizer", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection, generation: int):
+        self.conn = conn
+        self.depth = 0
+        self.generation = generation
+        self.finalizer = None
+
+
+class ConnectionManager:
+    """
+    SQLite连接管理类（每个线程复用一个连接）
+
+    所有连接都登记在管理器中：线程结束时它的连接随线程局部状态一起关闭，
+    close_all() 可以关闭任意线程创建的连接。
+    内存数据库（:memory:）每个连接都是独立的空库，因此只能在一个线程中使用。
+    """
+
+    def __init__(self, db_path: str, cache_size_kb: int = 8192,
+                 mmap_size: int = 64 * 1024 * 1024, cached_statements: int = 256,
+                 busy_timeout_ms: int = 5000):
+        """
+        初始化连接管理器
+
+        Args:
+            db_path: 数据库文件路径
+            cache_size_kb: 页缓存大小（KB）
+            mmap_size: 内存映射大小（字节）
+            cached_statements: 每个连接缓存的预编译语句数量
+            busy_timeout_ms: 等待写锁的超时时间（毫秒）
+        """
+        self.db_path = db_path
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        # 内存数据库所属的线程
+        self._memory_thread = None
+        # close_all() 后递增，使其他线程持有的旧连接失效
+        self._generation = 0
+        # 写入版本号：本进程内每次通过该管理器写入后递增（不需要查询数据库），
+        # 其他连接和进程的写入由上层在数据库中维护的计数判断
+        self.write_version = 0
+
+    def _open_connection(self) -> sqlite3.Connection:
+        """创建新连接并应用PRAGMA设置"""
+        if self.db_path == ":memory:":
+            thread = threading.get_ident()
+            with self._lock:
+                if self._memory_thread is None:
+                    self._memory_thread = thread
+                elif self._memory_thread != thread:
+                    raise ValueError("内存数据库(:memory:)只能在创建它的线程中使用，"
+                                     "多线程访问（如异步API的读线程池）请使用数据库文件")
+        # 连接只在所属线程中使用；允许跨线程是为了线程结束或close_all()时能关闭它
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False
+        )
+        cursor = conn.cursor()
+
+        # WAL模式：读者不再被写者阻塞
+        cursor.execute('PRAGMA journal_mode = WAL')
+        # WAL模式下NORMAL已足够安全，避免每次提交都fsync
+        cursor.execute('PRAGMA synchronous = NORMAL')
+        cursor.execute(f'PRAGMA cache_size = {-int(self.cache_size_kb)}')
+        cursor.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        cursor.execute('PRAGMA temp_store = MEMORY')
+        cursor.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        cursor.close()
+
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _thread_connection(self) -> _ThreadConnection:
+        """获取当前线程的连接状态（不存在或已被close_all()作废时创建）"""
+        state = getattr(self._local, 'state', None)
+        if state is None or state.generation != self._generation:
+            conn = self._open_connection()
+            state = _ThreadConnection(conn, self._generation)
+            # 线程结束后线程局部状态被回收，连接随之关闭
+            state.finalizer = weakref.finalize(state, self._discard, conn)
+            self._local.state = state
+        return state
+
+    def _discard(self, conn: sqlite3.Connection):
+        """注销并关闭连接"""
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def get_connection(self) -> sqlite3.Connection:
+        """获取当前线程的连接（不存在时创建）"""
+        return self._thread_connection().conn
+
+    def mark_written(self):
+        """递增写入版本号（写操作完成后调用）"""
+        with self._lock:
+            self.write_version += 1
+
+    def in_transaction(self) -> bool:
+        """当前线程是否处于 connection()/transaction() 块中"""
+        return self._thread_connection().depth > 0
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        获取连接的上下文管理器
+
+        语义与 `with sqlite3.connect(...) as conn` 一致：正常退出时提交，
+        异常时回滚。嵌套使用时只有最外层负责提交或回滚。
+        """
+        state = self._thread_connection()
+        conn = state.conn
+        state.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            state.depth -= 1
+            if state.depth == 0:
+                conn.rollback()
+            raise
+        else:
+            state.depth -= 1
+            if state.depth == 0:
+                conn.commit()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        显式写事务（BEGIN IMMEDIATE）
+
+        事务内的所有写操作在退出时一次性提交，只触发一次fsync。
+        嵌套调用会并入最外层事务。
+        """
+        state = self._thread_connection()
+        if state.depth == 0 and not state.conn.in_transaction:
+            state.conn.execute('BEGIN IMMEDIATE')
+        with self.connection() as conn:
+            yield conn
+
+    def close(self):
+        """关闭当前线程的连接"""
+        state = getattr(self._local, 'state', None)
+        if state is not None:
+            state.finalizer()
+            self._local.state = None
+
+    def close_all(self):
+        """关闭所有线程的连接（用于程序退出，调用时其他线程不应正在使用连接）"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+            self._memory_thread = None
+        for conn in connections:
+            conn.close()
+        self._local.state = None
+
+
+def writes(method: Callable) -> Callable:
+    """
+    标记写数据库的方法
+
+    异步API（async_api）据此把调用放入单写线程的写队列，未标记的方法在读线程池中执行，
+    因此未标记的方法不能写数据库。
+    """
+    method.writes_database = True
+    return method
+
+def is_write_method(method: Callable) -> bool:
+    """方法是否标记为写操作（绑定方法会读取底层函数上的标记）"""
+    return getattr(method, 'writes_database', False)
+
+
+# 全局连接管理器注册表（同一数据库文件共享一个管理器）
+_managers: Dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+def get_connection_manager(db_path: str) -> ConnectionManager:
+    """获取指定数据库文件的共享连接管理器"""
+    key = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(db_path)
+            _managers[key] = manager
+        return manager
+
+def close_all_connections():
+    """关闭所有已注册的连接管理器"""
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        manager.close_all()
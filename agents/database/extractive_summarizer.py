@@ -0,0 +1,335 @@
+"""
+离线抽取式摘要
+不调用AI，从输入记录中挑选最有代表性的句子和取值组成合并节点：
+按中文标点切分句子，用字符二元组的TF-IDF向量计算句子相似度，再用TextRank排序。
+耗时只有毫秒级，可以作为合并树较低层的第一层生成方式（AI调用只留给树的顶部），
+也是没有API密钥时的模拟模式
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from chapter_facets import merge_facet_values, split_facet_values
+
+try:
+    import numpy as np
+except ImportError:  # 没有numpy时使用纯Python实现（结果相同，句子多时较慢）
+    np = None
+
+# 生成方式标识（见AIMergeInterface.generator_id），用于区分缓存结果
+GENERATOR_ID = "extractive"
+
+# 句子切分：句末标点之后切分，句末标点后紧跟的引号、括号属于前一句
+_SENTENCE_BREAK = re.compile(
+    r"(?<=[。！？!?；;…][”’」』）)\"'])|(?<=[。！？!?；;…])(?![”’」』）)\"'。！？!?；;….])"
+    r"|(?<=\.\.\.)(?![”’」』）)\"'.])|\n+"
+)
+_SENTENCE_END = re.compile(r"(?:[。！？!?；;…]|\.\.\.)[”’」』）)\"']?$")
+
+# 参与计算的字符：连续的汉字切为二元组，连续的字母数字作为一个词
+_TOKENS = re.compile(r"[A-Za-z0-9]+|[㐀-䶿一-鿿]+")
+
+# TextRank的阻尼系数、收敛阈值和最大迭代次数
+DAMPING = 0.85
+TOLERANCE = 1e-6
+MAX_ITERATIONS = 100
+
+# 摘要句子的最少文字数（更短的片段只在没有其他句子时使用）
+MIN_SENTENCE_CHARS = 6
+
+# 参与TextRank的句子数上限，超过时先按TF-IDF得分预选
+MAX_RANKED_SENTENCES = 300
+
+# 与已选句子的相似度超过该值时视为重复，不再选入
+REDUNDANCY = 0.6
+
+# 计算相似度时每批最多生成的(句子, 句子)乘积项数
+PAIR_BATCH = 1 << 20
+
+# 合并节点各字段的长度限制
+SUMMARY_SENTENCES = 4
+SUMMARY_CHARS = 240
+PLOT_POINT_SENTENCES = 2
+PLOT_POINT_CHARS = 120
+KEY_EVENT_LIMIT = 8
+CHARACTER_LIMIT = 8
+SETTING_LIMIT = 6
+MOOD_LIMIT = 5
+THEME_LIMIT = 5
+
+
+def split_sentences(text: Optional[str]) -> List[str]:
+    """按中文（及英文）句末标点和换行切分句子，去掉没有文字的片段"""
+    if not text:
+        return []
+    return [sentence.strip() for sentence in _SENTENCE_BREAK.split(text)
+            if sentence and _TOKENS.search(sentence)]
+
+
+def char_bigrams(text: str) -> List[str]:
+    """文本的词项：汉字的字符二元组（单个汉字时为该字），字母数字串整体小写"""
+    terms = []
+    for run in _TOKENS.findall(text):
+        if run.isascii():
+            terms.append(run.lower())
+        elif len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[index:index + 2] for index in range(len(run) - 1))
+    return terms
+
+
+class _TfidfModel:
+    """一组句子的TF-IDF得分，以及（需要时）行L2归一化后的两两余弦相似度"""
+
+    def __init__(self, sentences: Sequence[str], with_similarity: bool = True):
+        self.size = len(sentences)
+        terms = [char_bigrams(sentence) for sentence in sentences]
+        vocabulary = {}
+        if np is not None:
+            # 稀疏(行, 列)坐标：按线性下标聚合出词频，再按列统计文档频率
+            rows = np.fromiter((row for row, row_terms in enumerate(terms) for _ in row_terms),
+                               dtype=np.int64)
+            cols = np.fromiter((vocabulary.setdefault(term, len(vocabulary))
+                                for row_terms in terms for term in row_terms), dtype=np.int64)
+            width = max(len(vocabulary), 1)
+            keys, counts = np.unique(rows * width + cols, return_counts=True)
+            rows, cols = keys // width, keys % width
+            document_frequency = np.bincount(cols, minlength=width)
+            idf = np.log((1 + self.size) / (1 + document_frequency)) + 1
+            weights = counts * idf[cols]
+            # 句子的TF-IDF得分：词项权重之和除以词项数（偏好信息密度高的句子）
+            lengths = np.maximum(np.bincount(rows, minlength=self.size,
+                                             weights=counts), 1)
+            self.scores = np.bincount(rows, minlength=self.size, weights=weights) / lengths
+            if not with_similarity:
+                return
+            norms = np.sqrt(np.bincount(rows, minlength=self.size, weights=weights * weights))
+            self.similarity = _gram_matrix(rows, cols, weights / norms[rows], self.size)
+            np.fill_diagonal(self.similarity, 0.0)
+            return
+
+        counts = [Counter(row_terms) for row_terms in terms]
+        document_frequency = Counter(term for row in counts for term in row)
+        idf = {term: math.log((1 + self.size) / (1 + frequency)) + 1
+               for term, frequency in document_frequency.items()}
+        self.vectors = []
+        self.scores = []
+        for row in counts:
+            weights = {term: count * idf[term] for term, count in row.items()}
+            self.scores.append(sum(weights.values()) / max(sum(row.values()), 1))
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            self.vectors.append({term: weight / norm for term, weight in weights.items()})
+        if not with_similarity:
+            return
+        self.similarity = [[0.0 if left == right else self._dot(left, right)
+                            for right in range(self.size)] for left in range(self.size)]
+
+    def _dot(self, left: int, right: int) -> float:
+        small, large = sorted((self.vectors[left], self.vectors[right]), key=len)
+        return sum(weight * large.get(term, 0.0) for term, weight in small.items())
+
+    def textrank(self) -> List[float]:
+        """在相似度图上迭代TextRank得分"""
+        size = self.size
+        if size == 0:
+            return []
+        if np is not None:
+            row_sums = self.similarity.sum(axis=1, keepdims=True)
+            # 与其他句子都不相似的句子把得分均匀分给所有句子
+            transition = np.where(row_sums > 0, self.similarity / np.where(row_sums > 0, row_sums, 1),
+                                  1.0 / size)
+            ranks = np.full(size, 1.0 / size)
+            for _ in range(MAX_ITERATIONS):
+                updated = (1 - DAMPING) / size + DAMPING * (transition.T @ ranks)
+                converged = np.abs(updated - ranks).sum() < TOLERANCE
+                ranks = updated
+                if converged:
+                    break
+            return ranks.tolist()
+
+        row_sums = [sum(row) for row in self.similarity]
+        ranks = [1.0 / size] * size
+        for _ in range(MAX_ITERATIONS):
+            updated = []
+            for target in range(size):
+                incoming = sum(ranks[source] * (self.similarity[source][target] / row_sums[source]
+                                                if row_sums[source] else 1.0 / size)
+                               for source in range(size))
+                updated.append((1 - DAMPING) / size + DAMPING * incoming)
+            converged = sum(abs(new - old) for new, old in zip(updated, ranks)) < TOLERANCE
+            ranks = updated
+            if converged:
+                break
+        return ranks
+
+    def pair_similarity(self, left: int, right: int) -> float:
+        return float(self.similarity[left][right])
+
+
+def _gram_matrix(rows, cols, values, size: int):
+    """
+    由稀疏坐标(行, 列, 值)表示的矩阵M计算 M @ M.T（size×size）
+
+    按列分组，同一列中的每对元素贡献一个乘积，不生成句子数×词表大小的稠密矩阵；
+    乘积项分批累加，每批最多PAIR_BATCH项。
+    """
+    order = np.argsort(cols, kind="stable")
+    rows, cols, values = rows[order], cols[order], values[order]
+    count = len(cols)
+    starts = np.flatnonzero(np.r_[True, cols[1:] != cols[:-1]])
+    lengths = np.diff(np.r_[starts, count])
+    # 每个元素所在列的起始位置和元素数：它与这一段中的每个元素各组成一对
+    partner_starts = np.repeat(starts, lengths)
+    partner_counts = np.repeat(lengths, lengths)
+    pair_ends = np.cumsum(partner_counts)
+
+    gram = np.zeros(size * size)
+    begin = 0
+    while begin < count:
+        limit = pair_ends[begin] - partner_counts[begin] + PAIR_BATCH
+        end = max(int(np.searchsorted(pair_ends, limit, side="right")), begin + 1)
+        counts = partner_counts[begin:end]
+        left = np.repeat(np.arange(begin, end), counts)
+        offsets = np.arange(len(left)) - np.repeat(np.cumsum(counts) - counts, counts)
+        right = np.repeat(partner_starts[begin:end], counts) + offsets
+        gram += np.bincount(rows[left] * size + rows[right],
+                            weights=values[left] * values[right], minlength=size * size)
+        begin = end
+    return gram.reshape(size, size)
+
+
+def _rank(sentences: Sequence[str]) -> Tuple[List[int], List[int], _TfidfModel]:
+    """
+    TextRank排序
+
+    Returns:
+        (参与排序的句子序号, 按重要性排列的候选位置, 候选句子的TF-IDF模型)
+    """
+    candidates = list(range(len(sentences)))
+    if len(candidates) > MAX_RANKED_SENTENCES:
+        scores = _TfidfModel(sentences, with_similarity=False).scores
+        candidates = sorted(sorted(candidates, key=lambda index: -scores[index])
+                            [:MAX_RANKED_SENTENCES])
+    model = _TfidfModel([sentences[index] for index in candidates])
+    ranks = model.textrank()
+    # 得分先取整，避免浮点误差让两种实现的并列句子顺序不同
+    order = sorted(range(len(candidates)), key=lambda index: (-round(ranks[index], 9), index))
+    return candidates, order, model
+
+
+def rank_sentences(sentences: Sequence[str]) -> List[int]:
+    """
+    句子按重要性排序
+
+    句子超过MAX_RANKED_SENTENCES时先按TF-IDF得分保留前MAX_RANKED_SENTENCES句，
+    再在相似度图上用TextRank排序。
+
+    Returns:
+        句子序号，从最重要到最不重要（只包含参与TextRank的句子）
+    """
+    candidates, order, _ = _rank(sentences)
+    return [candidates[position] for position in order]
+
+
+def _select(sentences: Sequence[str], max_items: int, max_chars: Optional[int]) -> List[int]:
+    """按TextRank顺序选句：跳过与已选句子重复的句子，满足数量和字数限制，返回原文顺序的序号"""
+    if len(sentences) <= 1:
+        return list(range(len(sentences)))
+    # 去重直接使用排序时的相似度，不重新计算TF-IDF
+    candidates, order, model = _rank(sentences)
+    chosen = []
+    length = 0
+    for position in order:
+        index = candidates[position]
+        if len(chosen) >= max_items:
+            break
+        if max_chars is not None and chosen and length + len(sentences[index]) > max_chars:
+            continue
+        if any(model.pair_similarity(position, other) > REDUNDANCY for other, _ in chosen):
+            continue
+        chosen.append((position, index))
+        length += len(sentences[index])
+    return sorted(index for _, index in chosen)
+
+
+def summarize(texts: Sequence[Optional[str]], max_sentences: int = SUMMARY_SENTENCES,
+              max_chars: Optional[int] = SUMMARY_CHARS) -> str:
+    """
+    从多段文本中抽取摘要
+
+    Args:
+        texts: 按叙事顺序排列的文本（如各章节摘要）
+        max_sentences: 最多选取的句子数
+        max_chars: 摘要的字数上限（至少保留一句），None表示不限制
+
+    Returns:
+        按原文顺序拼接的摘要句子
+    """
+    sentences = [sentence for text in texts for sentence in split_sentences(text)]
+    sentences = [sentence for sentence in sentences
+                 if sum(map(len, _TOKENS.findall(sentence))) >= MIN_SENTENCE_CHARS] or sentences
+    selected = [sentences[index] for index in _select(sentences, max_sentences, max_chars)]
+    return "".join(sentence if _SENTENCE_END.search(sentence) else sentence + "。"
+                   for sentence in selected)
+
+
+def representative(candidates: Sequence[Optional[str]], texts: Sequence[Optional[str]]) -> str:
+    """
+    选出与全部文本最接近的候选（如从各章节标题中选出合并节点的标题）
+
+    候选和文本的句子一起计算TextRank，返回得分最高的候选；没有候选时返回空字符串。
+    """
+    candidates = [candidate.strip() for candidate in candidates if candidate and candidate.strip()]
+    if len(set(candidates)) <= 1:
+        return candidates[0] if candidates else ""
+    sentences = candidates + [sentence for text in texts for sentence in split_sentences(text)]
+    for index in rank_sentences(sentences):
+        if index < len(candidates):
+            return candidates[index]
+    return candidates[0]
+
+
+def _top_values(texts: Sequence[Optional[str]], facet: str, limit: int) -> List[str]:
+    """出现在最多记录中的取值（保持首次出现的顺序）"""
+    values = merge_facet_values(texts, facet)
+    if len(values) <= limit:
+        return values
+    frequency = Counter(value for text in texts for value in split_facet_values(text, facet))
+    kept = set(sorted(values, key=lambda value: -frequency[value])[:limit])
+    return [value for value in values if value in kept]
+
+
+def _key_events(texts: Sequence[Optional[str]], limit: int) -> List[str]:
+    """关键事件：超过上限时按TextRank保留最重要的事件（保持时间顺序）"""
+    events = merge_facet_values(texts, "key_events")
+    return [events[index] for index in _select(events, limit, None)]
+
+
+def extract_merge_node(records: Sequence[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    从章节（或下一层合并节点）记录中抽取合并节点
+
+    Args:
+        records: 按章节顺序排列的记录，字段同合并节点（title/summary/plot_point/...）
+
+    Returns:
+        合并节点信息
+    """
+    def column(field):
+        return [record.get(field) for record in records]
+
+    summaries = column("summary")
+    return {
+        "title": representative(column("title"), summaries) or "未知章节",
+        "summary": summarize(summaries) or "无章节信息",
+        "plot_point": summarize(column("plot_point"), PLOT_POINT_SENTENCES, PLOT_POINT_CHARS),
+        "key_events": " → ".join(_key_events(column("key_events"), KEY_EVENT_LIMIT)),
+        "character_focus": "，".join(_top_values(column("character_focus"), "character_focus",
+                                                CHARACTER_LIMIT)),
+        "setting": " → ".join(_top_values(column("setting"), "setting", SETTING_LIMIT)),
+        "mood": "、".join(_top_values(column("mood"), "mood", MOOD_LIMIT)),
+        "themes": "、".join(_top_values(column("themes"), "themes", THEME_LIMIT))
+    }
@@ -9,6 +9,7 @@ sys.path.append(os.path.dirname(__file__))
 from typing import List, Dict, Any
 import json
 from ai_merge_interface import AIMergeInterface
+from extractive_summarizer import extract_merge_node
 
 class MergeAgent:
     """合并节点生成Agent"""
@@ -51,6 +52,11 @@ class MergeAgent:
 7. 主题要体现深层含义
 """
     
+    @property
+    def generator_id(self) -> str:
+        """生成合并节点的方式（见AIMergeInterface.generator_id）"""
+        return self.ai_interface.generator_id
+    
     def generate_merge_node(self, chapters: List[Dict[str, Any]]) -> Dict[str, str]:
         """
         为章节列表生成合并节点（使用AI）
@@ -65,6 +71,24 @@ class MergeAgent:
         # 直接使用AI接口生成合并节点
         return self.ai_interface.generate_merge_node(chapters)
     
+    async def generate_merge_node_async(self, chapters: List[Dict[str, Any]]) -> Dict[str, str]:
+        """为章节列表生成合并节点（异步）"""
+        return await self.ai_interface.generate_merge_node_async(chapters)
+    
+    async def generate_merge_nodes_async(self, chapter_groups: List[List[Dict[str, Any]]],
+                                         max_concurrency: int = 4) -> List[Dict[str, str]]:
+        """
+        并发生成多个互不依赖的合并节点
+        
+        Args:
+            chapter_groups: 每个合并节点的章节信息列表
+            max_concurrency: 同时进行的AI调用数上限
+            
+        Returns:
+            与chapter_groups顺序一致的合并节点
+        """
+        return await self.ai_interface.generate_merge_nodes_async(chapter_groups, max_concurrency)
+    
     def _format_chapters_for_agent(self, chapters: List[Dict[str, Any]]) -> str:
         """格式化章节信息供Agent处理"""
         
@@ -87,236 +111,8 @@ class MergeAgent:
         return "\n".join(formatted_info)
     
     def _simulate_ai_merge(self, chapters: List[Dict[str, Any]], prompt: str) -> Dict[str, str]:
-        """模拟AI合并结果（实际使用时替换为真实AI调用）"""
-        
-        # 分析章节信息
-        chapter_titles = [ch.get('title', '') for ch in chapters]
-        chapter_summaries = [ch.get('summary', '') for ch in chapters]
-        
-        # 生成智能合并的标题
-        merged_title = self._generate_smart_title(chapter_titles, chapters)
-        
-        # 生成智能合并的摘要
-        merged_summary = self._generate_smart_summary(chapter_summaries, chapters)
-        
-        # 合并其他信息
-        plot_point = self._merge_plot_points(chapters)
-        key_events = self._merge_key_events(chapters)
-        character_focus = self._merge_character_focus(chapters)
-        setting = self._merge_setting(chapters)
-        mood = self._merge_mood(chapters)
-        themes = self._merge_themes(chapters)
-        
-        return {
-            "title": merged_title,
-            "summary": merged_summary,
-            "plot_point": plot_point,
-            "key_events": key_events,
-            "character_focus": character_focus,
-            "setting": setting,
-            "mood": mood,
-            "themes": themes
-        }
-    
-    def _generate_smart_title(self, titles: List[str], chapters: List[Dict]) -> str:
-        """生成智能合并标题"""
-        
-        if not titles:
-            return "未知章节"
-        
-        # 分析标题模式
-        if len(titles) == 1:
-            return titles[0]
-        
-        # 提取关键词
-        keywords = self._extract_title_keywords(titles)
-        
-        # 根据章节内容生成主题性标题
-        chapter_count = len(chapters)
-        
-        # 分析章节类型
-        if any("龙王" in str(ch.get('summary', '')) for ch in chapters):
-            return f"龙王篇章（第{chapter_count}章合并）"
-        elif any("学院" in str(ch.get('summary', '')) for ch in chapters):
-            return f"学院篇章（第{chapter_count}章合并）"
-        elif any("血统" in str(ch.get('summary', '')) for ch in chapters):
-            return f"血统觉醒（第{chapter_count}章合并）"
-        elif any("任务" in str(ch.get('summary', '')) for ch in chapters):
-            return f"任务篇章（第{chapter_count}章合并）"
-        else:
-            # 使用第一个和最后一个标题的关键词
-            first_keywords = self._extract_keywords_from_title(titles[0])
-            last_keywords = self._extract_keywords_from_title(titles[-1])
-            
-            if first_keywords and last_keywords:
-                return f"{first_keywords[0]} → {last_keywords[0]}"
-            else:
-                return f"第{chapter_count}章合并"
-    
-    def _generate_smart_summary(self, summaries: List[str], chapters: List[Dict]) -> str:
-        """生成智能合并摘要"""
-        
-        if not summaries:
-            return "无摘要信息"
-        
-        if len(summaries) == 1:
-            return summaries[0]
-        
-        # 分析摘要内容，提取关键情节线
-        key_themes = self._extract_key_themes(summaries)
-        character_arcs = self._extract_character_arcs(summaries)
-        plot_progression = self._analyze_plot_progression(summaries)
-        
-        # 生成连贯的合并摘要
-        merged_summary = f"【{len(summaries)}个章节的合并摘要】"
-        
-        if plot_progression:
-            merged_summary += f" 故事从{plot_progression['start']}发展到{plot_progression['end']}，"
-        
-        if character_arcs:
-            merged_summary += f" 主要角色{', '.join(character_arcs)}经历了重要变化，"
-        
-        if key_themes:
-            merged_summary += f" 核心围绕{', '.join(key_themes)}展开。"
-        
-        # 添加开头和结尾的关键信息
-        if len(summaries) >= 2:
-            start_summary = summaries[0][:100] + "..." if len(summaries[0]) > 100 else summaries[0]
-            end_summary = summaries[-1][:100] + "..." if len(summaries[-1]) > 100 else summaries[-1]
-            
-            merged_summary += f" 章节开始：{start_summary} 章节结束：{end_summary}"
-        
-        return merged_summary
-    
-    def _extract_title_keywords(self, titles: List[str]) -> List[str]:
-        """从标题中提取关键词"""
-        keywords = []
-        for title in titles:
-            words = self._extract_keywords_from_title(title)
-            keywords.extend(words)
-        return list(set(keywords))  # 去重
-    
-    def _extract_keywords_from_title(self, title: str) -> List[str]:
-        """从单个标题中提取关键词"""
-        # 简单的关键词提取逻辑
-        important_words = ["龙王", "学院", "血统", "任务", "战斗", "学院", "诺诺", "路明非", "恺撒", "楚子航"]
-        found_keywords = []
-        
-        for word in important_words:
-            if word in title:
-                found_keywords.append(word)
-        
-        return found_keywords
-    
-    def _extract_key_themes(self, summaries: List[str]) -> List[str]:
-        """从摘要中提取关键主题"""
-        themes = []
-        
-        # 主题关键词
-        theme_keywords = {
-            "成长": ["成长", "发展", "变化", "成熟"],
-            "友谊": ["友谊", "朋友", "关系", "合作"],
-            "战斗": ["战斗", "对决", "攻击", "击败"],
-            "探索": ["探索", "发现", "寻找", "调查"],
-            "危机": ["危机", "危险", "威胁", "困境"],
-            "爱情": ["爱情", "感情", "喜欢", "心动"]
-        }
-        
-        all_text = " ".join(summaries)
-        
-        for theme, keywords in theme_keywords.items():
-            if any(keyword in all_text for keyword in keywords):
-                themes.append(theme)
-        
-        return themes
-    
-    def _extract_character_arcs(self, summaries: List[str]) -> List[str]:
-        """从摘要中提取角色发展弧线"""
-        characters = []
-        
-        # 主要角色关键词
-        character_keywords = ["路明非", "诺诺", "恺撒", "楚子航", "昂热", "龙王", "叶胜", "亚纪"]
-        
-        all_text = " ".join(summaries)
-        
-        for char in character_keywords:
-            if char in all_text:
-                characters.append(char)
-        
-        return characters
-    
-    def _analyze_plot_progression(self, summaries: List[str]) -> Dict[str, str]:
-        """分析情节发展进程"""
-        if not summaries:
-            return {}
-        
-        # 分析开头和结尾的情节状态
-        start_summary = summaries[0]
-        end_summary = summaries[-1]
-        
-        # 简单的情节状态分析
-        start_state = "平静开始" if "平静" in start_summary or "日常" in start_summary else "紧张开始"
-        end_state = "危机结束" if "危机" in end_summary or "战斗" in end_summary else "平静结束"
-        
-        return {
-            "start": start_state,
-            "end": end_state
-        }
-    
-    def _merge_plot_points(self, chapters: List[Dict]) -> str:
-        """合并情节要点"""
-        points = [ch.get('plot_point', '') for ch in chapters if ch.get('plot_point')]
-        return " → ".join(points) if points else ""
-    
-    def _merge_key_events(self, chapters: List[Dict]) -> str:
-        """合并关键事件"""
-        events = [ch.get('key_events', '') for ch in chapters if ch.get('key_events')]
-        return " → ".join(events) if events else ""
-    
-    def _merge_character_focus(self, chapters: List[Dict]) -> str:
-        """合并角色焦点"""
-        characters = []
-        for ch in chapters:
-            if ch.get('character_focus'):
-                characters.extend(ch['character_focus'].split('，'))
-        
-        # 去重并保持顺序
-        unique_characters = []
-        seen = set()
-        for char in characters:
-            char = char.strip()
-            if char and char not in seen:
-                unique_characters.append(char)
-                seen.add(char)
-        
-        return "，".join(unique_characters) if unique_characters else ""
-    
-    def _merge_setting(self, chapters: List[Dict]) -> str:
-        """合并场景设定"""
-        settings = [ch.get('setting', '') for ch in chapters if ch.get('setting')]
-        return " → ".join(settings) if settings else ""
-    
-    def _merge_mood(self, chapters: List[Dict]) -> str:
-        """合并氛围描述"""
-        moods = []
-        for ch in chapters:
-            if ch.get('mood'):
-                moods.extend(ch['mood'].split('、'))
-        
-        # 去重
-        unique_moods = list(dict.fromkeys([mood.strip() for mood in moods if mood.strip()]))
-        return "、".join(unique_moods) if unique_moods else ""
-    
-    def _merge_themes(self, chapters: List[Dict]) -> str:
-        """合并主题分析"""
-        themes = []
-        for ch in chapters:
-            if ch.get('themes'):
-                themes.extend(ch['themes'].split('、'))
-        
-        # 去重
-        unique_themes = list(dict.fromkeys([theme.strip() for theme in themes if theme.strip()]))
-        return "、".join(unique_themes) if unique_themes else ""
+        """模拟AI合并结果（离线抽取式摘要，见extractive_summarizer）"""
+        return extract_merge_node(chapters)
     
     def _single_chapter_merge(self, chapter: Dict[str, Any]) -> Dict[str, str]:
         """单章节合并（直接返回）"""
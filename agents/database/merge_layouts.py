@@ -0,0 +1,190 @@
+"""
+合并树的分层布局
+决定每一层把哪些章节合并成一个节点，并统计两种布局需要的AI调用次数
+
+- blocks：第k层每merge_factor**k个原始章节合并为一个节点，每层都从原始章节重新合并，
+  最右边不满的块随新章节加入反复重新生成
+- segment：第1层每merge_factor个章节合并为一个节点，第k层把第k-1层的merge_factor个节点
+  合并为一个节点；只合并完整的块，节点一旦生成就不再变化。
+  每个章节在每一层恰好被概括一次，合并视图由覆盖全部章节的最少节点组成（类似树状数组的分解）
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+LAYOUTS = ("blocks", "segment")
+
+# 保留详细内容、不参与合并的最近章节数
+RECENT_CHAPTERS = 3
+
+
+def calculate_layers(total_chapters: int, merge_factor: int) -> int:
+    """blocks布局需要的合并层数"""
+    layers = 0
+    remaining = total_chapters
+    while remaining > merge_factor:
+        remaining = (remaining + merge_factor - 1) // merge_factor
+        layers += 1
+    return layers
+
+
+def mergeable_count(total_chapters: int) -> int:
+    """参与合并的章节数（最近的章节保留详细内容）"""
+    return total_chapters - min(RECENT_CHAPTERS, total_chapters)
+
+
+def block_ranges(count: int, layer: int, merge_factor: int) -> List[Tuple[int, int]]:
+    """blocks布局第layer层的块 [(起始序号, 结束序号)]，最后一块可以不满"""
+    size = merge_factor ** layer
+    return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+
+def segment_ranges(count: int, layer: int, merge_factor: int) -> List[Tuple[int, int]]:
+    """segment布局第layer层的完整块 [(起始序号, 结束序号)]"""
+    size = merge_factor ** layer
+    return [(start, start + size) for start in range(0, count - size + 1, size)]
+
+
+def segment_layers(count: int, merge_factor: int) -> int:
+    """segment布局的层数（最高层至少有一个完整的块）"""
+    layers = 0
+    while count >= merge_factor ** (layers + 1):
+        layers += 1
+    return layers
+
+
+def segment_cover(count: int, merge_factor: int) -> Tuple[List[Tuple[int, int, int]], int]:
+    """
+    用最少的segment节点覆盖前count个章节
+
+    从最高层开始，每层取能放下的完整块，剩余部分交给下一层。
+    每层最多merge_factor-1个节点（最高层除外），合并视图的长度为O(merge_factor·log n)。
+
+    Returns:
+        ([(层, 起始序号, 结束序号)]按章节顺序, 未被任何节点覆盖的第一个章节序号)
+    """
+    cover = []
+    position = 0
+    for layer in range(segment_layers(count, merge_factor), 0, -1):
+        size = merge_factor ** layer
+        while position + size <= count:
+            cover.append((layer, position, position + size))
+            position += size
+    return cover, position
+
+
+def _node_inputs(layout: str, layer: int, start: int, end: int, merge_factor: int) -> int:
+    """生成节点时送给AI的记录数：blocks为原始章节数，segment为下一层的节点数"""
+    if layout == "segment" and layer > 1:
+        return merge_factor
+    return end - start
+
+
+def count_merge_calls(total_chapters: int, merge_factor: int, layout: str) -> Dict[str, int]:
+    """
+    从零生成一个合并视图需要的AI调用
+
+    Returns:
+        {'calls': AI调用次数, 'inputs': 送给AI的记录总数}（单章节的块不调用AI）
+    """
+    count = mergeable_count(total_chapters)
+    if layout == "blocks":
+        layers = range(1, calculate_layers(total_chapters, merge_factor) + 1)
+        nodes = [(layer, start, end) for layer in layers
+                 for start, end in block_ranges(count, layer, merge_factor)]
+    else:
+        layers = range(1, segment_layers(count, merge_factor) + 1)
+        nodes = [(layer, start, end) for layer in layers
+                 for start, end in segment_ranges(count, layer, merge_factor)]
+    return _tally(nodes, merge_factor, layout)
+
+
+def count_incremental_calls(total_chapters: int, merge_factor: int, layout: str) -> Dict[str, int]:
+    """
+    逐章写作（每写完一章生成一次合并视图，已生成的节点保存复用）到total_chapters章的累计AI调用
+
+    Returns:
+        {'calls': AI调用次数, 'inputs': 送给AI的记录总数}
+    """
+    new_nodes = []
+    built_layers = 0
+    for written in range(1, total_chapters + 1):
+        count = mergeable_count(written)
+        if layout == "blocks":
+            layers, ranges = calculate_layers(written, merge_factor), block_ranges
+        else:
+            layers, ranges = segment_layers(count, merge_factor), segment_ranges
+        for layer in range(1, layers + 1):
+            if layer > built_layers:
+                # 新出现的层全部生成
+                new_nodes.extend((layer, start, end)
+                                 for start, end in ranges(count, layer, merge_factor))
+                continue
+            # 已有的层只有最右边的块可能变化
+            new_nodes.extend(_right_edge(count, layer, merge_factor, layout,
+                                         mergeable_count(written - 1)))
+        built_layers = max(built_layers, layers)
+    return _tally(new_nodes, merge_factor, layout)
+
+
+def _right_edge(count: int, layer: int, merge_factor: int, layout: str,
+                previous_count: int) -> List[Tuple[int, int, int]]:
+    """参与合并的章节从previous_count增加到count后，该层新出现的节点"""
+    if count == previous_count:
+        return []
+    size = merge_factor ** layer
+    if layout == "blocks":
+        # 最后一块延长（或新开一块）
+        start = (count - 1) // size * size
+        return [(layer, start, count)]
+    # 只有新凑满的块才生成节点
+    if count // size > previous_count // size:
+        start = (count // size - 1) * size
+        return [(layer, start, start + size)]
+    return []
+
+
+def _tally(nodes: Iterable[Tuple[int, int, int]], merge_factor: int, layout: str) -> Dict[str, int]:
+    calls = inputs = 0
+    for layer, start, end in nodes:
+        node_inputs = _node_inputs(layout, layer, start, end, merge_factor)
+        if node_inputs > 1:
+            calls += 1
+            inputs += node_inputs
+    return {"calls": calls, "inputs": inputs}
+
+
+def benchmark(sizes: Iterable[int] = (100, 1000, 10000),
+              merge_factor: int = 3) -> List[Dict[str, int]]:
+    """
+    比较两种布局的AI调用次数
+
+    Returns:
+        每个章节数一行：{'chapters', 以及 '{布局}_{scratch|incremental}_{calls|inputs}'}
+    """
+    rows = []
+    for size in sizes:
+        row = {"chapters": size}
+        for layout in LAYOUTS:
+            for mode, count in (("scratch", count_merge_calls),
+                                ("incremental", count_incremental_calls)):
+                result = count(size, merge_factor, layout)
+                row[f"{layout}_{mode}_calls"] = result["calls"]
+                row[f"{layout}_{mode}_inputs"] = result["inputs"]
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    merge_factor = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(f"📊 合并布局的AI调用次数（合并因子{merge_factor}）")
+    print("   从零: 一次生成完整的合并视图；逐章: 每写完一章生成一次视图，复用已保存的节点")
+    print("   括号内为送给AI的记录总数")
+    print("-" * 60)
+    for row in benchmark(merge_factor=merge_factor):
+        print(f"📖 {row['chapters']}章")
+        for mode, label in (("scratch", "从零"), ("incremental", "逐章")):
+            cells = [f"{layout} {row[f'{layout}_{mode}_calls']}次"
+                     f"（{row[f'{layout}_{mode}_inputs']}条）" for layout in LAYOUTS]
+            print(f"   {label}: " + " | ".join(cells))
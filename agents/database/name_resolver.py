@@ -0,0 +1,224 @@
+"""
+角色名称解析
+将角色名和别名（昵称、英文名、称号）映射到角色ID，常驻内存，支持批量解析
+"""
+
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, Optional, Pattern
+
+# 比较名称时忽略的字符：空白和常见的姓名间隔号
+_IGNORED_CHARS_RE = re.compile(r'[\s·•・‧\.．\-_]+')
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """
+    规范化名称用于比较
+
+    全角转半角、忽略大小写、去掉空白和间隔号，
+    使“凯撒·加图索”与“凯撒 加图索”、“Caesar”与“caesar”视为同一名称。
+    """
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKC", name).casefold()
+    return _IGNORED_CHARS_RE.sub("", name)
+
+
+class NameResolver:
+    """
+    名称/别名 → 角色ID 解析器
+
+    首次使用时从 characters 和 character_aliases 两张表加载，
+    之后随本进程的写入增量更新；其他连接或进程写入后（数据变更计数变化，最多延迟
+    CharacterDatabase.EXTERNAL_CHECK_INTERVAL秒）自动重新加载。
+    角色正式名优先于别名。
+    """
+
+    def __init__(self, db):
+        """
+        初始化解析器
+
+        Args:
+            db: CharacterDatabase 实例
+        """
+        self.db = db
+        self._lock = threading.RLock()
+        # {规范化正式名: 角色ID}
+        self._ids: Dict[str, int] = {}
+        # {规范化别名: 角色ID}
+        self._alias_ids: Dict[str, int] = {}
+        # {角色ID: 正式名}
+        self._names: Dict[int, str] = {}
+        # {原始写法: 角色ID}，用于在正文中查找提及
+        self._spellings: Dict[str, int] = {}
+        self._mention_pattern: Optional[Pattern] = None
+        self._mention_lookup: Dict[str, int] = {}
+        self._version = None
+
+    # ==================== 加载与增量更新 ====================
+
+    def load(self):
+        """从数据库完整加载角色名和别名"""
+        with self._lock, self.db.connections.connection() as conn:
+            version = self.db.change_count()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT a.character_id, a.alias FROM character_aliases a
+                JOIN characters c ON a.character_id = c.id
+            ''')
+            aliases = cursor.fetchall()
+            cursor.execute('SELECT id, name FROM characters')
+            names = cursor.fetchall()
+
+            self._ids = {}
+            self._alias_ids = {}
+            self._names = {}
+            self._spellings = {}
+            self._mention_pattern = None
+            for char_id, name in names:
+                self._add(char_id, name, canonical=True)
+            for char_id, alias in aliases:
+                self._add(char_id, alias, canonical=False)
+            self._version = version
+
+    def _ensure_loaded(self):
+        """首次使用或其他连接修改过数据库时重新加载（变更计数的检查见CharacterDatabase.change_count）"""
+        if self._version != self.db.change_count():
+            self.load()
+
+    def _add(self, char_id: int, name: str, canonical: bool):
+        """登记一个名称（调用方持有锁）"""
+        key = normalize_name(name)
+        if not key:
+            return
+        if canonical:
+            self._names[char_id] = name
+            self._ids[key] = char_id
+            self._spellings[name] = char_id
+        else:
+            self._alias_ids[key] = char_id
+            self._spellings.setdefault(name, char_id)
+        self._mention_pattern = None
+
+    def _lookup(self, name: str) -> Optional[int]:
+        """按规范化名称查找角色ID，正式名优先于别名（调用方持有锁）"""
+        key = normalize_name(name)
+        char_id = self._ids.get(key)
+        return self._alias_ids.get(key) if char_id is None else char_id
+
+    def add_name(self, char_id: int, name: str, canonical: bool = True):
+        """增量更新：登记新角色名或新别名（数据库写入后调用）"""
+        with self._lock:
+            if self._version is None:
+                return
+            self._add(char_id, name, canonical)
+
+    def remove_name(self, name: str):
+        """增量更新：移除一个别名（数据库删除后调用）"""
+        with self._lock:
+            if self._version is None:
+                return
+            self._alias_ids.pop(normalize_name(name), None)
+            if self._spellings.get(name) is not None and name not in self._names.values():
+                del self._spellings[name]
+            self._mention_pattern = None
+
+    def remove_character(self, char_id: int):
+        """增量更新：移除角色及其所有别名（数据库删除后调用）"""
+        with self._lock:
+            if self._version is None:
+                return
+            self._names.pop(char_id, None)
+            self._ids = {key: value for key, value in self._ids.items() if value != char_id}
+            self._alias_ids = {key: value for key, value in self._alias_ids.items()
+                               if value != char_id}
+            self._spellings = {name: value for name, value in self._spellings.items()
+                               if value != char_id}
+            self._mention_pattern = None
+
+    def invalidate(self):
+        """标记为失效，下次查询时重新加载（批量写入后调用）"""
+        with self._lock:
+            self._version = None
+
+    def advance_version(self, before: int, after: int):
+        """
+        本进程的一次写入已增量更新到内存中（写事务提交后调用）
+
+        加载时的变更计数正好是写入前的before时，直接记为写入后的after；
+        否则期间还有其他写入，保持原版本，下次查询时重新加载。
+        """
+        with self._lock:
+            if self._version == before:
+                self._version = after
+
+    # ==================== 解析 ====================
+
+    def resolve_id(self, name: str) -> Optional[int]:
+        """解析名称或别名对应的角色ID，未知名称返回None"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._lookup(name)
+
+    def resolve(self, name: str) -> Optional[str]:
+        """解析名称或别名对应的角色正式名，未知名称返回None"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._names.get(self._lookup(name))
+
+    def resolve_ids(self, names: Iterable[str]) -> Dict[str, Optional[int]]:
+        """批量解析名称对应的角色ID {输入名称: 角色ID或None}"""
+        with self._lock:
+            self._ensure_loaded()
+            return {name: self._lookup(name) for name in names}
+
+    def get_name(self, char_id: int) -> Optional[str]:
+        """获取角色ID对应的正式名"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._names.get(char_id)
+
+    def resolve_many(self, names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        批量解析名称（只检查一次数据版本）
+
+        Returns:
+            {输入名称: 正式名或None}
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return {name: self._names.get(self._lookup(name)) for name in names}
+
+    def find_mentions(self, text: str) -> Dict[str, int]:
+        """
+        一次扫描找出文本中提到的所有已知角色
+
+        按名称和别名的原始写法匹配，较长的写法优先（“路明非”不会再被计为“明非”）。
+
+        Returns:
+            {角色正式名: 提及次数}，按首次出现的顺序排列
+        """
+        if not text:
+            return {}
+
+        with self._lock:
+            self._ensure_loaded()
+            if self._mention_pattern is None:
+                spellings = sorted(self._spellings, key=len, reverse=True)
+                if not spellings:
+                    return {}
+                self._mention_pattern = re.compile(
+                    "|".join(re.escape(spelling) for spelling in spellings), re.IGNORECASE)
+                self._mention_lookup = {spelling.casefold(): char_id
+                                        for spelling, char_id in self._spellings.items()}
+            pattern = self._mention_pattern
+            lookup = self._mention_lookup
+            names = dict(self._names)
+
+        mentions: Dict[str, int] = {}
+        for match in pattern.finditer(text):
+            name = names.get(lookup.get(match.group(0).casefold()))
+            if name:
+                mentions[name] = mentions.get(name, 0) + 1
+        return mentions
@@ -5,9 +5,13 @@
 
 import os
 import sys
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 sys.path.append(os.path.dirname(__file__))
 from plot_database import PlotDatabase
+from records import Record
+from chapter_tree import ChapterNode, ChapterTreeCursor
+from plot_session import PlotSession
+from db_connection import writes
 
 class PlotAPI:
     """情节大纲API类"""
@@ -39,57 +43,248 @@ class PlotAPI:
         
         self.db = PlotDatabase(db_path)
     
+    @writes
     def add_chapter(self, chapter_number: int, title: str, summary: str = "", 
                    word_count: int = 0, **kwargs) -> int:
         """添加新章节"""
         return self.db.add_chapter(chapter_number, title, summary, word_count, **kwargs)
     
-    def get_chapter(self, chapter_id: int) -> Optional[Dict[str, Any]]:
+    def get_chapter(self, chapter_id: int) -> Optional[Record]:
         """获取章节信息"""
         return self.db.get_chapter(chapter_id)
     
-    def get_chapter_by_number(self, chapter_number: int) -> Optional[Dict[str, Any]]:
-        """根据章节编号获取章节信息（返回第一个匹配的章节）"""
-        chapters = self.get_chapters_by_number(chapter_number)
-        return chapters[0] if chapters else None
+    def get_chapter_by_number(self, chapter_number: int,
+                              branch: str = PlotDatabase.MAIN_BRANCH) -> Optional[Record]:
+        """根据章节编号获取章节的主版本（分支中没有时沿用默认分支）"""
+        return self.db.get_chapter_by_number(chapter_number, branch)
     
-    def get_chapters_by_number(self, chapter_number: int) -> List[Dict[str, Any]]:
-        """根据章节编号获取所有匹配的章节"""
+    def get_chapters_by_number(self, chapter_number: int) -> List[Record]:
+        """根据章节编号获取所有匹配的章节（所有分支的所有版本）"""
         return self.db.get_chapters_by_number(chapter_number)
     
-    def get_all_chapters(self) -> List[Dict[str, Any]]:
-        """获取所有章节"""
-        return self.db.get_all_chapters()
+    def get_chapter_versions(self, chapter_number: int,
+                             branch: Optional[str] = None) -> List[Record]:
+        """获取章节编号的所有版本（带is_canonical标记）"""
+        return self.db.get_chapter_versions(chapter_number, branch)
+    
+    @writes
+    def set_canonical_chapter(self, chapter_id: int) -> bool:
+        """把章节设为其分支、编号的主版本"""
+        return self.db.set_canonical_chapter(chapter_id)
+    
+    def get_branches(self) -> List[Record]:
+        """获取所有分支及其章节范围"""
+        return self.db.get_branches()
+    
+    def get_chapters_in_range(self, start: int, end: Optional[int] = None,
+                              columns: Optional[List[str]] = None,
+                              branch: str = PlotDatabase.MAIN_BRANCH) -> List[Record]:
+        """一次查询获取编号范围内（包含两端）的章节，每个编号只返回主版本"""
+        return self.db.get_chapters_in_range(start, end, columns, branch)
+    
+    def get_chapters_page(self, after: Optional[Tuple[int, int, int]] = None,
+                          limit: int = PlotDatabase.PAGE_SIZE,
+                          columns: Optional[List[str]] = None,
+                          up_to_chapter: Optional[int] = None) -> List[Record]:
+        """键集分页获取章节，after为上一页最后一行的PlotDatabase.chapter_page_key"""
+        return self.db.get_chapters_page(after, limit, columns, up_to_chapter)
+    
+    def iter_chapters(self, columns: Optional[List[str]] = None,
+                      up_to_chapter: Optional[int] = None,
+                      batch_size: int = PlotDatabase.PAGE_SIZE) -> Iterator[Record]:
+        """逐个产出全部章节（分页读取，内存占用与总章节数无关）"""
+        return self.db.iter_chapters(columns, up_to_chapter, batch_size)
+    
+    def iter_chapters_in_range(self, start: int = 1, end: Optional[int] = None,
+                               columns: Optional[List[str]] = None,
+                               branch: str = PlotDatabase.MAIN_BRANCH,
+                               batch_size: int = PlotDatabase.PAGE_SIZE) -> Iterator[Record]:
+        """逐个产出编号范围内各章节的主版本（分页读取）"""
+        return self.db.iter_chapters_in_range(start, end, columns, branch, batch_size)
+    
+    def get_max_chapter_number(self) -> int:
+        """最大的章节编号（没有章节时为0）"""
+        return self.db.get_max_chapter_number()
+    
+    def get_all_chapters(self, columns: Optional[List[str]] = None) -> List[Record]:
+        """获取所有章节（columns为需要的列，None表示全部列）"""
+        return self.db.get_all_chapters(columns)
     
     def get_chapter_tree(self) -> Dict[str, Any]:
         """获取章节树状结构"""
         return self.db.get_chapter_tree()
     
+    def get_chapter_tree_cursor(self, columns: Optional[List[str]] = None) -> ChapterTreeCursor:
+        """获取惰性章节树游标（只在展开时查询子章节）"""
+        return ChapterTreeCursor(self.db, columns)
+    
+    def get_child_chapters(self, chapter_id: Optional[int] = None,
+                           columns: Optional[List[str]] = None) -> List[Record]:
+        """获取直接子章节，chapter_id为None时获取根章节"""
+        return self.db.get_child_chapters(chapter_id, columns)
+    
+    def get_chapter_ancestors(self, chapter_id: int,
+                              columns: Optional[List[str]] = None) -> List[Record]:
+        """获取从根章节到父章节的祖先路径"""
+        return self.db.get_chapter_ancestors(chapter_id, columns)
+    
+    def get_chapter_descendants(self, chapter_id: int, max_depth: Optional[int] = None,
+                                columns: Optional[List[str]] = None) -> List[Record]:
+        """获取子孙章节（先序排列，最多max_depth层）"""
+        return self.db.get_chapter_descendants(chapter_id, max_depth, columns)
+    
+    def get_chapter_siblings(self, chapter_id: int, include_self: bool = False,
+                             columns: Optional[List[str]] = None) -> List[Record]:
+        """获取兄弟章节"""
+        return self.db.get_chapter_siblings(chapter_id, include_self, columns)
+    
+    @writes
     def update_chapter(self, chapter_id: int, **kwargs) -> bool:
         """更新章节信息"""
         return self.db.update_chapter(chapter_id, **kwargs)
     
+    @writes
+    def save_chapter_text(self, chapter_id: int, text: str) -> str:
+        """保存章节完整正文（压缩、内容寻址存储），返回正文SHA-256"""
+        return self.db.save_chapter_text(chapter_id, text)
+    
+    def get_chapter_text(self, chapter_id: int) -> Optional[str]:
+        """获取章节完整正文"""
+        return self.db.get_chapter_text(chapter_id)
+    
+    def get_chapter_text_head(self, chapter_id: int, chars: int = 1000) -> Optional[str]:
+        """获取章节正文开头"""
+        return self.db.get_chapter_text_head(chapter_id, chars)
+    
+    def get_chapter_text_tail(self, chapter_id: int, chars: int = 1000) -> Optional[str]:
+        """获取章节正文结尾"""
+        return self.db.get_chapter_text_tail(chapter_id, chars)
+    
+    def get_chapter_paragraphs(self, chapter_id: int, start: int = 0,
+                               end: Optional[int] = None) -> List[str]:
+        """按段落获取章节正文"""
+        return self.db.get_chapter_paragraphs(chapter_id, start, end)
+    
+    def get_chapter_text_info(self, chapter_id: int) -> Optional[Record]:
+        """获取章节正文的元信息"""
+        return self.db.get_chapter_text_info(chapter_id)
+    
+    def get_chapter_tail_by_number(self, chapter_number: int,
+                                   chars: int = 1000) -> Optional[Dict[str, Any]]:
+        """
+        获取指定编号章节（主记录）的标题、摘要和正文结尾
+        
+        Returns:
+            {'id', 'chapter_number', 'title', 'summary', 'text_tail'}，章节不存在时返回None；
+            没有保存正文时text_tail为None
+        """
+        chapters = self.get_chapters_in_range(chapter_number, chapter_number,
+                                              columns=['id', 'title', 'summary'])
+        if not chapters:
+            return None
+        chapter = chapters[0]
+        return dict(chapter, text_tail=self.get_chapter_text_tail(chapter['id'], chars))
+    
+    def get_chapter_facets(self, chapter_id: int) -> Dict[str, List[str]]:
+        """获取章节拆分后的各标签取值"""
+        return self.db.get_chapter_facets(chapter_id)
+    
+    def get_chapters_with_facet(self, facet: str, value: str, start: int = 1,
+                                end: Optional[int] = None,
+                                columns: Optional[List[str]] = None,
+                                branch: str = PlotDatabase.MAIN_BRANCH) -> List[Record]:
+        """获取标签包含某个取值的章节（每个编号只返回主版本）"""
+        return self.db.get_chapters_with_facet(facet, value, start, end, columns, branch)
+    
+    def get_chapters_featuring(self, character_name: str, start: int = 1,
+                               end: Optional[int] = None,
+                               columns: Optional[List[str]] = None,
+                               branch: str = PlotDatabase.MAIN_BRANCH) -> List[Record]:
+        """获取角色出场（character_focus中包含该角色）的章节"""
+        return self.db.get_chapters_with_facet("character_focus", character_name,
+                                               start, end, columns, branch)
+    
+    def get_facet_frequencies(self, facet: str, start: int = 1, end: Optional[int] = None,
+                              branch: str = PlotDatabase.MAIN_BRANCH,
+                              limit: Optional[int] = None) -> List[Record]:
+        """统计编号范围内标签各取值出现的章节数"""
+        return self.db.get_facet_frequencies(facet, start, end, branch, limit)
+    
+    def get_facet_frequencies_by_arc(self, facet: str, arcs: List[Dict[str, Any]],
+                                     branch: str = PlotDatabase.MAIN_BRANCH,
+                                     limit: Optional[int] = None) -> Dict[str, List[Record]]:
+        """
+        按故事弧分别统计标签频率，如各故事弧的主题频率
+        
+        Args:
+            facet: 标签列
+            arcs: 故事弧列表，每项包含名称（arc_name、name或phase_name）、
+                  start_chapter和end_chapter（如StoryArcPlanner的故事弧、支线或主线阶段）
+            branch: 分支
+            limit: 每个故事弧最多返回的取值数
+        
+        Returns:
+            {故事弧名称: [Record(value, chapter_count, first_chapter)]}
+        """
+        ranges = {}
+        for arc in arcs:
+            name = arc.get('arc_name') or arc.get('name') or arc.get('phase_name')
+            ranges[name] = (arc.get('start_chapter') or 1, arc.get('end_chapter'))
+        return self.db.get_facet_frequencies_by_range(facet, ranges, branch, limit)
+    
+    def session(self) -> PlotSession:
+        """
+        创建写入会话：暂存章节、轨迹、情节线关联、正文和合并摘要失效，提交时一个事务写入
+        
+        with api.session() as session: ... 正常结束时自动提交
+        """
+        return PlotSession(self.db)
+    
+    @writes
+    def commit_session(self, session: PlotSession) -> int:
+        """提交写入会话（供异步API经由写队列提交），返回执行的写入数"""
+        return session.commit()
+    
+    @writes
+    def invalidate_merge_summaries(self, from_chapter: int) -> int:
+        """删除包含第from_chapter章及之后章节的合并摘要"""
+        return self.db.invalidate_merge_summaries(from_chapter)
+    
+    @writes
     def add_plot_line(self, name: str, description: str = "", priority: int = 1) -> int:
         """添加情节线"""
         return self.db.add_plot_line(name, description, priority)
     
+    @writes
     def link_chapter_plot_line(self, chapter_id: int, plot_line_id: int,
                               importance: int = 1, progress: str = ""):
         """关联章节和情节线"""
         return self.db.link_chapter_plot_line(chapter_id, plot_line_id, importance, progress)
     
+    @writes
     def add_character_arc(self, character_name: str, chapter_id: int, **kwargs):
         """添加角色发展轨迹"""
         return self.db.add_character_arc(character_name, chapter_id, **kwargs)
     
     def get_plot_summary(self, up_to_chapter: int = None) -> Dict[str, Any]:
-        """获取情节大纲摘要"""
+        """获取情节大纲摘要（'chapters'为按编号逐个产出各章主版本的迭代器）"""
         return self.db.get_plot_summary(up_to_chapter)
     
-    def get_character_development_timeline(self, character_name: str) -> List[Dict[str, Any]]:
+    def get_character_development_timeline(self, character_name: str) -> List[Record]:
         """获取角色发展时间线"""
         return self.db.get_character_development_timeline(character_name)
     
+    def get_latest_character_arcs(self, character_names: List[str], limit: int = 1,
+                                  as_of_chapter: Optional[int] = None) -> Dict[str, List[Record]]:
+        """批量获取多个角色最近的发展轨迹 {角色名: [轨迹, ...]}（按章节顺序，最后一条为最新）"""
+        return self.db.get_latest_character_arcs(character_names, limit, as_of_chapter)
+    
+    def get_character_arc_as_of(self, character_name: str,
+                                chapter_number: int) -> Optional[Record]:
+        """获取角色截至某章（包含）的最新发展轨迹"""
+        return self.db.get_character_arc_as_of(character_name, chapter_number)
+    
+    @writes
     def save_merge_summary(self, current_chapter: int, merge_factor: int, 
                           summary_content: str, merge_levels: int = 0,
                           ai_generated_titles: str = "") -> int:
@@ -97,11 +292,46 @@ class PlotAPI:
         return self.db.save_merge_summary(current_chapter, merge_factor, summary_content, 
                                         merge_levels, ai_generated_titles)
     
-    def get_merge_summary(self, current_chapter: int, merge_factor: int) -> Optional[Dict[str, Any]]:
+    def get_merge_summary(self, current_chapter: int, merge_factor: int) -> Optional[Record]:
         """获取保存的合并摘要"""
         return self.db.get_merge_summary(current_chapter, merge_factor)
     
-    def get_all_merge_summaries(self) -> List[Dict[str, Any]]:
+    def iter_merge_summaries(self, batch_size: int = PlotDatabase.PAGE_SIZE) -> Iterator[Record]:
+        """逐个产出全部合并摘要（分页读取）"""
+        return self.db.iter_merge_summaries(batch_size)
+    
+    @writes
+    def save_merge_node(self, merge_factor: int, layer: int, start_chapter: int,
+                        end_chapter: int, node: Dict[str, Any], chapter_count: int,
+                        source_key: str, layout: str = "blocks") -> int:
+        """保存合并节点（同一布局同一层同一起始章节的旧节点被替换）"""
+        return self.db.save_merge_node(merge_factor, layer, start_chapter, end_chapter,
+                                       node, chapter_count, source_key, layout)
+    
+    def get_merge_nodes(self, merge_factor: int, up_to_chapter: Optional[int] = None,
+                        layout: str = "blocks") -> List[Record]:
+        """获取合并因子下已保存的合并节点（按层、起始章节排序）"""
+        return self.db.get_merge_nodes(merge_factor, up_to_chapter, layout)
+    
+    def get_cached_merge_nodes(self, content_hashes: List[str]) -> Dict[str, Record]:
+        """按输入内容哈希批量查询缓存的合并节点（只返回命中的哈希）"""
+        return self.db.get_cached_merge_nodes(content_hashes)
+    
+    @writes
+    def save_cached_merge_nodes(self, entries: List[Tuple[str, int, Dict[str, Any]]]) -> int:
+        """保存AI生成的合并节点到内容缓存，entries为[(内容哈希, 输入记录数, 节点内容)]"""
+        return self.db.save_cached_merge_nodes(entries)
+    
+    @writes
+    def record_merge_cache_hits(self, content_hashes: List[str]) -> int:
+        """累加缓存条目的命中次数"""
+        return self.db.record_merge_cache_hits(content_hashes)
+    
+    def get_merge_cache_stats(self) -> Dict[str, int]:
+        """合并节点内容缓存的统计 {'entries', 'hits'}"""
+        return self.db.get_merge_cache_stats()
+    
+    def get_all_merge_summaries(self) -> List[Record]:
         """获取所有保存的合并摘要"""
         return self.db.get_all_merge_summaries()
     
@@ -109,10 +339,23 @@ class PlotAPI:
         """获取数据库统计信息"""
         return self.db.get_database_stats()
     
-    def format_chapter_tree(self, tree: Dict[str, Any] = None, indent: str = "") -> str:
-        """格式化章节树状结构为文本"""
+    def format_chapter_tree(self, tree: Dict[str, Any] = None, indent: str = "",
+                            max_depth: Optional[int] = None) -> str:
+        """
+        格式化章节树状结构为文本
+        
+        未传入tree时通过惰性游标逐层展开，max_depth限制子章节展开的层数（None表示不限）
+        """
         if tree is None:
-            tree = self.get_chapter_tree()
+            cursor = self.get_chapter_tree_cursor(
+                columns=['title', 'summary', 'parent_chapter_id'])
+            result = []
+            for root in cursor.roots:
+                result.append(f"{indent}第{root.chapter_number}章: {root['title']}")
+                if root['summary']:
+                    result.append(f"{indent}  └─ 摘要: {root['summary'][:100]}...")
+                self._format_child_chapters(root, f"{indent}  ", max_depth, result)
+            return "\n".join(result)
         
         result = []
         for chapter_num, chapter in tree.items():
@@ -130,9 +373,22 @@ class PlotAPI:
         
         return "\n".join(result)
     
+    def _format_child_chapters(self, node: ChapterNode, indent: str,
+                               max_depth: Optional[int], result: List[str]):
+        """逐层展开子章节并追加到result"""
+        if (max_depth is not None and max_depth <= 0) or not node.has_children:
+            return
+        for child in node.children:
+            result.append(f"{indent}├─ 子章节: {child['title']}")
+            if child['summary']:
+                result.append(f"{indent}│   └─ 摘要: {child['summary'][:80]}...")
+            self._format_child_chapters(child, f"{indent}│   ",
+                                        None if max_depth is None else max_depth - 1, result)
+    
     def format_plot_summary(self, up_to_chapter: int = None) -> str:
-        """格式化情节大纲摘要"""
-        summary = self.get_plot_summary(up_to_chapter)
+        """格式化情节大纲摘要（章节分页读取，不一次加载整个大纲）"""
+        up_to_chapter = up_to_chapter or None
+        total_chapters, total_word_count = self.db.get_chapter_totals(up_to_chapter)
         
         result = []
         result.append("📚 情节大纲摘要")
@@ -140,13 +396,14 @@ class PlotAPI:
         
         # 统计信息
         result.append(f"📊 统计信息:")
-        result.append(f"  • 总章节数: {summary['total_chapters']}")
-        result.append(f"  • 总字数: {summary['total_word_count']:,}字")
+        result.append(f"  • 总章节数: {total_chapters}")
+        result.append(f"  • 总字数: {total_word_count:,}字")
         result.append("")
         
         # 章节列表
         result.append("📖 章节概览:")
-        for chapter in summary['chapters']:
+        chapters = self.iter_chapters(['title', 'summary', 'key_events'], up_to_chapter)
+        for chapter in chapters:
             indent = "  " * chapter['depth_level']
             result.append(f"{indent}第{chapter['chapter_number']}章: {chapter['title']}")
             if chapter['summary']:
@@ -157,9 +414,10 @@ class PlotAPI:
         result.append("")
         
         # 情节线
-        if summary['plot_lines']:
+        plot_lines = self.db.get_plot_lines()
+        if plot_lines:
             result.append("🎭 情节线:")
-            for plot_line in summary['plot_lines']:
+            for plot_line in plot_lines:
                 result.append(f"  • {plot_line['name']}: {plot_line['description']}")
         
         return "\n".join(result)
@@ -5,9 +5,19 @@
 
 import sqlite3
 import json
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 from datetime import datetime
 import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
+from schema_migrations import run_migrations, check_query_plans
+from chapter_text_store import TEXT_EDGE_CHARS, pack_text, unpack_text
+from aggregate_stats import create_stats_table, create_counter, rebuild_stats, read_stats
+from records import Record, record_factory
+from chapter_facets import FACET_COLUMNS, create_facet_table, index_chapter_facets
+from db_connection import writes
 
 class PlotDatabase:
     """情节大纲数据库管理类"""
@@ -22,100 +32,621 @@ class PlotDatabase:
         self.db_path = db_path
         self.init_database()
     
+    def _connect(self) -> sqlite3.Connection:
+        """打开连接，查询结果为轻量记录（Record）而不是元组"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = record_factory
+        return conn
+    
     def init_database(self):
-        """初始化数据库表结构"""
+        """初始化数据库表结构（执行尚未执行的迁移）"""
         with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # 创建章节表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS chapters (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chapter_number INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    summary TEXT,
-                    word_count INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    status TEXT DEFAULT 'completed',
-                    parent_chapter_id INTEGER,
-                    depth_level INTEGER DEFAULT 0,
-                    plot_point TEXT,
-                    key_events TEXT,
-                    character_focus TEXT,
-                    setting TEXT,
-                    mood TEXT,
-                    themes TEXT,
-                    notes TEXT,
-                    FOREIGN KEY (parent_chapter_id) REFERENCES chapters (id)
-                )
-            ''')
-            
-            # 创建情节线表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS plot_lines (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    status TEXT DEFAULT 'active',
-                    priority INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # 创建章节-情节线关联表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS chapter_plot_lines (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chapter_id INTEGER,
-                    plot_line_id INTEGER,
-                    importance INTEGER DEFAULT 1,
-                    progress TEXT,
-                    FOREIGN KEY (chapter_id) REFERENCES chapters (id),
-                    FOREIGN KEY (plot_line_id) REFERENCES plot_lines (id)
-                )
-            ''')
-            
-            # 创建角色发展轨迹表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS character_arcs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    character_name TEXT NOT NULL,
-                    chapter_id INTEGER,
-                    development TEXT,
-                    emotional_state TEXT,
-                    key_decisions TEXT,
-                    relationships_changed TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (chapter_id) REFERENCES chapters (id)
-                )
-            ''')
-            
-            # 创建合并摘要表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS merge_summaries (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    current_chapter INTEGER NOT NULL,
-                    merge_factor INTEGER NOT NULL,
-                    summary_content TEXT NOT NULL,
-                    summary_length INTEGER DEFAULT 0,
-                    merge_levels INTEGER DEFAULT 0,
-                    ai_generated_titles TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(current_chapter, merge_factor)
+            run_migrations(conn, [
+                (1, "情节大纲基础表", self._create_tables),
+                (2, "章节、角色轨迹和情节线关联索引", self._create_indexes),
+                (3, "章节树父子关系索引", self._create_tree_index),
+                (4, "压缩的章节正文存储", self._create_text_store),
+                (5, "触发器维护的统计表", self._create_stats),
+                (6, "角色轨迹记录章节编号", self._add_arc_chapter_numbers),
+                (7, "章节草稿分支与主版本指针", self._create_chapter_versions),
+                (8, "章节标签索引表", self._create_chapter_facets),
+                (9, "按(层, 起始章节, 结束章节)保存的合并节点", self._create_merge_nodes),
+                (10, "按输入内容哈希缓存的合并节点", self._create_merge_node_cache),
+                (11, "合并节点区分分层布局", self._add_merge_node_layouts),
+            ])
+    
+    def _create_tables(self, cursor):
+        """创建情节大纲基础表"""
+        # 创建章节表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chapters (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chapter_number INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                summary TEXT,
+                word_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status TEXT DEFAULT 'completed',
+                parent_chapter_id INTEGER,
+                depth_level INTEGER DEFAULT 0,
+                plot_point TEXT,
+                key_events TEXT,
+                character_focus TEXT,
+                setting TEXT,
+                mood TEXT,
+                themes TEXT,
+                notes TEXT,
+                FOREIGN KEY (parent_chapter_id) REFERENCES chapters (id)
+            )
+        ''')
+        
+        # 创建情节线表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS plot_lines (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                description TEXT,
+                status TEXT DEFAULT 'active',
+                priority INTEGER DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 创建章节-情节线关联表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chapter_plot_lines (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chapter_id INTEGER,
+                plot_line_id INTEGER,
+                importance INTEGER DEFAULT 1,
+                progress TEXT,
+                FOREIGN KEY (chapter_id) REFERENCES chapters (id),
+                FOREIGN KEY (plot_line_id) REFERENCES plot_lines (id)
+            )
+        ''')
+        
+        # 创建角色发展轨迹表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS character_arcs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                character_name TEXT NOT NULL,
+                chapter_id INTEGER,
+                development TEXT,
+                emotional_state TEXT,
+                key_decisions TEXT,
+                relationships_changed TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (chapter_id) REFERENCES chapters (id)
+            )
+        ''')
+        
+        # 创建合并摘要表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS merge_summaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                current_chapter INTEGER NOT NULL,
+                merge_factor INTEGER NOT NULL,
+                summary_content TEXT NOT NULL,
+                summary_length INTEGER DEFAULT 0,
+                merge_levels INTEGER DEFAULT 0,
+                ai_generated_titles TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(current_chapter, merge_factor)
+            )
+        ''')
+    
+    def _create_indexes(self, cursor):
+        """为常用查询创建索引"""
+        # 按章节编号查询、排序和范围查询（get_chapters_by_number、章节分页）
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chapters_number
+            ON chapters (chapter_number, depth_level)
+        ''')
+        
+        # 按角色查询发展轨迹，索引中带上chapter_id，连接章节表前无需回表
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_character_arcs_character
+            ON character_arcs (character_name, chapter_id)
+        ''')
+        
+        # 按章节查询角色轨迹
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_character_arcs_chapter
+            ON character_arcs (chapter_id)
+        ''')
+        
+        # 章节 ↔ 情节线双向查询（覆盖索引）
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chapter_plot_lines_chapter
+            ON chapter_plot_lines (chapter_id, plot_line_id, importance)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chapter_plot_lines_plot_line
+            ON chapter_plot_lines (plot_line_id, chapter_id, importance)
+        ''')
+    
+    def _create_tree_index(self, cursor):
+        """为章节树的父子查询创建索引"""
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chapters_parent
+            ON chapters (parent_chapter_id, chapter_number)
+        ''')
+    
+    def _create_text_store(self, cursor):
+        """
+        创建章节正文存储
+        
+        text_blobs按正文的SHA-256存放压缩后的正文（相同正文只存一份），
+        chapter_texts记录每个章节当前的正文。不再被引用的正文由触发器删除。
+        此前写进notes字段的完整正文（较长且不是“AI续写于…”说明的）迁入新表。
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS text_blobs (
+                hash TEXT PRIMARY KEY, -- 正文SHA-256
+                codec TEXT NOT NULL, -- 压缩格式
+                content BLOB NOT NULL, -- 压缩后的正文
+                char_length INTEGER NOT NULL,
+                paragraph_offsets TEXT NOT NULL, -- JSON [[起始, 结束], ...]
+                head TEXT NOT NULL, -- 未压缩的开头片段
+                tail TEXT NOT NULL, -- 未压缩的结尾片段
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chapter_texts (
+                chapter_id INTEGER PRIMARY KEY,
+                text_hash TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (chapter_id) REFERENCES chapters (id) ON DELETE CASCADE,
+                FOREIGN KEY (text_hash) REFERENCES text_blobs (hash)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chapter_texts_hash ON chapter_texts (text_hash)
+        ''')
+        
+        # 删除章节时删除其正文引用
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS chapters_text_ad AFTER DELETE ON chapters
+            BEGIN
+                DELETE FROM chapter_texts WHERE chapter_id = old.id;
+            END
+        ''')
+        # 正文不再被任何章节引用时删除
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS chapter_texts_gc_ad AFTER DELETE ON chapter_texts
+            BEGIN
+                DELETE FROM text_blobs WHERE hash = old.text_hash
+                AND NOT EXISTS (SELECT 1 FROM chapter_texts WHERE text_hash = old.text_hash);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS chapter_texts_gc_au AFTER UPDATE OF text_hash ON chapter_texts
+            WHEN old.text_hash != new.text_hash
+            BEGIN
+                DELETE FROM text_blobs WHERE hash = old.text_hash
+                AND NOT EXISTS (SELECT 1 FROM chapter_texts WHERE text_hash = old.text_hash);
+            END
+        ''')
+        
+        cursor.execute('''
+            SELECT id, notes FROM chapters
+            WHERE length(notes) >= 500 AND notes NOT LIKE 'AI续写于%'
+        ''')
+        for chapter_id, notes in cursor.fetchall():
+            self._store_chapter_text(cursor, chapter_id, notes)
+    
+    # 统计项：(统计名, 来源表, 键表达式, 数值表达式, 更新时需要重新计算的列)
+    # 章节数和总字数只计主版本，见CHAPTER_STATS_COUNTERS
+    STATS_COUNTERS = [
+        ("plot_line_count", "plot_lines", "'plot_line_count'", "1", None),
+        ("character_arc_count", "character_arcs", "'character_arc_count'", "1", None),
+        ("merge_summary_count", "merge_summaries", "'merge_summary_count'", "1", None),
+    ]
+    
+    def _create_stats(self, cursor):
+        """创建plot_stats统计表及维护它的触发器，并按现有数据回填"""
+        create_stats_table(cursor, "plot_stats")
+        for counter in self.STATS_COUNTERS:
+            create_counter(cursor, "plot_stats", counter)
+        rebuild_stats(cursor, "plot_stats", self.STATS_COUNTERS)
+    
+    @writes
+    def rebuild_stats(self):
+        """按现有数据重新计算统计表"""
+        with sqlite3.connect(self.db_path) as conn:
+            rebuild_stats(conn.cursor(), "plot_stats",
+                          self.CHAPTER_STATS_COUNTERS + self.STATS_COUNTERS)
+    
+    def _add_arc_chapter_numbers(self, cursor):
+        """
+        在character_arcs中冗余保存章节编号
+        
+        按(角色, 章节编号)建索引后，“某角色截至第N章的状态”只需一次索引查找。
+        编号由触发器从chapters同步，任何连接写入都保持一致。
+        """
+        cursor.execute('ALTER TABLE character_arcs ADD COLUMN chapter_number INTEGER')
+        cursor.execute('''
+            UPDATE character_arcs SET chapter_number = (
+                SELECT chapter_number FROM chapters WHERE id = character_arcs.chapter_id
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_character_arcs_timeline
+            ON character_arcs (character_name, chapter_number, id)
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS character_arcs_number_ai AFTER INSERT ON character_arcs
+            BEGIN
+                UPDATE character_arcs SET chapter_number = (
+                    SELECT chapter_number FROM chapters WHERE id = new.chapter_id
+                ) WHERE id = new.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS character_arcs_number_au
+            AFTER UPDATE OF chapter_id ON character_arcs
+            BEGIN
+                UPDATE character_arcs SET chapter_number = (
+                    SELECT chapter_number FROM chapters WHERE id = new.chapter_id
+                ) WHERE id = new.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS chapters_arc_number_au
+            AFTER UPDATE OF chapter_number ON chapters
+            BEGIN
+                UPDATE character_arcs SET chapter_number = new.chapter_number
+                WHERE chapter_id = new.id;
+            END
+        ''')
+    
+    # 默认分支（正式故事线）；其他分支中没有的章节沿用默认分支的主版本
+    MAIN_BRANCH = "main"
+    
+    # 只保留主版本（指定分支没有的编号沿用默认分支），参数为(分支, 默认分支, 分支, 分支)
+    _CANONICAL_FILTER = '''
+        cc.branch IN (?, ?) AND (cc.branch = ? OR NOT EXISTS (
+            SELECT 1 FROM chapter_canonical b
+            WHERE b.branch = ? AND b.chapter_number = cc.chapter_number
+        ))
+    '''
+    
+    # 章节统计：默认分支每个编号的主版本计一章，字数取该版本的word_count
+    CHAPTER_STATS_COUNTERS = [
+        ("chapter_count", "chapter_canonical", "'chapter_count'",
+         f"{{row}}.branch = '{MAIN_BRANCH}'", ["branch"]),
+        ("total_word_count", "chapter_canonical", "'total_word_count'",
+         f"CASE WHEN {{row}}.branch = '{MAIN_BRANCH}' THEN COALESCE(("
+         "SELECT word_count FROM chapters WHERE id = {row}.chapter_id), 0) ELSE 0 END",
+         ["chapter_id", "branch"]),
+    ]
+    
+    # 分页读取时每页的默认行数
+    PAGE_SIZE = 500
+    
+    def _create_chapter_versions(self, cursor):
+        """
+        章节草稿分支与主版本指针
+        
+        同一章节编号可以有多个版本（重跑、改进稿、废弃草稿），每个版本属于一个分支；
+        chapter_canonical为每个(分支, 章节编号)记录一个主版本，读取章节时按主键直接定位。
+        新增的版本在该分支该编号还没有主版本时自动成为主版本；
+        主版本被删除或改了编号/分支时，由触发器在剩余版本中重新选出（层级最浅、ID最小）。
+        """
+        cursor.execute(f"ALTER TABLE chapters ADD COLUMN branch TEXT NOT NULL DEFAULT '{self.MAIN_BRANCH}'")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chapter_canonical (
+                branch TEXT NOT NULL,
+                chapter_number INTEGER NOT NULL,
+                chapter_id INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (branch, chapter_number)
+            )
+        ''')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_chapter_canonical_chapter
+            ON chapter_canonical (chapter_id)
+        ''')
+        
+        # 现有数据沿用原来的规则：层级最浅、ID最小的记录为主版本
+        cursor.execute('''
+            INSERT OR IGNORE INTO chapter_canonical (branch, chapter_number, chapter_id)
+            SELECT branch, chapter_number, id FROM (
+                SELECT branch, chapter_number, id, ROW_NUMBER() OVER (
+                    PARTITION BY branch, chapter_number ORDER BY depth_level, id
+                ) AS row_rank
+                FROM chapters
+            )
+            WHERE row_rank = 1
+        ''')
+        
+        # 在(分支, 编号)还没有主版本时，从剩余版本中选出主版本
+        def elect(row):
+            return f'''
+                INSERT INTO chapter_canonical (branch, chapter_number, chapter_id)
+                SELECT branch, chapter_number, id FROM chapters
+                WHERE branch = {row}.branch AND chapter_number = {row}.chapter_number
+                AND NOT EXISTS (
+                    SELECT 1 FROM chapter_canonical
+                    WHERE branch = {row}.branch AND chapter_number = {row}.chapter_number
                 )
-            ''')
-            
+                ORDER BY depth_level, id
+                LIMIT 1;
+            '''
+        
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS chapters_canonical_ai AFTER INSERT ON chapters
+            BEGIN
+                {elect("new")}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS chapters_canonical_ad AFTER DELETE ON chapters
+            BEGIN
+                DELETE FROM chapter_canonical WHERE chapter_id = old.id;
+                {elect("old")}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS chapters_canonical_au
+            AFTER UPDATE OF chapter_number, branch ON chapters
+            WHEN old.chapter_number IS NOT new.chapter_number OR old.branch IS NOT new.branch
+            BEGIN
+                DELETE FROM chapter_canonical WHERE chapter_id = old.id;
+                {elect("old")}
+                {elect("new")}
+            END
+        ''')
+        
+        self._create_chapter_stats(cursor)
+    
+    def _create_chapter_stats(self, cursor):
+        """
+        章节统计改为只计主版本
+        
+        原来按chapters逐行累计，草稿、子章节和其他分支的版本都会计入；
+        改为由chapter_canonical上的触发器维护，主版本切换时随之增减。
+        主版本的字数变化和删除在chapters上用BEFORE触发器处理：
+        此时主版本指针尚未被chapters_canonical_au/ad改动，按旧状态判断即可。
+        """
+        # 旧版本的迁移5在chapters上创建的章节统计触发器
+        for trigger in ("chapters_chapter_count_ai", "chapters_chapter_count_ad",
+                        "chapters_total_word_count_ai", "chapters_total_word_count_ad",
+                        "chapters_total_word_count_au"):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        for counter in self.CHAPTER_STATS_COUNTERS:
+            create_counter(cursor, "plot_stats", counter)
+        
+        is_canonical = f'''
+            old.branch = '{self.MAIN_BRANCH}' AND EXISTS (
+                SELECT 1 FROM chapter_canonical WHERE chapter_id = old.id
+            )
+        '''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS chapters_total_word_count_bu
+            BEFORE UPDATE OF word_count ON chapters
+            WHEN {is_canonical}
+            BEGIN
+                UPDATE plot_stats
+                SET value = value + COALESCE(new.word_count, 0) - COALESCE(old.word_count, 0)
+                WHERE name = 'total_word_count';
+            END
+        ''')
+        # 删除后chapter_canonical的删除触发器已查不到章节字数，删除前先扣除
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS chapters_total_word_count_bd
+            BEFORE DELETE ON chapters
+            WHEN {is_canonical}
+            BEGIN
+                UPDATE plot_stats SET value = value - COALESCE(old.word_count, 0)
+                WHERE name = 'total_word_count';
+            END
+        ''')
+        rebuild_stats(cursor, "plot_stats", self.CHAPTER_STATS_COUNTERS + self.STATS_COUNTERS)
+    
+    def _create_chapter_facets(self, cursor):
+        """
+        章节标签索引表
+        
+        character_focus、setting、mood、themes、key_events拆分为单个取值写入chapter_facets，
+        写入章节时同步维护（拆分规则见chapter_facets.split_facet_values）。
+        删除章节和修改章节编号由触发器同步，任何连接写入都保持一致。
+        """
+        create_facet_table(cursor)
+        index_chapter_facets(cursor)
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS chapters_facets_ad AFTER DELETE ON chapters
+            BEGIN
+                DELETE FROM chapter_facets WHERE chapter_id = old.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS chapters_facets_number_au
+            AFTER UPDATE OF chapter_number ON chapters
+            BEGIN
+                UPDATE chapter_facets SET chapter_number = new.chapter_number
+                WHERE chapter_id = new.id;
+            END
+        ''')
+    
+    @writes
+    def rebuild_chapter_facets(self) -> int:
+        """按章节的当前内容重建全部标签行（直接用SQL修改过标签列后使用），返回行数"""
+        with sqlite3.connect(self.db_path) as conn:
+            count = index_chapter_facets(conn.cursor())
             conn.commit()
+            return count
+    
+    # 合并节点的内容字段（与MergeAgent.generate_merge_node的返回值相同）
+    MERGE_NODE_FIELDS = ("title", "summary", "plot_point", "key_events",
+                         "character_focus", "setting", "mood", "themes")
+    
+    def _create_merge_nodes(self, cursor):
+        """
+        合并节点表
+        
+        分层合并时每个节点按(合并因子, 层, 起始章节, 结束章节)保存一次，
+        不同current_chapter的合并视图都由已保存的节点组装，新增章节只需生成右边缘上的节点。
+        source_key记录生成节点时输入章节的版本，输入章节变化后节点需要重新生成。
+        """
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS merge_nodes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                merge_factor INTEGER NOT NULL,
+                layer INTEGER NOT NULL,
+                start_chapter INTEGER NOT NULL,
+                end_chapter INTEGER NOT NULL,
+                chapter_count INTEGER NOT NULL,
+                source_key TEXT NOT NULL,
+                {', '.join(f'{field} TEXT' for field in self.MERGE_NODE_FIELDS)},
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(merge_factor, layer, start_chapter, end_chapter)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_merge_nodes_end
+            ON merge_nodes (end_chapter)
+        ''')
+    
+    def _create_merge_node_cache(self, cursor):
+        """
+        合并节点内容缓存
+        
+        按输入记录内容（送给AI的各字段）的哈希保存AI生成的合并节点，与合并因子、层和章节编号无关：
+        不同合并因子或不同current_chapter的视图中只要出现相同输入，就直接复用已生成的节点。
+        hit_count记录命中次数，每条缓存对应一次未命中。
+        """
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS merge_node_cache (
+                content_hash TEXT PRIMARY KEY,
+                input_count INTEGER NOT NULL,
+                {', '.join(f'{field} TEXT' for field in self.MERGE_NODE_FIELDS)},
+                hit_count INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_hit_at TIMESTAMP
+            )
+        ''')
+    
+    # 合并节点的分层布局：blocks为每层直接合并原始章节，segment为每层合并下一层的节点
+    MERGE_LAYOUTS = ("blocks", "segment")
+    
+    def _add_merge_node_layouts(self, cursor):
+        """
+        merge_nodes增加layout列，唯一键改为(布局, 合并因子, 层, 起始章节, 结束章节)
+        
+        两种布局中同一位置的节点输入不同（原始章节/下一层节点），不能共用。
+        SQLite不能修改唯一约束，按新结构重建表，已有节点都属于blocks布局。
+        """
+        columns = ", ".join(("merge_factor", "layer", "start_chapter", "end_chapter",
+                             "chapter_count", "source_key") + self.MERGE_NODE_FIELDS
+                            + ("created_at",))
+        cursor.execute(f'''
+            CREATE TABLE merge_nodes_v11 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                layout TEXT NOT NULL DEFAULT 'blocks',
+                merge_factor INTEGER NOT NULL,
+                layer INTEGER NOT NULL,
+                start_chapter INTEGER NOT NULL,
+                end_chapter INTEGER NOT NULL,
+                chapter_count INTEGER NOT NULL,
+                source_key TEXT NOT NULL,
+                {', '.join(f'{field} TEXT' for field in self.MERGE_NODE_FIELDS)},
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(layout, merge_factor, layer, start_chapter, end_chapter)
+            )
+        ''')
+        cursor.execute(f'''
+            INSERT INTO merge_nodes_v11 (id, {columns})
+            SELECT id, {columns} FROM merge_nodes
+        ''')
+        cursor.execute('DROP TABLE merge_nodes')
+        cursor.execute('ALTER TABLE merge_nodes_v11 RENAME TO merge_nodes')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_merge_nodes_end
+            ON merge_nodes (end_chapter)
+        ''')
+    
+    # 常用查询及其应使用的索引：(检查名称, SQL, 参数, 索引名)
+    QUERY_PLAN_CHECKS = [
+        ("按编号查询章节",
+         'SELECT * FROM chapters WHERE chapter_number = ?', (1,),
+         "idx_chapters_number"),
+        ("按编号范围查询章节",
+         'SELECT * FROM chapters WHERE chapter_number <= ? ORDER BY chapter_number, depth_level',
+         (10,), "idx_chapters_number"),
+        ("章节主版本",
+         'SELECT c.* FROM chapter_canonical cc JOIN chapters c ON c.id = cc.chapter_id '
+         'WHERE cc.branch = ? AND cc.chapter_number >= ? AND cc.chapter_number <= ? '
+         'ORDER BY cc.chapter_number', ("main", 1, 10),
+         "sqlite_autoindex_chapter_canonical_1"),
+        ("章节分页",
+         'SELECT * FROM chapters WHERE (chapter_number, depth_level, id) > (?, ?, ?) '
+         'AND chapter_number <= ? ORDER BY chapter_number, depth_level, id LIMIT ?',
+         (1, 0, 1, 2 ** 62, 500), "idx_chapters_number"),
+        ("子章节",
+         'SELECT * FROM chapters WHERE parent_chapter_id IS ? ORDER BY chapter_number, id', (1,),
+         "idx_chapters_parent"),
+        ("角色发展时间线",
+         'SELECT ca.*, c.title FROM character_arcs ca '
+         'JOIN chapters c ON ca.chapter_id = c.id '
+         'WHERE ca.character_name = ? ORDER BY ca.chapter_number, ca.id', ("路明非",),
+         "idx_character_arcs_timeline"),
+        ("角色截至某章的状态",
+         'SELECT * FROM character_arcs WHERE character_name = ? AND chapter_number <= ? '
+         'ORDER BY chapter_number DESC, id DESC LIMIT 1', ("路明非", 10),
+         "idx_character_arcs_timeline"),
+        ("有某角色的章节",
+         'SELECT f.chapter_id FROM chapter_facets f '
+         'JOIN chapter_canonical cc ON cc.chapter_id = f.chapter_id '
+         'WHERE f.facet = ? AND f.value = ? AND f.chapter_number >= ? AND f.chapter_number <= ? '
+         'AND cc.branch = ? ORDER BY f.chapter_number',
+         ("character_focus", "诺诺", 20, 80, "main"), "idx_chapter_facets_value"),
+        ("章节范围内的标签频率",
+         'SELECT f.value, COUNT(*) AS chapter_count FROM chapter_facets f '
+         'JOIN chapter_canonical cc ON cc.chapter_id = f.chapter_id '
+         'WHERE f.facet = ? AND f.chapter_number >= ? AND f.chapter_number <= ? '
+         'AND cc.branch = ? GROUP BY f.value ORDER BY chapter_count DESC',
+         ("themes", 1, 10, "main"), "idx_chapter_facets_range"),
+        ("合并视图的节点",
+         'SELECT * FROM merge_nodes WHERE layout = ? AND merge_factor = ? AND end_chapter <= ? '
+         'ORDER BY layer, start_chapter', ("blocks", 3, 100), "sqlite_autoindex_merge_nodes_1"),
+        ("合并节点失效",
+         'DELETE FROM merge_nodes WHERE end_chapter >= ?', (10,), "idx_merge_nodes_end"),
+        ("章节的角色轨迹",
+         'SELECT * FROM character_arcs WHERE chapter_id = ?', (1,),
+         "idx_character_arcs_chapter"),
+        ("章节的情节线",
+         'SELECT plot_line_id, importance FROM chapter_plot_lines WHERE chapter_id = ?', (1,),
+         "idx_chapter_plot_lines_chapter"),
+        ("情节线的章节",
+         'SELECT chapter_id, importance FROM chapter_plot_lines WHERE plot_line_id = ?', (1,),
+         "idx_chapter_plot_lines_plot_line"),
+    ]
+    
+    def check_query_plans(self) -> List[Tuple[str, List[str]]]:
+        """
+        用EXPLAIN QUERY PLAN检查常用查询是否使用索引
+        
+        Returns:
+            未使用预期索引的查询 [(检查名称, 查询计划)]，全部通过时为空列表
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            return check_query_plans(conn, self.QUERY_PLAN_CHECKS)
     
+    @writes
     def add_chapter(self, chapter_number: int, title: str, summary: str = "", 
                    word_count: int = 0, parent_chapter_id: int = None,
                    plot_point: str = "", key_events: str = "", 
                    character_focus: str = "", setting: str = "",
-                   mood: str = "", themes: str = "", notes: str = "") -> int:
+                   mood: str = "", themes: str = "", notes: str = "",
+                   branch: str = MAIN_BRANCH, make_canonical: bool = False) -> int:
         """
-        添加新章节
+        添加新章节（或已有章节编号的一个新版本）
         
         Args:
             chapter_number: 章节编号
@@ -130,76 +661,319 @@ class PlotDatabase:
             mood: 氛围
             themes: 主题
             notes: 备注
+            branch: 所属分支
+            make_canonical: 是否设为该分支该编号的主版本（否则只在还没有主版本时成为主版本）
             
         Returns:
             章节ID
         """
         with sqlite3.connect(self.db_path) as conn:
+            chapter_id = self._insert_chapter(
+                conn.cursor(), chapter_number, title, summary, word_count, parent_chapter_id,
+                plot_point, key_events, character_focus, setting, mood, themes, notes,
+                branch, make_canonical)
+            conn.commit()
+            return chapter_id
+    
+    def _insert_chapter(self, cursor, chapter_number: int, title: str, summary: str = "",
+                        word_count: int = 0, parent_chapter_id: int = None,
+                        plot_point: str = "", key_events: str = "",
+                        character_focus: str = "", setting: str = "",
+                        mood: str = "", themes: str = "", notes: str = "",
+                        branch: str = MAIN_BRANCH, make_canonical: bool = False) -> int:
+        """在当前事务中插入章节（参数同add_chapter），返回章节ID"""
+        # 计算深度级别
+        depth_level = 0
+        if parent_chapter_id:
+            cursor.execute('SELECT depth_level FROM chapters WHERE id = ?', (parent_chapter_id,))
+            parent_depth = cursor.fetchone()
+            if parent_depth:
+                depth_level = parent_depth[0] + 1
+        
+        cursor.execute('''
+            INSERT INTO chapters (
+                chapter_number, title, summary, word_count, parent_chapter_id,
+                depth_level, plot_point, key_events, character_focus,
+                setting, mood, themes, notes, branch
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (chapter_number, title, summary, word_count, parent_chapter_id,
+              depth_level, plot_point, key_events, character_focus,
+              setting, mood, themes, notes, branch))
+        chapter_id = cursor.lastrowid
+        index_chapter_facets(cursor, [chapter_id])
+        
+        if make_canonical:
+            self._set_canonical(cursor, chapter_id)
+        return chapter_id
+    
+    def get_chapter(self, chapter_id: int) -> Optional[Record]:
+        """获取章节信息"""
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.execute('SELECT * FROM chapters WHERE id = ?', (chapter_id,))
+            return cursor.fetchone()
+    
+    def get_chapter_by_number(self, chapter_number: int,
+                              branch: str = MAIN_BRANCH) -> Optional[Record]:
+        """
+        根据章节编号获取章节的主版本（按主键查找）
+        
+        指定分支中没有该章节时返回默认分支的主版本。
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c.* FROM chapter_canonical cc
+                JOIN chapters c ON c.id = cc.chapter_id
+                WHERE cc.chapter_number = ? AND cc.branch IN (?, ?)
+                ORDER BY cc.branch = ? DESC
+                LIMIT 1
+            ''', (chapter_number, branch, self.MAIN_BRANCH, branch))
+            return cursor.fetchone()
+    
+    def get_chapters_by_number(self, chapter_number: int) -> List[Record]:
+        """根据章节编号获取所有匹配的章节（所有分支的所有版本）"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM chapters WHERE chapter_number = ?
+                ORDER BY depth_level, id
+            ''', (chapter_number,))
+            return cursor.fetchall()
+    
+    def _set_canonical(self, cursor, chapter_id: int) -> bool:
+        """在当前事务中把章节设为其分支、编号的主版本"""
+        cursor.execute('''
+            INSERT INTO chapter_canonical (branch, chapter_number, chapter_id)
+            SELECT branch, chapter_number, id FROM chapters WHERE id = ?
+            ON CONFLICT (branch, chapter_number) DO UPDATE SET
+                chapter_id = excluded.chapter_id, updated_at = CURRENT_TIMESTAMP
+        ''', (chapter_id,))
+        return cursor.rowcount > 0
+    
+    @writes
+    def set_canonical_chapter(self, chapter_id: int) -> bool:
+        """把章节设为其分支、编号的主版本，章节不存在时返回False"""
+        with sqlite3.connect(self.db_path) as conn:
+            return self._set_canonical(conn.cursor(), chapter_id)
+    
+    def get_chapter_versions(self, chapter_number: int,
+                             branch: Optional[str] = None) -> List[Record]:
+        """
+        获取章节编号的所有版本（草稿）
+        
+        Args:
+            chapter_number: 章节编号
+            branch: 只看该分支，None表示所有分支
+        
+        Returns:
+            版本列表（按分支、层级、ID排序），每条带is_canonical标记
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c.*, cc.chapter_id IS NOT NULL AS is_canonical
+                FROM chapters c
+                LEFT JOIN chapter_canonical cc ON cc.chapter_id = c.id
+                WHERE c.chapter_number = ? AND (? IS NULL OR c.branch = ?)
+                ORDER BY c.branch, c.depth_level, c.id
+            ''', (chapter_number, branch, branch))
             
-            # 计算深度级别
-            depth_level = 0
-            if parent_chapter_id:
-                cursor.execute('SELECT depth_level FROM chapters WHERE id = ?', (parent_chapter_id,))
-                parent_depth = cursor.fetchone()
-                if parent_depth:
-                    depth_level = parent_depth[0] + 1
-            
+            versions = cursor.fetchall()
+            for version in versions:
+                version['is_canonical'] = bool(version['is_canonical'])
+            return versions
+    
+    def get_branches(self) -> List[Record]:
+        """获取所有分支及其主版本覆盖的章节范围"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO chapters (
-                    chapter_number, title, summary, word_count, parent_chapter_id,
-                    depth_level, plot_point, key_events, character_focus,
-                    setting, mood, themes, notes
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (chapter_number, title, summary, word_count, parent_chapter_id,
-                  depth_level, plot_point, key_events, character_focus,
-                  setting, mood, themes, notes))
+                SELECT branch, COUNT(*) AS chapter_count,
+                       MIN(chapter_number) AS first_chapter, MAX(chapter_number) AS last_chapter
+                FROM chapter_canonical
+                GROUP BY branch
+                ORDER BY branch != ?, branch
+            ''', (self.MAIN_BRANCH,))
             
-            conn.commit()
-            return cursor.lastrowid
+            return cursor.fetchall()
     
-    def get_chapter(self, chapter_id: int) -> Optional[Dict[str, Any]]:
-        """获取章节信息"""
-        with sqlite3.connect(self.db_path) as conn:
+    def _chapter_columns(self, cursor, columns: Optional[List[str]],
+                         required: List[str]) -> List[str]:
+        """校验并补全要查询的chapters列（None表示全部列）"""
+        cursor.execute('PRAGMA table_info(chapters)')
+        known = [row[1] for row in cursor.fetchall()]
+        if columns is None:
+            return known
+        unknown = [column for column in columns if column not in known]
+        if unknown:
+            raise ValueError(f"chapters表中没有这些列: {unknown}")
+        return list(dict.fromkeys(list(required) + list(columns)))
+    
+    def get_chapters_in_range(self, start: int, end: Optional[int] = None,
+                              columns: Optional[List[str]] = None,
+                              branch: str = MAIN_BRANCH,
+                              limit: Optional[int] = None) -> List[Record]:
+        """
+        一次查询获取编号范围内的章节
+        
+        每个编号只返回主版本（与get_chapter_by_number相同），
+        指定分支中没有的章节沿用默认分支的主版本。
+        
+        Args:
+            start: 起始章节编号（包含）
+            end: 结束章节编号（包含），None表示不限
+            columns: 需要的列，None表示全部列；结果中总是包含chapter_number
+            branch: 分支
+            limit: 最多返回的章节数，None表示不限
+        
+        Returns:
+            按章节编号排序的章节列表
+        """
+        with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM chapters WHERE id = ?', (chapter_id,))
-            result = cursor.fetchone()
             
-            if result:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, result))
-            return None
+            columns = self._chapter_columns(cursor, columns, ['chapter_number'])
+            
+            cursor.execute(f'''
+                SELECT {', '.join(f'c.{column}' for column in columns)}
+                FROM chapter_canonical cc
+                JOIN chapters c ON c.id = cc.chapter_id
+                WHERE cc.chapter_number >= ? AND cc.chapter_number <= ?
+                AND {self._CANONICAL_FILTER}
+                ORDER BY cc.chapter_number
+                LIMIT ?
+            ''', (start, end if end is not None else 2 ** 62,
+                  branch, self.MAIN_BRANCH, branch, branch, limit if limit is not None else -1))
+            
+            return cursor.fetchall()
+    
+    def iter_chapters_in_range(self, start: int = 1, end: Optional[int] = None,
+                               columns: Optional[List[str]] = None,
+                               branch: str = MAIN_BRANCH,
+                               batch_size: int = PAGE_SIZE) -> Iterator[Record]:
+        """
+        逐个产出编号范围内各章节的主版本（按章节编号分页读取，内存占用与总章节数无关）
+        
+        参数同get_chapters_in_range，batch_size为每页读取的章节数
+        """
+        while end is None or start <= end:
+            page = self.get_chapters_in_range(start, end, columns, branch, batch_size)
+            yield from page
+            if len(page) < batch_size:
+                return
+            start = page[-1]['chapter_number'] + 1
     
-    def get_chapter_by_number(self, chapter_number: int) -> Optional[Dict[str, Any]]:
-        """根据章节编号获取章节信息（返回第一个匹配的章节）"""
-        chapters = self.get_chapters_by_number(chapter_number)
-        return chapters[0] if chapters else None
+    @staticmethod
+    def chapter_page_key(chapter) -> Tuple[int, int, int]:
+        """章节在分页顺序中的位置 (章节编号, 层级, ID)，作为下一页的after参数"""
+        return (chapter['chapter_number'], chapter['depth_level'], chapter['id'])
     
-    def get_chapters_by_number(self, chapter_number: int) -> List[Dict[str, Any]]:
-        """根据章节编号获取所有匹配的章节"""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_chapters_page(self, after: Optional[Tuple[int, int, int]] = None,
+                          limit: int = PAGE_SIZE, columns: Optional[List[str]] = None,
+                          up_to_chapter: Optional[int] = None) -> List[Record]:
+        """
+        按(章节编号, 层级, ID)顺序分页获取章节（键集分页，翻页代价与页码无关）
+        
+        Args:
+            after: 上一页最后一行的chapter_page_key，None表示第一页
+            limit: 每页行数
+            columns: 需要的列，None表示全部列；结果中总是包含chapter_number、depth_level和id
+            up_to_chapter: 只取编号不大于该值的章节，None表示不限
+        
+        Returns:
+            本页章节，少于limit行时表示已是最后一页
+        """
+        with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM chapters WHERE chapter_number = ?', (chapter_number,))
-            results = cursor.fetchall()
+            columns = self._chapter_columns(cursor, columns, ['chapter_number', 'depth_level', 'id'])
+            selected = ', '.join(columns)
+            end = up_to_chapter if up_to_chapter is not None else 2 ** 62
             
-            if results:
-                columns = [description[0] for description in cursor.description]
-                return [dict(zip(columns, result)) for result in results]
-            return []
+            if after is None:
+                cursor.execute(f'''
+                    SELECT {selected} FROM chapters
+                    WHERE chapter_number <= ?
+                    ORDER BY chapter_number, depth_level, id
+                    LIMIT ?
+                ''', (end, limit))
+            else:
+                cursor.execute(f'''
+                    SELECT {selected} FROM chapters
+                    WHERE (chapter_number, depth_level, id) > (?, ?, ?)
+                    AND chapter_number <= ?
+                    ORDER BY chapter_number, depth_level, id
+                    LIMIT ?
+                ''', (*after, end, limit))
+            return cursor.fetchall()
+    
+    def iter_chapters(self, columns: Optional[List[str]] = None,
+                      up_to_chapter: Optional[int] = None,
+                      batch_size: int = PAGE_SIZE) -> Iterator[Record]:
+        """
+        逐个产出全部章节（与get_all_chapters顺序相同，分页读取，内存占用与总章节数无关）
+        
+        每页读完即释放连接，遍历过程中不会长时间持有数据库读锁。
+        """
+        after = None
+        while True:
+            page = self.get_chapters_page(after, batch_size, columns, up_to_chapter)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = self.chapter_page_key(page[-1])
     
-    def get_all_chapters(self) -> List[Dict[str, Any]]:
-        """获取所有章节"""
+    def get_max_chapter_number(self) -> int:
+        """最大的章节编号（没有章节时为0）"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM chapters ORDER BY chapter_number, depth_level')
-            results = cursor.fetchall()
-            
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, result)) for result in results]
+            cursor.execute('SELECT MAX(chapter_number) FROM chapters')
+            return cursor.fetchone()[0] or 0
+    
+    def get_chapter_totals(self, up_to_chapter: Optional[int] = None) -> Tuple[int, int]:
+        """
+        章节数和总字数
+        
+        全书统计直接读取统计表，指定up_to_chapter时在索引范围内汇总
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            if up_to_chapter is None:
+                stats = read_stats(cursor, "plot_stats")
+                return stats.get('chapter_count', 0), stats.get('total_word_count', 0)
+            cursor.execute('''
+                SELECT COUNT(*), COALESCE(SUM(c.word_count), 0) FROM chapter_canonical cc
+                JOIN chapters c ON c.id = cc.chapter_id
+                WHERE cc.branch = ? AND cc.chapter_number <= ?
+            ''', (self.MAIN_BRANCH, up_to_chapter))
+            return cursor.fetchone()
+    
+    def get_all_chapters(self, columns: Optional[List[str]] = None) -> List[Record]:
+        """
+        获取所有章节
+        
+        Args:
+            columns: 需要的列，None表示全部列
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            columns = self._chapter_columns(cursor, columns, [])
+            cursor.execute(f'''
+                SELECT {', '.join(columns)} FROM chapters
+                ORDER BY chapter_number, depth_level
+            ''')
+            return cursor.fetchall()
     
     def get_chapter_tree(self) -> Dict[str, Any]:
         """获取章节树状结构"""
-        chapters = self.get_all_chapters()
+        # 多查一个空的children列，记录里就有存放子章节列表的位置
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT *, NULL AS children FROM chapters
+                ORDER BY chapter_number, depth_level
+            ''')
+            chapters = cursor.fetchall()
         
         # 构建树状结构
         tree = {}
@@ -221,23 +995,392 @@ class PlotDatabase:
         
         return tree
     
+    # 递归查询的最大深度，防止parent_chapter_id成环时无限递归
+    MAX_TREE_DEPTH = 1000
+    
+    # 树节点默认需要的列
+    TREE_COLUMNS = ['id', 'chapter_number', 'title', 'parent_chapter_id', 'depth_level']
+    
+    def _tree_columns(self, cursor, columns: Optional[List[str]]) -> List[str]:
+        """树查询的列（总是包含id、编号和父章节ID）"""
+        return self._chapter_columns(cursor, columns,
+                                     ['id', 'chapter_number', 'parent_chapter_id'])
+    
+    def get_child_chapters(self, chapter_id: Optional[int] = None,
+                           columns: Optional[List[str]] = None) -> List[Record]:
+        """
+        获取直接子章节（只查一层）
+        
+        Args:
+            chapter_id: 父章节ID，None表示获取所有根章节
+            columns: 需要的列，None表示全部列
+        
+        Returns:
+            按章节编号排序的子章节列表，每项带child_count（其子章节数量）
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            columns = self._tree_columns(cursor, columns)
+            selected = ', '.join(f'c.{column}' for column in columns)
+            
+            cursor.execute(f'''
+                SELECT {selected},
+                       (SELECT COUNT(*) FROM chapters k WHERE k.parent_chapter_id = c.id) AS child_count
+                FROM chapters c
+                WHERE c.parent_chapter_id IS ?
+                ORDER BY c.chapter_number, c.id
+            ''', (chapter_id,))
+            
+            return cursor.fetchall()
+    
+    def get_chapter_ancestors(self, chapter_id: int,
+                              columns: Optional[List[str]] = None) -> List[Record]:
+        """
+        获取章节的所有祖先章节（递归CTE沿parent_chapter_id向上查找）
+        
+        Returns:
+            从根章节到直接父章节排列的列表，不包含章节本身
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            columns = self._tree_columns(cursor, columns)
+            selected = ', '.join(f'c.{column}' for column in columns)
+            
+            cursor.execute(f'''
+                WITH RECURSIVE ancestors (id, parent_id, distance) AS (
+                    SELECT id, parent_chapter_id, 0 FROM chapters WHERE id = ?
+                    UNION ALL
+                    SELECT c.id, c.parent_chapter_id, a.distance + 1
+                    FROM chapters c JOIN ancestors a ON c.id = a.parent_id
+                    WHERE a.distance < ?
+                )
+                SELECT {selected}
+                FROM ancestors a JOIN chapters c ON c.id = a.id
+                WHERE a.distance > 0
+                ORDER BY a.distance DESC
+            ''', (chapter_id, self.MAX_TREE_DEPTH))
+            
+            return cursor.fetchall()
+    
+    def get_chapter_descendants(self, chapter_id: int, max_depth: Optional[int] = None,
+                                columns: Optional[List[str]] = None) -> List[Record]:
+        """
+        获取章节的子孙章节（递归CTE逐层向下展开）
+        
+        Args:
+            chapter_id: 章节ID
+            max_depth: 最多向下展开的层数，None表示不限（1表示只要直接子章节）
+            columns: 需要的列，None表示全部列
+        
+        Returns:
+            先序遍历顺序的子孙章节列表（同一父章节下按章节编号排序），
+            每项带relative_depth（相对于该章节的层数，直接子章节为1）
+        """
+        depth_limit = self.MAX_TREE_DEPTH if max_depth is None else min(max_depth, self.MAX_TREE_DEPTH)
+        
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            columns = self._tree_columns(cursor, columns)
+            selected = ', '.join(f'c.{column}' for column in columns)
+            
+            # sort_path由每一层的(章节编号, ID)拼接而成，按它排序即为先序遍历
+            cursor.execute(f'''
+                WITH RECURSIVE subtree (id, relative_depth, sort_path) AS (
+                    SELECT id, 0, '' FROM chapters WHERE id = ?
+                    UNION ALL
+                    SELECT c.id, s.relative_depth + 1,
+                           s.sort_path || printf('%012d.%012d/', c.chapter_number, c.id)
+                    FROM chapters c JOIN subtree s ON c.parent_chapter_id = s.id
+                    WHERE s.relative_depth < ?
+                )
+                SELECT {selected}, s.relative_depth
+                FROM subtree s JOIN chapters c ON c.id = s.id
+                WHERE s.relative_depth > 0
+                ORDER BY s.sort_path
+            ''', (chapter_id, depth_limit))
+            
+            return cursor.fetchall()
+    
+    def get_chapter_siblings(self, chapter_id: int, include_self: bool = False,
+                             columns: Optional[List[str]] = None) -> List[Record]:
+        """
+        获取同一父章节下的兄弟章节（根章节的兄弟为其他根章节）
+        
+        Returns:
+            按章节编号排序的兄弟章节列表
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            columns = self._tree_columns(cursor, columns)
+            selected = ', '.join(f'c.{column}' for column in columns)
+            
+            cursor.execute(f'''
+                SELECT {selected}
+                FROM chapters c
+                WHERE c.parent_chapter_id IS (
+                    SELECT parent_chapter_id FROM chapters WHERE id = ?
+                )
+                AND EXISTS (SELECT 1 FROM chapters WHERE id = ?)
+                AND (? OR c.id != ?)
+                ORDER BY c.chapter_number, c.id
+            ''', (chapter_id, chapter_id, include_self, chapter_id))
+            
+            return cursor.fetchall()
+    
+    @writes
     def update_chapter(self, chapter_id: int, **kwargs) -> bool:
         """更新章节信息"""
         if not kwargs:
             return False
         
+        with sqlite3.connect(self.db_path) as conn:
+            updated = self._update_chapter(conn.cursor(), chapter_id, **kwargs)
+            conn.commit()
+            return updated
+    
+    def _update_chapter(self, cursor, chapter_id: int, **kwargs) -> bool:
+        """在当前事务中更新章节信息"""
         # 添加更新时间
         kwargs['updated_at'] = datetime.now().isoformat()
         
         set_clause = ', '.join([f"{key} = ?" for key in kwargs.keys()])
         values = list(kwargs.values()) + [chapter_id]
+        cursor.execute(f'UPDATE chapters SET {set_clause} WHERE id = ?', values)
+        updated = cursor.rowcount > 0
+        if updated and any(column in kwargs for column in FACET_COLUMNS):
+            index_chapter_facets(cursor, [chapter_id])
+        return updated
+    
+    # ==================== 章节标签 ====================
+    
+    @staticmethod
+    def _check_facet(facet: str):
+        if facet not in FACET_COLUMNS:
+            raise ValueError(f"未知的章节标签: {facet}，可用: {', '.join(FACET_COLUMNS)}")
+    
+    def get_chapter_facets(self, chapter_id: int) -> Dict[str, List[str]]:
+        """获取章节拆分后的各标签取值 {标签: [取值, ...]}"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT facet, value FROM chapter_facets
+                WHERE chapter_id = ?
+                ORDER BY facet, position
+            ''', (chapter_id,))
+            
+            facets = {facet: [] for facet in FACET_COLUMNS}
+            for facet, value in cursor.fetchall():
+                facets[facet].append(value)
+            return facets
+    
+    def get_chapters_with_facet(self, facet: str, value: str, start: int = 1,
+                                end: Optional[int] = None,
+                                columns: Optional[List[str]] = None,
+                                branch: str = MAIN_BRANCH) -> List[Record]:
+        """
+        获取标签包含某个取值的章节，如编号20-80之间有诺诺出场的章节：
+        get_chapters_with_facet("character_focus", "诺诺", 20, 80)
         
+        Args:
+            facet: 标签列（character_focus/setting/mood/themes/key_events）
+            value: 取值（拆分后的单个取值，完全匹配）
+            start: 起始章节编号（包含）
+            end: 结束章节编号（包含），None表示不限
+            columns: 需要的列，None表示全部列；结果中总是包含chapter_number
+            branch: 分支（每个编号只返回主版本，规则同get_chapters_in_range）
+        
+        Returns:
+            按章节编号排序的章节列表
+        """
+        self._check_facet(facet)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            columns = self._chapter_columns(cursor, columns, ['chapter_number'])
+            
+            cursor.execute(f'''
+                SELECT {', '.join(f'c.{column}' for column in columns)}
+                FROM chapter_facets f
+                JOIN chapter_canonical cc ON cc.chapter_id = f.chapter_id
+                JOIN chapters c ON c.id = f.chapter_id
+                WHERE f.facet = ? AND f.value = ?
+                AND f.chapter_number >= ? AND f.chapter_number <= ?
+                AND {self._CANONICAL_FILTER}
+                ORDER BY f.chapter_number
+            ''', (facet, value, start, end if end is not None else 2 ** 62,
+                  branch, self.MAIN_BRANCH, branch, branch))
+            
+            return cursor.fetchall()
+    
+    def get_facet_frequencies(self, facet: str, start: int = 1, end: Optional[int] = None,
+                              branch: str = MAIN_BRANCH,
+                              limit: Optional[int] = None) -> List[Record]:
+        """
+        统计编号范围内标签各取值出现的章节数
+        
+        Args:
+            facet: 标签列
+            start: 起始章节编号（包含）
+            end: 结束章节编号（包含），None表示不限
+            branch: 分支（只统计主版本，规则同get_chapters_in_range）
+            limit: 最多返回的取值数，None表示不限
+        
+        Returns:
+            [Record(value, chapter_count, first_chapter)]，按章节数从多到少排序
+        """
+        self._check_facet(facet)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT f.value, COUNT(*) AS chapter_count,
+                       MIN(f.chapter_number) AS first_chapter
+                FROM chapter_facets f
+                JOIN chapter_canonical cc ON cc.chapter_id = f.chapter_id
+                WHERE f.facet = ?
+                AND f.chapter_number >= ? AND f.chapter_number <= ?
+                AND {self._CANONICAL_FILTER}
+                GROUP BY f.value
+                ORDER BY chapter_count DESC, first_chapter, f.value
+                LIMIT ?
+            ''', (facet, start, end if end is not None else 2 ** 62,
+                  branch, self.MAIN_BRANCH, branch, branch,
+                  limit if limit is not None else -1))
+            
+            return cursor.fetchall()
+    
+    def get_facet_frequencies_by_range(self, facet: str,
+                                       ranges: Dict[str, Tuple[int, Optional[int]]],
+                                       branch: str = MAIN_BRANCH,
+                                       limit: Optional[int] = None) -> Dict[str, List[Record]]:
+        """
+        按多个章节范围（如故事弧、支线）分别统计标签频率
+        
+        Args:
+            facet: 标签列
+            ranges: {范围名称: (起始章节, 结束章节)}，结束章节为None表示不限
+            branch: 分支
+            limit: 每个范围最多返回的取值数
+        
+        Returns:
+            {范围名称: get_facet_frequencies的结果}
+        """
+        return {
+            name: self.get_facet_frequencies(facet, start, end, branch, limit)
+            for name, (start, end) in ranges.items()
+        }
+    
+    # ==================== 章节正文 ====================
+    
+    def _store_chapter_text(self, cursor, chapter_id: int, text: str) -> str:
+        """在当前事务中写入章节正文，返回正文哈希"""
+        blob = pack_text(text)
+        cursor.execute('''
+            INSERT OR IGNORE INTO text_blobs (
+                hash, codec, content, char_length, paragraph_offsets, head, tail
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (blob['hash'], blob['codec'], blob['content'], blob['char_length'],
+              blob['paragraph_offsets'], blob['head'], blob['tail']))
+        cursor.execute('''
+            INSERT INTO chapter_texts (chapter_id, text_hash) VALUES (?, ?)
+            ON CONFLICT (chapter_id) DO UPDATE SET
+                text_hash = excluded.text_hash, updated_at = CURRENT_TIMESTAMP
+        ''', (chapter_id, blob['hash']))
+        return blob['hash']
+    
+    @writes
+    def save_chapter_text(self, chapter_id: int, text: str) -> str:
+        """
+        保存章节完整正文（压缩存储，相同正文只存一份）
+        
+        Returns:
+            正文的SHA-256
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            return self._store_chapter_text(conn.cursor(), chapter_id, text)
+    
+    def get_chapter_text(self, chapter_id: int) -> Optional[str]:
+        """获取章节完整正文（解压），没有正文时返回None"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute(f'UPDATE chapters SET {set_clause} WHERE id = ?', values)
-            conn.commit()
-            return cursor.rowcount > 0
+            cursor.execute('''
+                SELECT b.codec, b.content FROM chapter_texts t
+                JOIN text_blobs b ON b.hash = t.text_hash
+                WHERE t.chapter_id = ?
+            ''', (chapter_id,))
+            result = cursor.fetchone()
+            return unpack_text(*result) if result else None
+    
+    def get_chapter_text_head(self, chapter_id: int, chars: int = 1000) -> Optional[str]:
+        """获取章节正文的前chars个字符（不超过TEXT_EDGE_CHARS时无需解压）"""
+        if chars > TEXT_EDGE_CHARS:
+            text = self.get_chapter_text(chapter_id)
+            return None if text is None else text[:chars]
+        
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT substr(b.head, 1, ?) FROM chapter_texts t
+                JOIN text_blobs b ON b.hash = t.text_hash
+                WHERE t.chapter_id = ?
+            ''', (chars, chapter_id))
+            result = cursor.fetchone()
+            return result[0] if result else None
+    
+    def get_chapter_text_tail(self, chapter_id: int, chars: int = 1000) -> Optional[str]:
+        """获取章节正文的最后chars个字符（不超过TEXT_EDGE_CHARS时无需解压）"""
+        if chars > TEXT_EDGE_CHARS:
+            text = self.get_chapter_text(chapter_id)
+            return None if text is None else text[-chars:]
+        if chars <= 0:
+            return "" if self.get_chapter_text_info(chapter_id) else None
+        
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT substr(b.tail, -?) FROM chapter_texts t
+                JOIN text_blobs b ON b.hash = t.text_hash
+                WHERE t.chapter_id = ?
+            ''', (chars, chapter_id))
+            result = cursor.fetchone()
+            return result[0] if result else None
+    
+    def get_chapter_paragraphs(self, chapter_id: int, start: int = 0,
+                               end: Optional[int] = None) -> List[str]:
+        """
+        按段落偏移获取正文中的第start到end段（不含end，支持负数下标）
+        
+        Returns:
+            段落文本列表，没有正文时为空列表
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT b.codec, b.content, b.paragraph_offsets FROM chapter_texts t
+                JOIN text_blobs b ON b.hash = t.text_hash
+                WHERE t.chapter_id = ?
+            ''', (chapter_id,))
+            result = cursor.fetchone()
+        
+        if not result:
+            return []
+        text = unpack_text(result[0], result[1])
+        return [text[begin:finish] for begin, finish in json.loads(result[2])[start:end]]
     
+    def get_chapter_text_info(self, chapter_id: int) -> Optional[Record]:
+        """获取章节正文的元信息（哈希、字数、段落数、压缩后大小），不解压正文"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT b.hash, b.codec, b.char_length,
+                       length(b.content) AS compressed_size,
+                       json_array_length(b.paragraph_offsets) AS paragraph_count,
+                       t.updated_at
+                FROM chapter_texts t
+                JOIN text_blobs b ON b.hash = t.text_hash
+                WHERE t.chapter_id = ?
+            ''', (chapter_id,))
+            return cursor.fetchone()
+    
+    @writes
     def add_plot_line(self, name: str, description: str = "", 
                      priority: int = 1) -> int:
         """添加情节线"""
@@ -251,79 +1394,151 @@ class PlotDatabase:
             conn.commit()
             return cursor.lastrowid
     
+    def get_plot_lines(self) -> List[Record]:
+        """获取所有情节线（按优先级降序）"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM plot_lines ORDER BY priority DESC')
+            return cursor.fetchall()
+    
+    @writes
     def link_chapter_plot_line(self, chapter_id: int, plot_line_id: int,
                               importance: int = 1, progress: str = ""):
         """关联章节和情节线"""
         with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO chapter_plot_lines (chapter_id, plot_line_id, importance, progress)
-                VALUES (?, ?, ?, ?)
-            ''', (chapter_id, plot_line_id, importance, progress))
+            self._insert_chapter_plot_line(conn.cursor(), chapter_id, plot_line_id,
+                                           importance, progress)
             conn.commit()
     
+    def _insert_chapter_plot_line(self, cursor, chapter_id: int, plot_line_id: int,
+                                  importance: int = 1, progress: str = ""):
+        """在当前事务中关联章节和情节线"""
+        cursor.execute('''
+            INSERT INTO chapter_plot_lines (chapter_id, plot_line_id, importance, progress)
+            VALUES (?, ?, ?, ?)
+        ''', (chapter_id, plot_line_id, importance, progress))
+    
+    @writes
     def add_character_arc(self, character_name: str, chapter_id: int,
                          development: str = "", emotional_state: str = "",
                          key_decisions: str = "", relationships_changed: str = ""):
         """添加角色发展轨迹"""
         with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO character_arcs (
-                    character_name, chapter_id, development, emotional_state,
-                    key_decisions, relationships_changed
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            ''', (character_name, chapter_id, development, emotional_state,
-                  key_decisions, relationships_changed))
+            self._insert_character_arc(conn.cursor(), character_name, chapter_id, development,
+                                       emotional_state, key_decisions, relationships_changed)
             conn.commit()
     
+    def _insert_character_arc(self, cursor, character_name: str, chapter_id: int,
+                              development: str = "", emotional_state: str = "",
+                              key_decisions: str = "", relationships_changed: str = ""):
+        """在当前事务中添加角色发展轨迹"""
+        cursor.execute('''
+            INSERT INTO character_arcs (
+                character_name, chapter_id, development, emotional_state,
+                key_decisions, relationships_changed
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        ''', (character_name, chapter_id, development, emotional_state,
+              key_decisions, relationships_changed))
+    
     def get_plot_summary(self, up_to_chapter: int = None) -> Dict[str, Any]:
-        """获取情节大纲摘要"""
-        with sqlite3.connect(self.db_path) as conn:
+        """
+        获取情节大纲摘要
+        
+        章节数和总字数在SQL中汇总（全书统计直接读取统计表），不读取章节行；
+        'chapters'是按编号分页读取各章主版本的迭代器（iter_chapters_in_range）
+        """
+        up_to_chapter = up_to_chapter or None
+        total_chapters, total_word_count = self.get_chapter_totals(up_to_chapter)
+        
+        with self._connect() as conn:
             cursor = conn.cursor()
-            
-            if up_to_chapter:
-                cursor.execute('''
-                    SELECT * FROM chapters 
-                    WHERE chapter_number <= ? 
-                    ORDER BY chapter_number, depth_level
-                ''', (up_to_chapter,))
-            else:
-                cursor.execute('SELECT * FROM chapters ORDER BY chapter_number, depth_level')
-            
-            chapters = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            chapters = [dict(zip(columns, chapter)) for chapter in chapters]
-            
-            # 获取情节线
             cursor.execute('SELECT * FROM plot_lines ORDER BY priority DESC')
             plot_lines = cursor.fetchall()
-            plot_columns = [description[0] for description in cursor.description]
-            plot_lines = [dict(zip(plot_columns, line)) for line in plot_lines]
-            
-            return {
-                'chapters': chapters,
-                'plot_lines': plot_lines,
-                'total_chapters': len(chapters),
-                'total_word_count': sum(ch['word_count'] for ch in chapters)
-            }
+        
+        return {
+            'chapters': self.iter_chapters_in_range(end=up_to_chapter),
+            'plot_lines': plot_lines,
+            'total_chapters': total_chapters,
+            'total_word_count': total_word_count
+        }
     
-    def get_character_development_timeline(self, character_name: str) -> List[Dict[str, Any]]:
+    def get_character_development_timeline(self, character_name: str) -> List[Record]:
         """获取角色发展时间线"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT ca.*, c.chapter_number, c.title
+                SELECT ca.*, c.title
                 FROM character_arcs ca
                 JOIN chapters c ON ca.chapter_id = c.id
                 WHERE ca.character_name = ?
-                ORDER BY c.chapter_number
+                ORDER BY ca.chapter_number, ca.id
             ''', (character_name,))
             
-            results = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, result)) for result in results]
+            return cursor.fetchall()
+    
+    def get_latest_character_arcs(self, character_names: List[str], limit: int = 1,
+                                  as_of_chapter: Optional[int] = None) -> Dict[str, List[Record]]:
+        """
+        批量获取多个角色最近的发展轨迹（一次窗口查询）
+        
+        Args:
+            character_names: 角色名列表
+            limit: 每个角色最多返回的条数
+            as_of_chapter: 只看截至该章（包含）的轨迹，None表示全部
+        
+        Returns:
+            {角色名: [轨迹, ...]}，每个角色的轨迹按章节顺序排列（最后一条为最新），
+            没有轨迹的角色对应空列表
+        """
+        names = list(dict.fromkeys(character_names))
+        result: Dict[str, List[Record]] = {name: [] for name in names}
+        if not names or limit <= 0:
+            return result
+        
+        placeholders = ', '.join('?' for _ in names)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            # 子查询只给轨迹id排名，结果列与get_character_development_timeline一致
+            cursor.execute(f'''
+                SELECT ca.*, c.title
+                FROM (
+                    SELECT ca.id,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY ca.character_name
+                               ORDER BY ca.chapter_number DESC, ca.id DESC
+                           ) AS arc_rank
+                    FROM character_arcs ca
+                    JOIN chapters c ON c.id = ca.chapter_id
+                    WHERE ca.character_name IN ({placeholders})
+                    AND ca.chapter_number <= ?
+                ) ranked
+                JOIN character_arcs ca ON ca.id = ranked.id
+                JOIN chapters c ON c.id = ca.chapter_id
+                WHERE ranked.arc_rank <= ?
+                ORDER BY ca.character_name, ca.chapter_number, ca.id
+            ''', (*names, as_of_chapter if as_of_chapter is not None else 2 ** 62, limit))
+            
+            for arc in cursor.fetchall():
+                result[arc['character_name']].append(arc)
+            return result
     
+    def get_character_arc_as_of(self, character_name: str,
+                                chapter_number: int) -> Optional[Record]:
+        """获取角色截至第chapter_number章（包含）的最新发展轨迹（一次索引查找）"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT ca.*, c.title
+                FROM character_arcs ca
+                JOIN chapters c ON c.id = ca.chapter_id
+                WHERE ca.character_name = ? AND ca.chapter_number <= ?
+                ORDER BY ca.chapter_number DESC, ca.id DESC
+                LIMIT 1
+            ''', (character_name, chapter_number))
+            
+            return cursor.fetchone()
+    
+    @writes
     def save_merge_summary(self, current_chapter: int, merge_factor: int, 
                           summary_content: str, merge_levels: int = 0,
                           ai_generated_titles: str = "") -> int:
@@ -343,19 +1558,226 @@ class PlotDatabase:
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
-            # 使用INSERT OR REPLACE来处理重复
+            # 已有相同(当前章节, 合并因子)的摘要时原地更新，保留记录ID且经过统计表的更新路径
             cursor.execute('''
-                INSERT OR REPLACE INTO merge_summaries (
+                INSERT INTO merge_summaries (
                     current_chapter, merge_factor, summary_content, 
                     summary_length, merge_levels, ai_generated_titles
                 ) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (current_chapter, merge_factor) DO UPDATE SET
+                    summary_content = excluded.summary_content,
+                    summary_length = excluded.summary_length,
+                    merge_levels = excluded.merge_levels,
+                    ai_generated_titles = excluded.ai_generated_titles,
+                    created_at = CURRENT_TIMESTAMP
             ''', (current_chapter, merge_factor, summary_content, 
                   len(summary_content), merge_levels, ai_generated_titles))
             
+            # 冲突更新时lastrowid不指向被更新的行，按唯一键取回ID
+            cursor.execute('''
+                SELECT id FROM merge_summaries WHERE current_chapter = ? AND merge_factor = ?
+            ''', (current_chapter, merge_factor))
+            summary_id = cursor.fetchone()[0]
+            
+            conn.commit()
+            return summary_id
+    
+    @writes
+    def invalidate_merge_summaries(self, from_chapter: int) -> int:
+        """
+        删除包含第from_chapter章及之后章节的合并摘要（章节内容变化后调用）
+        
+        Returns:
+            删除的摘要数
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            return self._invalidate_merge_summaries(conn.cursor(), from_chapter)
+    
+    def _invalidate_merge_summaries(self, cursor, from_chapter: int) -> int:
+        """在当前事务中删除current_chapter不小于from_chapter的合并摘要及覆盖这些章节的合并节点"""
+        cursor.execute('DELETE FROM merge_summaries WHERE current_chapter >= ?', (from_chapter,))
+        deleted = cursor.rowcount
+        cursor.execute('DELETE FROM merge_nodes WHERE end_chapter >= ?', (from_chapter,))
+        return deleted
+    
+    # ==================== 合并节点 ====================
+    
+    @writes
+    def save_merge_node(self, merge_factor: int, layer: int, start_chapter: int,
+                        end_chapter: int, node: Dict[str, Any], chapter_count: int,
+                        source_key: str, layout: str = "blocks") -> int:
+        """
+        保存合并节点
+        
+        同一层同一起始章节只保留一个节点：右边缘的节点随新章节加入而延长时，
+        旧的较短节点被替换。
+        
+        Args:
+            merge_factor: 合并因子
+            layer: 层（1为最底层的合并）
+            start_chapter: 起始章节编号
+            end_chapter: 结束章节编号
+            node: 节点内容（MERGE_NODE_FIELDS中的字段）
+            chapter_count: 包含的章节数
+            source_key: 输入章节的版本
+            layout: 分层布局（见MERGE_LAYOUTS）
+            
+        Returns:
+            节点ID
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM merge_nodes
+                WHERE layout = ? AND merge_factor = ? AND layer = ? AND start_chapter = ?
+            ''', (layout, merge_factor, layer, start_chapter))
+            cursor.execute(f'''
+                INSERT INTO merge_nodes (
+                    layout, merge_factor, layer, start_chapter, end_chapter, chapter_count,
+                    source_key, {', '.join(self.MERGE_NODE_FIELDS)}
+                ) VALUES ({', '.join('?' * (7 + len(self.MERGE_NODE_FIELDS)))})
+            ''', (layout, merge_factor, layer, start_chapter, end_chapter, chapter_count,
+                  source_key, *(node.get(field, "") for field in self.MERGE_NODE_FIELDS)))
             conn.commit()
             return cursor.lastrowid
     
-    def get_merge_summary(self, current_chapter: int, merge_factor: int) -> Optional[Dict[str, Any]]:
+    # 一条IN查询中的哈希数上限（低于SQLite的参数数量限制）
+    _CACHE_LOOKUP_BATCH = 500
+    
+    def get_cached_merge_nodes(self, content_hashes: List[str]) -> Dict[str, Record]:
+        """
+        按输入内容哈希批量查询缓存的合并节点
+        
+        Returns:
+            {内容哈希: 缓存记录}，只包含命中的哈希
+        """
+        cached = {}
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            content_hashes = list(dict.fromkeys(content_hashes))
+            for i in range(0, len(content_hashes), self._CACHE_LOOKUP_BATCH):
+                batch = content_hashes[i:i + self._CACHE_LOOKUP_BATCH]
+                cursor.execute(f'''
+                    SELECT * FROM merge_node_cache
+                    WHERE content_hash IN ({', '.join('?' * len(batch))})
+                ''', batch)
+                for row in cursor.fetchall():
+                    cached[row['content_hash']] = row
+        return cached
+    
+    @writes
+    def save_cached_merge_nodes(self, entries: List[Tuple[str, int, Dict[str, Any]]]) -> int:
+        """
+        保存AI生成的合并节点到内容缓存
+        
+        Args:
+            entries: [(内容哈希, 输入记录数, 节点内容), ...]
+            
+        Returns:
+            写入的条数
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            # 重新生成已缓存的哈希时只更新节点内容，保留命中次数
+            cursor.executemany(f'''
+                INSERT INTO merge_node_cache (
+                    content_hash, input_count, {', '.join(self.MERGE_NODE_FIELDS)}
+                ) VALUES ({', '.join('?' * (2 + len(self.MERGE_NODE_FIELDS)))})
+                ON CONFLICT (content_hash) DO UPDATE SET
+                    input_count = excluded.input_count,
+                    {', '.join(f'{field} = excluded.{field}' for field in self.MERGE_NODE_FIELDS)}
+            ''', [(content_hash, input_count,
+                   *(node.get(field, "") for field in self.MERGE_NODE_FIELDS))
+                  for content_hash, input_count, node in entries])
+            conn.commit()
+            return len(entries)
+    
+    @writes
+    def record_merge_cache_hits(self, content_hashes: List[str]) -> int:
+        """累加缓存条目的命中次数，返回更新的条数"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE merge_node_cache
+                SET hit_count = hit_count + 1, last_hit_at = CURRENT_TIMESTAMP
+                WHERE content_hash = ?
+            ''', [(content_hash,) for content_hash in content_hashes])
+            conn.commit()
+            return cursor.rowcount
+    
+    def get_merge_cache_stats(self) -> Dict[str, int]:
+        """
+        合并节点内容缓存的统计
+        
+        Returns:
+            {'entries': 缓存条数（即累计未命中数）, 'hits': 累计命中次数}
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM merge_node_cache')
+            entries, hits = cursor.fetchone()
+            return {"entries": entries, "hits": hits}
+    
+    def get_merge_nodes(self, merge_factor: int, up_to_chapter: Optional[int] = None,
+                        layout: str = "blocks") -> List[Record]:
+        """
+        获取合并因子下已保存的合并节点
+        
+        Args:
+            merge_factor: 合并因子
+            up_to_chapter: 只取结束章节不大于该值的节点，None表示不限
+            layout: 分层布局
+            
+        Returns:
+            按(层, 起始章节)排序的节点列表
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM merge_nodes
+                WHERE layout = ? AND merge_factor = ? AND end_chapter <= ?
+                ORDER BY layer, start_chapter
+            ''', (layout, merge_factor, up_to_chapter if up_to_chapter is not None else 2 ** 62))
+            
+            return cursor.fetchall()
+    
+    def get_merge_summaries_page(self, after: Optional[Tuple[int, int]] = None,
+                                 limit: int = PAGE_SIZE) -> List[Record]:
+        """
+        分页获取合并摘要（顺序同get_all_merge_summaries：章节号降序、合并因子升序）
+        
+        Args:
+            after: 上一页最后一行的(current_chapter, merge_factor)，None表示第一页
+            limit: 每页行数
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            if after is None:
+                cursor.execute('''
+                    SELECT * FROM merge_summaries
+                    ORDER BY current_chapter DESC, merge_factor ASC
+                    LIMIT ?
+                ''', (limit,))
+            else:
+                cursor.execute('''
+                    SELECT * FROM merge_summaries
+                    WHERE current_chapter < ? OR (current_chapter = ? AND merge_factor > ?)
+                    ORDER BY current_chapter DESC, merge_factor ASC
+                    LIMIT ?
+                ''', (after[0], after[0], after[1], limit))
+            return cursor.fetchall()
+    
+    def iter_merge_summaries(self, batch_size: int = PAGE_SIZE) -> Iterator[Record]:
+        """逐个产出全部合并摘要（分页读取）"""
+        after = None
+        while True:
+            page = self.get_merge_summaries_page(after, batch_size)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = (page[-1]['current_chapter'], page[-1]['merge_factor'])
+    
+    def get_merge_summary(self, current_chapter: int, merge_factor: int) -> Optional[Record]:
         """
         获取保存的合并摘要
         
@@ -366,59 +1788,32 @@ class PlotDatabase:
         Returns:
             合并摘要信息或None
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT * FROM merge_summaries 
                 WHERE current_chapter = ? AND merge_factor = ?
             ''', (current_chapter, merge_factor))
             
-            result = cursor.fetchone()
-            if result:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, result))
-            return None
+            return cursor.fetchone()
     
-    def get_all_merge_summaries(self) -> List[Dict[str, Any]]:
+    def get_all_merge_summaries(self) -> List[Record]:
         """获取所有保存的合并摘要"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT * FROM merge_summaries 
                 ORDER BY current_chapter DESC, merge_factor ASC
             ''')
             
-            results = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, result)) for result in results]
+            return cursor.fetchall()
     
     def get_database_stats(self) -> Dict[str, int]:
-        """获取数据库统计信息"""
+        """获取数据库统计信息（读取触发器维护的统计表）"""
         with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            stats = {}
-            
-            # 章节统计
-            cursor.execute('SELECT COUNT(*) FROM chapters')
-            stats['chapter_count'] = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT SUM(word_count) FROM chapters')
-            stats['total_word_count'] = cursor.fetchone()[0] or 0
-            
-            # 情节线统计
-            cursor.execute('SELECT COUNT(*) FROM plot_lines')
-            stats['plot_line_count'] = cursor.fetchone()[0]
-            
-            # 角色发展轨迹统计
-            cursor.execute('SELECT COUNT(*) FROM character_arcs')
-            stats['character_arc_count'] = cursor.fetchone()[0]
-            
-            # 合并摘要统计
-            cursor.execute('SELECT COUNT(*) FROM merge_summaries')
-            stats['merge_summary_count'] = cursor.fetchone()[0]
-            
-            return stats
+            stats = read_stats(conn.cursor(), "plot_stats")
+            return {name: stats.get(name, 0)
+                    for name, *_ in self.CHAPTER_STATS_COUNTERS + self.STATS_COUNTERS}
 
 if __name__ == "__main__":
     # 测试数据库功能
@@ -427,3 +1822,10 @@ if __name__ == "__main__":
     print("情节大纲数据库初始化完成！")
     stats = db.get_database_stats()
     print(f"数据库统计: {stats}")
+    
+    failures = db.check_query_plans()
+    if failures:
+        for name, plan in failures:
+            print(f"⚠️ 查询未使用索引: {name} → {plan}")
+    else:
+        print("✅ 常用查询均使用索引")
@@ -3,113 +3,141 @@
 对远距离章节进行合并，只保留最近章节的详细内容
 """
 
+import asyncio
+import hashlib
+import json
 import sys
 import os
 sys.path.append(os.path.dirname(__file__))
 
 from plot_api import PlotAPI
 from plot_database import PlotDatabase
+from async_api import AsyncPlotAPI
 from merge_agent import MergeAgent
-import sqlite3
-from typing import List, Dict, Any, Optional
+from ai_merge_interface import run_sync
+from extractive_summarizer import extract_merge_node
+from merge_layouts import (LAYOUTS, block_ranges, calculate_layers, mergeable_count,
+                           segment_cover, segment_layers, segment_ranges)
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 
 class PlotMergeSystem:
     """情节大纲合并系统"""
     
-    def __init__(self, db_path: str = None):
+    # 同时进行的AI合并调用数上限
+    MAX_CONCURRENCY = 4
+    
+    def __init__(self, db_path: str = None, max_concurrency: int = MAX_CONCURRENCY,
+                 layout: str = "blocks", extractive_layers: int = 0):
         if db_path is None:
             current_dir = os.path.dirname(os.path.abspath(__file__))
             db_path = os.path.join(current_dir, "plot_outline.db")
         self.db_path = db_path
         self.api = PlotAPI(db_path)
+        self.async_api = AsyncPlotAPI(self.api)
         self.merge_agent = MergeAgent()
+        self.max_concurrency = max_concurrency
+        # 默认分层布局（blocks/segment，见merge_layouts）
+        self.layout = layout
+        # 最底下的extractive_layers层用离线抽取式摘要生成，AI调用只留给更高的层
+        self.extractive_layers = extractive_layers
+        # 本实例累计的内容缓存命中/未命中次数
+        self.cache_stats = {"hits": 0, "misses": 0}
+    
+    def merge_chapters(self, current_chapter: int, merge_factor: int = 3,
+                       layout: Optional[str] = None) -> Dict[str, Any]:
+        """合并章节，创建分层的情节摘要（同步包装，见merge_chapters_async）"""
+        return run_sync(self.merge_chapters_async(current_chapter, merge_factor, layout))
     
-    def merge_chapters(self, current_chapter: int, merge_factor: int = 3) -> Dict[str, Any]:
+    async def merge_chapters_async(self, current_chapter: int, merge_factor: int = 3,
+                                   layout: Optional[str] = None) -> Dict[str, Any]:
         """
         合并章节，创建分层的情节摘要
         
+        节点按(布局, 层, 起始章节, 结束章节)保存在数据库中，任意current_chapter的视图都由已保存的节点组装：
+        输入没有变化的节点直接复用，只为缺少或过期的节点调用AI。
+        
+        - blocks布局：第layer层每merge_factor**layer个章节为一块，每层都直接合并原始章节，
+          新增一章时每层最右边的一块需要重新生成
+        - segment布局：第layer层把第layer-1层的merge_factor个节点合并为一个节点，只合并完整的块，
+          节点生成后不再变化；视图由覆盖全部章节的最少节点组成，平均每新增一章只需不到一次AI调用
+          （两种布局的调用次数对比见merge_layouts.py）
+        
+        各层自底向上逐层完成；同一层中需要生成的节点互不依赖，
+        并发调用AI（同时进行的调用数不超过max_concurrency）。
+        
         Args:
-            current_chapter: 当前章节号
-            merge_factor: 合并因子，每merge_factor个章节合并一次
+            current_chapter: 当前章节号（合并编号不大于它的章节）
+            merge_factor: 合并因子，每merge_factor个章节（节点）合并一次
+            layout: 分层布局（blocks/segment），None表示使用实例的默认布局
             
         Returns:
             合并后的情节结构
         """
+        layout = layout or self.layout
+        if layout not in LAYOUTS:
+            raise ValueError(f"未知的合并布局: {layout}，可用: {', '.join(LAYOUTS)}")
         
-        # 获取所有章节
-        all_chapters = self.api.get_all_chapters()
-        all_chapters.sort(key=lambda x: x['chapter_number'])
-        
-        # 按章节号分组
-        chapters_by_number = {}
-        for chapter in all_chapters:
-            num = chapter['chapter_number']
-            if num not in chapters_by_number:
-                chapters_by_number[num] = []
-            chapters_by_number[num].append(chapter)
-        
-        # 获取唯一的章节号列表
-        chapter_numbers = sorted(chapters_by_number.keys())
+        # 各编号主版本的ID和更新时间，用于判断已保存的节点是否过期
+        chapters = await self.async_api.get_chapters_in_range(1, current_chapter,
+                                                              columns=['id', 'updated_at'])
         
         # 创建合并结构
         merged_structure = {
             "current_chapter": current_chapter,
             "layers": [],
-            "total_chapters": len(chapter_numbers),
-            "merge_factor": merge_factor
+            "total_chapters": len(chapters),
+            "merge_factor": merge_factor,
+            "layout": layout,
+            "reused_nodes": 0,
+            "generated_nodes": 0,
+            "cache_hits": 0,
+            "cache_misses": 0
         }
         
-        # 计算需要多少层
-        max_layers = self._calculate_layers(len(chapter_numbers), merge_factor)
-        
-        # 为每一层创建合并数据
-        for layer in range(max_layers + 1):
-            layer_data = self._create_layer_data(
-                chapter_numbers, current_chapter, layer, merge_factor
-            )
-            if layer_data:
-                merged_structure["layers"].append(layer_data)
+        # 已保存的合并节点：(层, 起始章节, 结束章节) -> 节点
+        stored_nodes = {
+            (node['layer'], node['start_chapter'], node['end_chapter']): node
+            for node in await self.async_api.get_merge_nodes(merge_factor, current_chapter, layout)
+        }
         
+        if layout == "segment":
+            summary_layers, detail_start = await self._create_segment_layers(
+                chapters, merge_factor, stored_nodes, merged_structure)
+        else:
+            summary_layers, detail_start = [], mergeable_count(len(chapters))
+            # 计算需要多少层
+            max_layers = self._calculate_layers(len(chapters), merge_factor)
+            for layer in range(1, max_layers + 1):
+                layer_data = await self._create_summary_layer(
+                    chapters, layer, merge_factor, stored_nodes, merged_structure
+                )
+                if layer_data:
+                    summary_layers.append(layer_data)
+        
+        # 第0层：最近章节的详细内容；其他层：合并摘要
+        merged_structure["layers"].append(await self._create_detail_layer(chapters[detail_start:]))
+        merged_structure["layers"].extend(summary_layers)
+        
+        print(f"🧩 合并节点: 复用{merged_structure['reused_nodes']}个, "
+              f"新生成{merged_structure['generated_nodes']}个"
+              f"（内容缓存命中{merged_structure['cache_hits']}次, "
+              f"未命中{merged_structure['cache_misses']}次）")
         return merged_structure
     
     def _calculate_layers(self, total_chapters: int, merge_factor: int) -> int:
         """计算需要的层数"""
-        layers = 0
-        remaining = total_chapters
-        
-        while remaining > merge_factor:
-            remaining = (remaining + merge_factor - 1) // merge_factor
-            layers += 1
-        
-        return layers
+        return calculate_layers(total_chapters, merge_factor)
     
-    def _create_layer_data(self, chapter_numbers: List[int], current_chapter: int, 
-                          layer: int, merge_factor: int) -> Optional[Dict[str, Any]]:
-        """为指定层创建数据"""
+    async def _create_detail_layer(self, chapters: List[Dict]) -> Dict[str, Any]:
+        """创建详细层（最近章节，以及segment布局中还没凑满一块的章节）"""
         
-        if layer == 0:
-            # 第0层：最近章节的详细内容
-            return self._create_detail_layer(chapter_numbers, current_chapter)
-        else:
-            # 其他层：合并摘要
-            return self._create_summary_layer(chapter_numbers, current_chapter, 
-                                            layer, merge_factor)
-    
-    def _create_detail_layer(self, chapter_numbers: List[int], current_chapter: int) -> Dict[str, Any]:
-        """创建详细层（最近章节）"""
-        
-        # 获取最近3个章节的详细内容
+        # 一次范围查询获取详细内容
         recent_chapters = []
-        start_idx = max(0, len(chapter_numbers) - 3)
-        
-        for i in range(start_idx, len(chapter_numbers)):
-            chapter_num = chapter_numbers[i]
-            chapters = self.api.get_chapters_by_number(chapter_num)
-            if chapters:
-                # 取第一个章节（假设同一章节号的内容相似）
-                chapter = chapters[0]
+        if chapters:
+            for chapter in await self.async_api.get_chapters_in_range(
+                    chapters[0]['chapter_number'], chapters[-1]['chapter_number']):
                 recent_chapters.append({
-                    "chapter_number": chapter_num,
+                    "chapter_number": chapter['chapter_number'],
                     "title": chapter['title'],
                     "summary": chapter['summary'],
                     "plot_point": chapter['plot_point'],
@@ -128,25 +156,44 @@ class PlotMergeSystem:
             "chapters": recent_chapters
         }
     
-    def _create_summary_layer(self, chapter_numbers: List[int], current_chapter: int, 
-                            layer: int, merge_factor: int) -> Optional[Dict[str, Any]]:
-        """创建摘要层"""
+    async def _create_summary_layer(self, chapters: List[Dict], layer: int, merge_factor: int,
+                                    stored_nodes: Dict[tuple, Dict],
+                                    merged_structure: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """创建摘要层（blocks布局）"""
         
         # 计算当前层的章节范围
-        layer_chapters = self._get_layer_chapters(chapter_numbers, layer, merge_factor)
+        blocks = [chapters[start_idx:end_idx] for start_idx, end_idx
+                  in self._get_layer_chapters(chapters, layer, merge_factor)]
         
-        if not layer_chapters:
+        if not blocks:
             return None
         
-        # 为每个范围创建合并摘要
-        merged_ranges = []
-        for start_idx, end_idx in layer_chapters:
-            range_chapters = chapter_numbers[start_idx:end_idx]
-            if range_chapters:
-                merged_summary = self._create_range_summary(range_chapters)
-                if merged_summary:
-                    merged_ranges.append(merged_summary)
-        
+        # 已保存且未过期的节点直接复用
+        merged_ranges = [None] * len(blocks)
+        missing = []
+        for index, block in enumerate(blocks):
+            node = stored_nodes.get((layer, block[0]['chapter_number'], block[-1]['chapter_number']))
+            if node is not None and node['source_key'] == self._source_key(block):
+                merged_ranges[index] = self._node_summary(node)
+                merged_structure["reused_nodes"] += 1
+            else:
+                missing.append(index)
+        
+        # 本层缺少的节点互不依赖，并发生成后保存
+        if missing:
+            generated = await self._create_range_summaries([blocks[index] for index in missing],
+                                                           layer, merged_structure)
+            for index, merged_summary in zip(missing, generated):
+                if not merged_summary:
+                    continue
+                block = blocks[index]
+                merged_ranges[index] = merged_summary
+                merged_structure["generated_nodes"] += 1
+                await self.async_api.save_merge_node(
+                    merge_factor, layer, block[0]['chapter_number'], block[-1]['chapter_number'],
+                    merged_summary, merged_summary["chapter_count"], self._source_key(block))
+        
+        merged_ranges = [merged_summary for merged_summary in merged_ranges if merged_summary]
         if not merged_ranges:
             return None
         
@@ -157,171 +204,244 @@ class PlotMergeSystem:
             "ranges": merged_ranges
         }
     
-    def _get_layer_chapters(self, chapter_numbers: List[int], layer: int, merge_factor: int) -> List[tuple]:
-        """获取指定层的章节范围"""
-        
-        # 计算当前层的合并大小
-        merge_size = merge_factor ** layer
-        
-        # 排除最近3个章节（它们在第0层）
-        exclude_count = min(3, len(chapter_numbers))
-        available_chapters = chapter_numbers[:-exclude_count] if exclude_count > 0 else chapter_numbers
-        
-        if not available_chapters:
-            return []
-        
-        # 按merge_size分组
-        ranges = []
-        for i in range(0, len(available_chapters), merge_size):
-            end_idx = min(i + merge_size, len(available_chapters))
-            if i < len(available_chapters):
-                ranges.append((i, end_idx))
-        
-        return ranges
+    def _get_layer_chapters(self, chapters: List[Any], layer: int, merge_factor: int) -> List[tuple]:
+        """获取指定层的章节范围（排除最近的章节，它们在第0层）"""
+        return block_ranges(mergeable_count(len(chapters)), layer, merge_factor)
     
-    def _create_range_summary(self, chapter_numbers: List[int]) -> Optional[Dict[str, Any]]:
-        """为章节范围创建合并摘要（使用AI Agent）"""
-        
-        if not chapter_numbers:
-            return None
-        
-        # 获取范围内的所有章节
-        chapters_data = []
-        for chapter_num in chapter_numbers:
-            chapters = self.api.get_chapters_by_number(chapter_num)
-            if chapters:
-                chapters_data.append(chapters[0])
+    async def _create_segment_layers(self, chapters: List[Dict], merge_factor: int,
+                                     stored_nodes: Dict[tuple, Dict],
+                                     merged_structure: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        segment布局：自底向上逐层生成完整的块
         
-        if not chapters_data:
-            return None
+        第1层合并原始章节，更高层合并下一层节点的摘要；节点的版本由子节点的版本组合而成，
+        任一章节变化时只有它到根路径上的节点过期。
         
-        # 使用AI Agent生成智能合并摘要
-        start_chapter = min(chapter_numbers)
-        end_chapter = max(chapter_numbers)
-        
-        # 调用AI Agent生成合并节点
-        merged_node = self.merge_agent.generate_merge_node(chapters_data)
-        
-        # 构建合并摘要
-        merged_summary = {
-            "range": f"第{start_chapter}-{end_chapter}章",
-            "title": merged_node["title"],
-            "summary": merged_node["summary"],
-            "plot_point": merged_node["plot_point"],
-            "key_events": merged_node["key_events"],
-            "character_focus": merged_node["character_focus"],
-            "setting": merged_node["setting"],
-            "mood": merged_node["mood"],
-            "themes": merged_node["themes"],
-            "chapter_count": len(chapters_data)
-        }
-        
-        return merged_summary
+        Returns:
+            (覆盖参与合并章节的各摘要层（从低到高）, 没有被节点覆盖的第一个章节的序号)
+        """
+        count = mergeable_count(len(chapters))
+        # 上一层的节点：[(版本, 合并摘要)]
+        previous = []
+        summaries = {}
+        
+        for layer in range(1, segment_layers(count, merge_factor) + 1):
+            ranges = segment_ranges(count, layer, merge_factor)
+            nodes = [None] * len(ranges)
+            missing = []
+            for index, (start_idx, end_idx) in enumerate(ranges):
+                if layer == 1:
+                    source_key = self._source_key(chapters[start_idx:end_idx])
+                else:
+                    children = previous[index * merge_factor:(index + 1) * merge_factor]
+                    source_key = self._hash_keys(key for key, _ in children)
+                node = stored_nodes.get((layer, chapters[start_idx]['chapter_number'],
+                                         chapters[end_idx - 1]['chapter_number']))
+                if node is not None and node['source_key'] == source_key:
+                    nodes[index] = (source_key, self._node_summary(node))
+                    merged_structure["reused_nodes"] += 1
+                else:
+                    nodes[index] = (source_key, None)
+                    missing.append(index)
+            
+            # 本层缺少的节点互不依赖：第1层输入原始章节，更高层输入下一层节点的摘要
+            if missing:
+                if layer == 1:
+                    inputs = await asyncio.gather(*(
+                        self.async_api.get_chapters_in_range(
+                            chapters[ranges[index][0]]['chapter_number'],
+                            chapters[ranges[index][1] - 1]['chapter_number'])
+                        for index in missing
+                    ))
+                else:
+                    inputs = [[summary for _, summary in
+                               previous[index * merge_factor:(index + 1) * merge_factor]]
+                              for index in missing]
+                merged_nodes = await self._generate_merge_nodes(inputs, layer, merged_structure)
+                
+                for index, merged_node in zip(missing, merged_nodes):
+                    start_idx, end_idx = ranges[index]
+                    start_chapter = chapters[start_idx]['chapter_number']
+                    end_chapter = chapters[end_idx - 1]['chapter_number']
+                    merged_summary = self._range_summary(start_chapter, end_chapter, merged_node,
+                                                         end_idx - start_idx)
+                    source_key = nodes[index][0]
+                    nodes[index] = (source_key, merged_summary)
+                    merged_structure["generated_nodes"] += 1
+                    await self.async_api.save_merge_node(
+                        merge_factor, layer, start_chapter, end_chapter, merged_summary,
+                        end_idx - start_idx, source_key, "segment")
+            
+            for (start_idx, _), (_, merged_summary) in zip(ranges, nodes):
+                summaries[(layer, start_idx)] = merged_summary
+            previous = nodes
+        
+        # 视图只包含覆盖全部参与合并章节的最少节点
+        cover, detail_start = segment_cover(count, merge_factor)
+        layers = {}
+        for layer, start_idx, _ in cover:
+            layers.setdefault(layer, []).append(summaries[(layer, start_idx)])
+        
+        summary_layers = []
+        for layer in sorted(layers):
+            description = (f"第{layer}层合并摘要（每{merge_factor}个章节合并）" if layer == 1 else
+                           f"第{layer}层合并摘要（每{merge_factor**layer}个章节，"
+                           f"由{merge_factor}个第{layer - 1}层节点合并）")
+            summary_layers.append({
+                "layer": layer,
+                "type": "summary",
+                "description": description,
+                "ranges": layers[layer]
+            })
+        return summary_layers, detail_start
     
-    def _merge_titles(self, chapters: List[Dict]) -> str:
-        """合并标题"""
-        titles = [ch['title'] for ch in chapters if ch.get('title')]
-        if len(titles) == 1:
-            return titles[0]
-        elif len(titles) <= 3:
-            return " → ".join(titles)
-        else:
-            return f"{titles[0]} → ... → {titles[-1]}"
+    @staticmethod
+    def _hash_keys(keys: Iterable[str]) -> str:
+        """把多个版本组合为一个版本"""
+        return hashlib.sha1("\n".join(keys).encode("utf-8")).hexdigest()
     
-    def _merge_summaries(self, chapters: List[Dict]) -> str:
-        """合并摘要"""
-        summaries = [ch['summary'] for ch in chapters if ch.get('summary')]
-        if not summaries:
-            return ""
-        
-        # 如果只有一个摘要，直接返回
-        if len(summaries) == 1:
-            return summaries[0]
-        
-        # 合并多个摘要
-        merged = f"【{len(summaries)}个章节的合并摘要】"
-        
-        # 取前两个和后一个摘要的关键部分
-        if len(summaries) >= 2:
-            first_summary = summaries[0][:100] + "..." if len(summaries[0]) > 100 else summaries[0]
-            merged += f" {first_summary}"
-        
-        if len(summaries) > 2:
-            merged += f" ... [中间省略{len(summaries)-2}个章节] ..."
-        
-        if len(summaries) > 1:
-            last_summary = summaries[-1][:100] + "..." if len(summaries[-1]) > 100 else summaries[-1]
-            merged += f" {last_summary}"
-        
-        return merged
+    @classmethod
+    def _source_key(cls, chapters: List[Dict]) -> str:
+        """输入章节的版本：各章节主版本的ID和更新时间的哈希"""
+        return cls._hash_keys(f"{chapter['id']}:{chapter['updated_at']}" for chapter in chapters)
     
-    def _merge_plot_points(self, chapters: List[Dict]) -> str:
-        """合并情节要点"""
-        points = [ch['plot_point'] for ch in chapters if ch.get('plot_point')]
-        return " → ".join(points) if points else ""
+    def _node_summary(self, node: Dict[str, Any]) -> Dict[str, Any]:
+        """把保存的合并节点转换为合并摘要"""
+        return self._range_summary(node['start_chapter'], node['end_chapter'], node,
+                                   node['chapter_count'])
     
-    def _merge_key_events(self, chapters: List[Dict]) -> str:
-        """合并关键事件"""
-        events = [ch['key_events'] for ch in chapters if ch.get('key_events')]
-        return " → ".join(events) if events else ""
+    @staticmethod
+    def _range_summary(start_chapter: int, end_chapter: int, merged_node: Dict[str, Any],
+                       chapter_count: int) -> Dict[str, Any]:
+        """构建合并摘要"""
+        merged_summary = {"range": f"第{start_chapter}-{end_chapter}章"}
+        for field in PlotDatabase.MERGE_NODE_FIELDS:
+            merged_summary[field] = merged_node[field]
+        merged_summary["chapter_count"] = chapter_count
+        return merged_summary
     
-    def _merge_character_focus(self, chapters: List[Dict]) -> str:
-        """合并角色焦点"""
-        characters = []
-        for ch in chapters:
-            if ch.get('character_focus'):
-                characters.extend(ch['character_focus'].split('，'))
-        
-        # 去重并保持顺序
-        unique_characters = []
-        seen = set()
-        for char in characters:
-            char = char.strip()
-            if char and char not in seen:
-                unique_characters.append(char)
-                seen.add(char)
-        
-        return "，".join(unique_characters) if unique_characters else ""
+    def _content_hash(self, records: List[Dict], generator_id: str) -> str:
+        """
+        合并输入的内容哈希
+        
+        按送给AI的字段（与章节编号、合并因子和层无关）和生成方式计算，
+        相同输入在任何合并视图中都得到同一个哈希
+        """
+        canonical = [[record.get(field) or "" for field in PlotDatabase.MERGE_NODE_FIELDS]
+                     for record in records]
+        payload = json.dumps([generator_id, canonical],
+                             ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
     
-    def _merge_settings(self, chapters: List[Dict]) -> str:
-        """合并场景设定"""
-        settings = [ch['setting'] for ch in chapters if ch.get('setting')]
-        return " → ".join(settings) if settings else ""
+    async def _create_range_summaries(self, blocks: List[List[Dict]], layer: int,
+                                      merged_structure: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+        """为多个章节范围创建合并摘要，顺序与blocks一致"""
+        
+        # 一次查询获取每个范围内所有章节的主版本
+        chapters_data = await asyncio.gather(*(
+            self.async_api.get_chapters_in_range(block[0]['chapter_number'],
+                                                 block[-1]['chapter_number'])
+            for block in blocks
+        ))
+        
+        merged_nodes = await self._generate_merge_nodes(chapters_data, layer, merged_structure)
+        return [
+            self._range_summary(chapters[0]['chapter_number'], chapters[-1]['chapter_number'],
+                                merged_node, len(chapters)) if chapters else None
+            for chapters, merged_node in zip(chapters_data, merged_nodes)
+        ]
     
-    def _merge_moods(self, chapters: List[Dict]) -> str:
-        """合并氛围描述"""
-        moods = []
-        for ch in chapters:
-            if ch.get('mood'):
-                moods.extend(ch['mood'].split('、'))
-        
-        # 去重
-        unique_moods = list(dict.fromkeys([mood.strip() for mood in moods if mood.strip()]))
-        return "、".join(unique_moods) if unique_moods else ""
+    async def _generate_merge_nodes(self, inputs: List[List[Dict]], layer: int,
+                                    merged_structure: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+        """
+        为第layer层的多组输入记录（章节或下一层节点的摘要）生成合并节点，顺序与inputs一致
+        
+        不高于extractive_layers的层直接用抽取式摘要生成（毫秒级，不经过缓存）；
+        其他层先按输入内容哈希查缓存，只为未命中的多记录输入并发调用AI Agent，生成结果写回缓存
+        （单条输入直接使用该记录，不调用AI也不经过缓存；空输入为None）。
+        """
+        
+        if layer <= self.extractive_layers:
+            return [extract_merge_node(records) if len(records) > 1 else
+                    (records[0] if records else None) for records in inputs]
+        
+        # 按内容哈希查缓存
+        generator_id = self.merge_agent.generator_id
+        hashes = [self._content_hash(records, generator_id) if len(records) > 1 else None
+                  for records in inputs]
+        cached = await self.async_api.get_cached_merge_nodes(
+            [content_hash for content_hash in hashes if content_hash])
+        
+        # 缓存未命中的输入调用AI Agent并发生成（同一批中的相同输入只生成一次）
+        pending = list(dict.fromkeys(
+            content_hash for content_hash in hashes if content_hash and content_hash not in cached))
+        pending_inputs = {content_hash: records for content_hash, records in zip(hashes, inputs)}
+        generated = await self.merge_agent.generate_merge_nodes_async(
+            [pending_inputs[content_hash] for content_hash in pending], self.max_concurrency)
+        generated = dict(zip(pending, generated))
+        
+        hits = [content_hash for content_hash in hashes if content_hash in cached]
+        self._count_cache_lookups(merged_structure, len(hits), len(pending))
+        if generated:
+            await self.async_api.save_cached_merge_nodes(
+                [(content_hash, len(pending_inputs[content_hash]), merged_node)
+                 for content_hash, merged_node in generated.items()])
+        if hits:
+            await self.async_api.record_merge_cache_hits(hits)
+        
+        merged_nodes = []
+        for records, content_hash in zip(inputs, hashes):
+            if not records:
+                merged_nodes.append(None)
+            elif content_hash is None:
+                merged_nodes.append(records[0])
+            else:
+                merged_nodes.append(cached.get(content_hash) or generated[content_hash])
+        return merged_nodes
     
-    def _merge_themes(self, chapters: List[Dict]) -> str:
-        """合并主题分析"""
-        themes = []
-        for ch in chapters:
-            if ch.get('themes'):
-                themes.extend(ch['themes'].split('、'))
-        
-        # 去重
-        unique_themes = list(dict.fromkeys([theme.strip() for theme in themes if theme.strip()]))
-        return "、".join(unique_themes) if unique_themes else ""
+    def _count_cache_lookups(self, merged_structure: Dict[str, Any], hits: int, misses: int):
+        """累加内容缓存的命中/未命中次数（本次合并和本实例累计）"""
+        merged_structure["cache_hits"] += hits
+        merged_structure["cache_misses"] += misses
+        self.cache_stats["hits"] += hits
+        self.cache_stats["misses"] += misses
     
-    def format_merged_plot_summary(self, current_chapter: int, merge_factor: int = 3) -> str:
-        """格式化合并后的情节摘要，并自动保存到数据库"""
+    def get_cache_stats(self) -> Dict[str, int]:
+        """
+        合并节点内容缓存的命中统计
+        
+        Returns:
+            {'hits', 'misses'}为本实例累计的命中/未命中次数，
+            {'entries', 'total_hits'}为数据库中的缓存条数和累计命中次数
+        """
+        stored = self.api.get_merge_cache_stats()
+        return {**self.cache_stats, "entries": stored["entries"], "total_hits": stored["hits"]}
+    
+    def format_merged_plot_summary(self, current_chapter: int, merge_factor: int = 3,
+                                   layout: Optional[str] = None) -> str:
+        """格式化合并后的情节摘要，并自动保存到数据库（同步包装，见format_merged_plot_summary_async）"""
+        return run_sync(self.format_merged_plot_summary_async(current_chapter, merge_factor, layout))
+    
+    async def format_merged_plot_summary_async(self, current_chapter: int, merge_factor: int = 3,
+                                               layout: Optional[str] = None) -> str:
+        """
+        格式化合并后的情节摘要，并自动保存到数据库
+        
+        merge_summaries按(章节, 合并因子)保存格式化结果，只用于blocks布局；
+        segment布局每次由保存的节点组装（节点已保存，组装不调用AI）。
+        """
+        layout = layout or self.layout
         
         # 首先检查是否已有保存的摘要
-        saved_summary = self.api.get_merge_summary(current_chapter, merge_factor)
-        if saved_summary:
-            print(f"✅ 使用已保存的合并摘要 (第{current_chapter}章, 合并因子{merge_factor})")
-            return saved_summary['summary_content']
+        if layout == "blocks":
+            saved_summary = await self.async_api.get_merge_summary(current_chapter, merge_factor)
+            if saved_summary:
+                print(f"✅ 使用已保存的合并摘要 (第{current_chapter}章, 合并因子{merge_factor})")
+                return saved_summary['summary_content']
         
-        print(f"🔄 生成新的合并摘要 (第{current_chapter}章, 合并因子{merge_factor})")
+        print(f"🔄 生成新的合并摘要 (第{current_chapter}章, 合并因子{merge_factor}, {layout}布局)")
         
-        merged_structure = self.merge_chapters(current_chapter, merge_factor)
+        merged_structure = await self.merge_chapters_async(current_chapter, merge_factor, layout)
         
         result = []
         result.append("📚 分层情节大纲摘要")
@@ -329,6 +449,7 @@ class PlotMergeSystem:
         result.append(f"📊 当前章节: 第{current_chapter}章")
         result.append(f"📊 总章节数: {merged_structure['total_chapters']}")
         result.append(f"📊 合并因子: {merge_factor}")
+        result.append(f"📊 合并布局: {layout}")
         result.append("")
         
         # 收集AI生成的标题用于保存
@@ -377,36 +498,25 @@ class PlotMergeSystem:
         merge_levels = len([layer for layer in merged_structure["layers"] if layer["layer"] > 0])
         
         # 保存到数据库
-        try:
-            import json
-            ai_titles_json = json.dumps(ai_titles, ensure_ascii=False)
-            self.api.save_merge_summary(
-                current_chapter=current_chapter,
-                merge_factor=merge_factor,
-                summary_content=summary_content,
-                merge_levels=merge_levels,
-                ai_generated_titles=ai_titles_json
-            )
-            print(f"💾 合并摘要已保存到数据库")
-        except Exception as e:
-            print(f"⚠️ 保存合并摘要时出错: {str(e)}")
+        if layout == "blocks":
+            try:
+                ai_titles_json = json.dumps(ai_titles, ensure_ascii=False)
+                await self.async_api.save_merge_summary(
+                    current_chapter=current_chapter,
+                    merge_factor=merge_factor,
+                    summary_content=summary_content,
+                    merge_levels=merge_levels,
+                    ai_generated_titles=ai_titles_json
+                )
+                print(f"💾 合并摘要已保存到数据库")
+            except Exception as e:
+                print(f"⚠️ 保存合并摘要时出错: {str(e)}")
         
         return summary_content
     
     def get_chapters_by_number(self, chapter_number: int) -> List[Dict]:
         """获取指定章节号的所有章节"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT * FROM chapters WHERE chapter_number = ?
-        """, (chapter_number,))
-        
-        columns = [description[0] for description in cursor.description]
-        chapters = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        conn.close()
-        return chapters
+        return self.api.get_chapters_by_number(chapter_number)
 
 def test_merge_system():
     """测试合并系统"""
@@ -0,0 +1,152 @@
+"""
+情节大纲的工作单元（会话）
+先在内存中暂存一章相关的全部写入（章节行、角色轨迹、情节线关联、正文、合并摘要失效），
+提交时在同一个事务里按暂存顺序执行：要么全部生效，要么全部不生效
+"""
+
+import sqlite3
+from typing import Any, List, Optional, Tuple, Union
+
+
+class StagedChapter:
+    """暂存的新章节，提交成功后id为数据库中的章节ID"""
+
+    def __init__(self, chapter_number: int, title: str):
+        self.chapter_number = chapter_number
+        self.title = title
+        self.id: Optional[int] = None
+
+    def __repr__(self) -> str:
+        return f"StagedChapter(chapter_number={self.chapter_number}, title={self.title!r}, id={self.id})"
+
+
+# 章节参数可以是已有章节的ID，也可以是同一会话中暂存的新章节
+ChapterRef = Union[int, StagedChapter]
+
+
+class PlotSession:
+    """
+    情节大纲写入会话
+
+    用法：
+        with plot_api.session() as session:
+            chapter = session.add_chapter(28, "标题", summary, make_canonical=True)
+            session.save_chapter_text(chapter, content)
+            session.add_character_arc("路明非", chapter, development="...")
+            session.invalidate_merge_summaries(28)
+        print(chapter.id)
+
+    with块正常结束时提交，抛出异常时丢弃暂存的写入。暂存期间不占用数据库，
+    提交时才加写锁，一个事务只落盘一次。
+    """
+
+    def __init__(self, db):
+        """
+        Args:
+            db: PlotDatabase 实例
+        """
+        self.db = db
+        # (PlotDatabase上接受cursor的方法名, 参数, 关键字参数, 接收返回值的暂存章节)
+        self._operations: List[Tuple[str, tuple, dict, Optional[StagedChapter]]] = []
+        self._staged_chapters: List[StagedChapter] = []
+        self.committed = False
+
+    def add_chapter(self, chapter_number: int, title: str, summary: str = "",
+                    word_count: int = 0, **kwargs) -> StagedChapter:
+        """暂存新章节（参数同PlotDatabase.add_chapter），返回可在本会话中引用的章节"""
+        chapter = StagedChapter(chapter_number, title)
+        self._staged_chapters.append(chapter)
+        self._stage("_insert_chapter", (chapter_number, title, summary, word_count), kwargs,
+                    result=chapter)
+        return chapter
+
+    def update_chapter(self, chapter: ChapterRef, **kwargs):
+        """暂存章节信息的更新"""
+        if kwargs:
+            self._stage("_update_chapter", (chapter,), kwargs)
+
+    def save_chapter_text(self, chapter: ChapterRef, text: str):
+        """暂存章节正文"""
+        self._stage("_store_chapter_text", (chapter, text))
+
+    def set_canonical_chapter(self, chapter: ChapterRef):
+        """暂存“设为主版本”"""
+        self._stage("_set_canonical", (chapter,))
+
+    def add_character_arc(self, character_name: str, chapter: ChapterRef, **kwargs):
+        """暂存角色发展轨迹（参数同PlotDatabase.add_character_arc）"""
+        self._stage("_insert_character_arc", (character_name, chapter), kwargs)
+
+    def link_chapter_plot_line(self, chapter: ChapterRef, plot_line_id: int,
+                               importance: int = 1, progress: str = ""):
+        """暂存章节与情节线的关联"""
+        self._stage("_insert_chapter_plot_line", (chapter, plot_line_id, importance, progress))
+
+    def invalidate_merge_summaries(self, from_chapter: int):
+        """暂存合并摘要失效（删除包含第from_chapter章及之后章节的摘要）"""
+        self._stage("_invalidate_merge_summaries", (from_chapter,))
+
+    def _stage(self, method: str, args: tuple, kwargs: Optional[dict] = None,
+               result: Optional[StagedChapter] = None):
+        if self.committed:
+            raise RuntimeError("会话已提交，不能再暂存写入")
+        self._operations.append((method, args, dict(kwargs or {}), result))
+
+    @staticmethod
+    def _resolve(value: Any) -> Any:
+        """把暂存章节换成已写入的章节ID"""
+        if isinstance(value, StagedChapter):
+            if value.id is None:
+                raise ValueError(f"{value} 不属于本会话或尚未写入")
+            return value.id
+        return value
+
+    def commit(self) -> int:
+        """
+        在一个事务中执行全部暂存的写入
+
+        Returns:
+            执行的写入数
+        """
+        if self.committed:
+            raise RuntimeError("会话已提交")
+
+        conn = sqlite3.connect(self.db.db_path, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.cursor()
+            for method, args, kwargs, result in self._operations:
+                args = tuple(self._resolve(arg) for arg in args)
+                value = getattr(self.db, method)(cursor, *args, **kwargs)
+                if result is not None:
+                    result.id = value
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for chapter in self._staged_chapters:
+                chapter.id = None
+            raise
+        finally:
+            conn.close()
+
+        self.committed = True
+        return len(self._operations)
+
+    def rollback(self):
+        """丢弃全部暂存的写入"""
+        self._operations.clear()
+        self._staged_chapters.clear()
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def __enter__(self) -> "PlotSession":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> Any:
+        if exc_type is None and not self.committed:
+            self.commit()
+        elif exc_type is not None:
+            self.rollback()
+        return False
@@ -0,0 +1,114 @@
+"""
+轻量的查询结果记录
+按查询结果的列动态生成带__slots__的记录类（同一组列只生成一次），每行只是一个小对象，
+不再为每行建一个dict。记录同时支持属性访问（row.title）和字典式访问
+（row['title']、row.get、keys/items、dict(row)），可以直接替换原来的dict结果
+"""
+
+import keyword
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Sequence, Tuple, Type
+
+
+class Record(Mapping):
+    """
+    查询结果记录的基类
+
+    字段固定为查询的列：可以修改已有字段的值，不能新增字段（需要时先用dict(row)转换）。
+    和sqlite3.Row一样也可以按列序号取值（row[0]）。
+    """
+
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+    _field_set = frozenset()
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            return getattr(self, key)
+        if type(key) is int:
+            return getattr(self, self._fields[key])
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self._field_set:
+            raise KeyError(f"记录没有字段 {key!r}，需要新增字段时先转换为dict")
+        setattr(self, key, value)
+
+    def __contains__(self, key) -> bool:
+        return key in self._field_set
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._field_set:
+            return getattr(self, key)
+        return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为普通dict"""
+        return {field: getattr(self, field) for field in self._fields}
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{field}={getattr(self, field)!r}" for field in self._fields)
+        return f"Record({values})"
+
+
+# 记录类缓存：列名元组 -> 记录类
+_record_types: Dict[Tuple[str, ...], Type[Record]] = {}
+
+# 不能用作字段名的名字（与记录的方法冲突）
+_RESERVED = frozenset(dir(Record))
+
+
+def _valid_fields(fields: Tuple[str, ...]) -> bool:
+    return len(set(fields)) == len(fields) and all(
+        field.isidentifier() and not keyword.iskeyword(field)
+        and not field.startswith("_") and field not in _RESERVED
+        for field in fields
+    )
+
+
+def record_type(fields: Sequence[str]) -> Type[Record]:
+    """
+    获取（必要时生成）指定列的记录类
+
+    Raises:
+        ValueError: 列名重复或不是合法的Python标识符
+    """
+    fields = tuple(fields)
+    cls = _record_types.get(fields)
+    if cls is None:
+        if not _valid_fields(fields):
+            raise ValueError(f"不能用作记录字段的列名: {fields}")
+        namespace = {"__slots__": fields, "_fields": fields, "_field_set": frozenset(fields)}
+        # 与namedtuple一样生成按位置赋值的__init__，比逐个setattr快
+        body = "\n".join(f"    self.{field} = {field}" for field in fields) or "    pass"
+        exec(f"def __init__(self, {', '.join(fields)}):\n{body}", {}, namespace)
+        cls = _record_types.setdefault(fields, type("Record", (Record,), namespace))
+    return cls
+
+
+def _row_maker(fields: Tuple[str, ...]) -> Callable[..., Any]:
+    """按列生成行构造函数；列名不能作为字段时退回dict"""
+    if _valid_fields(fields):
+        return record_type(fields)
+    return lambda *values: dict(zip(fields, values))
+
+
+# 最近一次查询的(cursor.description, 行构造函数)；同一次查询的description是同一个对象
+_last_description: Tuple[Any, Any] = (None, None)
+
+
+def record_factory(cursor, row: tuple) -> Any:
+    """sqlite3的row_factory：把每行转换为Record（conn.row_factory = record_factory）"""
+    global _last_description
+    description, make = _last_description
+    if description is not cursor.description:
+        description = cursor.description
+        make = _row_maker(tuple(column[0] for column in description))
+        _last_description = (description, make)
+    return make(*row)
@@ -0,0 +1,258 @@
+"""
+角色关系图
+将 character_relationships 表加载为内存邻接表，提供O(1)的两两关系查询和图遍历
+"""
+
+import heapq
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def edge_strength(value: Any) -> int:
+    """关系强度的数值（图遍历和排序用）：部分旧数据的strength列是文本，按默认强度1处理"""
+    if isinstance(value, (int, float)):
+        return value
+    return 1
+
+
+class RelationshipGraph:
+    """
+    角色关系图（邻接表）
+
+    关系在数据库中是有向的（角色1 → 角色2），两两查询保持这一语义；
+    邻域、路径和中间人查询把关系视为无向边，双向都存在时取较强的一侧。
+    """
+
+    def __init__(self, db):
+        """
+        初始化关系图
+
+        Args:
+            db: CharacterDatabase 实例
+        """
+        self.db = db
+        self._lock = threading.RLock()
+        # 出边：{角色: {目标角色: {type, description, strength}}}
+        self._outgoing: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # 无向邻接：{角色: {相邻角色: 强度}}
+        self._adjacent: Dict[str, Dict[str, int]] = {}
+        # 加载时的数据变更计数（见CharacterDatabase.change_count），任何连接写入后都会变化
+        self._version = None
+
+    # ==================== 加载与增量更新 ====================
+
+    def load(self):
+        """从数据库完整加载关系"""
+        with self._lock, self.db.connections.connection() as conn:
+            # 先记录版本再读取，读取期间的外部写入会在下次查询时触发重新加载
+            version = self.db.change_count()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c1.name, c2.name, cr.relationship_type, cr.description, cr.strength
+                FROM character_relationships cr
+                JOIN characters c1 ON cr.character1_id = c1.id
+                JOIN characters c2 ON cr.character2_id = c2.id
+            ''')
+
+            self._outgoing = {}
+            self._adjacent = {}
+            for name1, name2, relationship_type, description, strength in cursor.fetchall():
+                self._set_edge(name1, name2, relationship_type, description, strength)
+            self._version = version
+
+    def _ensure_loaded(self):
+        """首次使用或其他连接修改过数据库时重新加载（变更计数的检查见CharacterDatabase.change_count）"""
+        if self._version != self.db.change_count():
+            self.load()
+
+    def _set_edge(self, name1: str, name2: str, relationship_type: str,
+                  description: str, strength: int):
+        """写入一条有向关系并更新无向邻接（调用方持有锁）"""
+        self._outgoing.setdefault(name1, {})[name2] = {
+            "type": relationship_type,
+            "description": description,
+            "strength": strength
+        }
+        self._refresh_adjacent(name1, name2)
+
+    def _refresh_adjacent(self, name1: str, name2: str):
+        """根据两个方向的关系重新计算无向边强度（至少一个方向存在，调用方持有锁）"""
+        strengths = [
+            edge_strength(self._outgoing[a][b]["strength"])
+            for a, b in ((name1, name2), (name2, name1))
+            if b in self._outgoing.get(a, {})
+        ]
+        strength = max(strengths)
+        self._adjacent.setdefault(name1, {})[name2] = strength
+        self._adjacent.setdefault(name2, {})[name1] = strength
+
+    def set_relationship(self, name1: str, name2: str, relationship_type: str,
+                         description: str = "", strength: int = 1):
+        """增量更新：新增或替换一条关系（数据库写入后调用）"""
+        with self._lock:
+            if self._version is None:
+                return
+            self._set_edge(name1, name2, relationship_type, description, strength)
+
+    def remove_character(self, name: str):
+        """增量更新：移除角色及其所有关系（数据库删除后调用）"""
+        with self._lock:
+            if self._version is None:
+                return
+            for other in list(self._adjacent.get(name, {})):
+                self._outgoing.get(other, {}).pop(name, None)
+                self._adjacent.get(other, {}).pop(name, None)
+            self._outgoing.pop(name, None)
+            self._adjacent.pop(name, None)
+
+    def invalidate(self):
+        """标记为失效，下次查询时重新加载（批量写入后调用）"""
+        with self._lock:
+            self._version = None
+
+    def advance_version(self, before: int, after: int):
+        """
+        本进程的一次写入已增量更新到内存中（写事务提交后调用）
+
+        加载时的变更计数正好是写入前的before时，直接记为写入后的after；
+        否则期间还有其他写入，保持原版本，下次查询时重新加载。
+        """
+        with self._lock:
+            if self._version == before:
+                self._version = after
+
+    # ==================== 两两关系查询 ====================
+
+    def get_relationship(self, name1: str, name2: str) -> Optional[Dict[str, Any]]:
+        """
+        获取角色1对角色2的关系
+
+        Returns:
+            关系字典 {type, description, strength}，不存在时返回None
+        """
+        with self._lock:
+            self._ensure_loaded()
+            relationship = self._outgoing.get(name1, {}).get(name2)
+            return dict(relationship) if relationship else None
+
+    def get_relationships(self, name: str) -> Dict[str, Dict[str, Any]]:
+        """获取角色的所有出向关系 {角色名: {type, description, strength}}"""
+        with self._lock:
+            self._ensure_loaded()
+            return {other: dict(data) for other, data in self._outgoing.get(name, {}).items()}
+
+    def get_neighbors(self, name: str) -> Dict[str, int]:
+        """获取与角色直接相连的所有角色（不区分方向）{角色名: 强度}"""
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self._adjacent.get(name, {}))
+
+    # ==================== 图遍历 ====================
+
+    def get_neighborhood(self, name: str, hops: int = 1, min_strength: int = 0) -> Dict[str, int]:
+        """
+        获取k跳以内的关系网络
+
+        Args:
+            name: 起点角色
+            hops: 最大跳数
+            min_strength: 只沿强度不低于该值的关系扩展
+
+        Returns:
+            {角色名: 跳数}，不含起点，按跳数由近到远排列
+        """
+        with self._lock:
+            self._ensure_loaded()
+            distances = self._bfs(name, hops, min_strength)
+        distances.pop(name, None)
+        return distances
+
+    def _bfs(self, name: str, hops: int, min_strength: int = 0) -> Dict[str, int]:
+        """广度优先搜索，返回 {角色名: 跳数}（含起点，调用方持有锁）"""
+        distances = {name: 0}
+        queue = deque([name])
+        while queue:
+            current = queue.popleft()
+            if distances[current] >= hops:
+                continue
+            for other, strength in self._adjacent.get(current, {}).items():
+                if other not in distances and strength >= min_strength:
+                    distances[other] = distances[current] + 1
+                    queue.append(other)
+        return distances
+
+    def find_path(self, name1: str, name2: str) -> Optional[Tuple[List[str], float]]:
+        """
+        查找两个角色之间的最短加权路径（Dijkstra）
+
+        每条关系的代价为 1/强度，关系越强距离越近。
+
+        Returns:
+            (路径上的角色列表, 总代价)，不连通时返回None
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if name1 not in self._adjacent or name2 not in self._adjacent:
+                return ([name1], 0.0) if name1 == name2 else None
+
+            costs = {name1: 0.0}
+            previous: Dict[str, str] = {}
+            heap = [(0.0, name1)]
+            while heap:
+                cost, current = heapq.heappop(heap)
+                if current == name2:
+                    break
+                if cost > costs[current]:
+                    continue
+                for other, strength in self._adjacent[current].items():
+                    if strength <= 0:
+                        continue
+                    new_cost = cost + 1.0 / strength
+                    if new_cost < costs.get(other, float("inf")):
+                        costs[other] = new_cost
+                        previous[other] = current
+                        heapq.heappush(heap, (new_cost, other))
+
+        if name2 not in costs:
+            return None
+        path = [name2]
+        while path[-1] != name1:
+            path.append(previous[path[-1]])
+        path.reverse()
+        return path, costs[name2]
+
+    def find_connectors(self, name1: str, name2: str, max_hops: int = 2) -> List[Dict[str, Any]]:
+        """
+        查找连接两个角色的中间人
+
+        中间人指位于两者之间、经过它的路径总跳数不超过max_hops的角色。
+        max_hops=2时即两者的共同关系人。
+
+        Returns:
+            [{name, hops, strength}]，hops为经过该角色的总跳数，
+            strength为与两端直接关系强度之和（非直接相连时为0），
+            按跳数升序、强度降序排列
+        """
+        with self._lock:
+            self._ensure_loaded()
+            from_first = self._bfs(name1, max_hops - 1)
+            from_second = self._bfs(name2, max_hops - 1)
+            adjacent_first = self._adjacent.get(name1, {})
+            adjacent_second = self._adjacent.get(name2, {})
+
+            connectors = []
+            for name, hops1 in from_first.items():
+                if name in (name1, name2) or name not in from_second:
+                    continue
+                hops = hops1 + from_second[name]
+                if hops > max_hops:
+                    continue
+                connectors.append({
+                    "name": name,
+                    "hops": hops,
+                    "strength": adjacent_first.get(name, 0) + adjacent_second.get(name, 0)
+                })
+
+        connectors.sort(key=lambda c: (c["hops"], -c["strength"], c["name"]))
+        return connectors
@@ -0,0 +1,109 @@
+"""
+数据库结构版本管理
+三个SQLite数据库共用的有序迁移执行器，以及EXPLAIN QUERY PLAN索引检查
+"""
+
+import sqlite3
+from typing import Callable, List, Sequence, Tuple, Union
+
+# 迁移步骤：单条SQL、SQL列表，或接收游标的函数
+MigrationStep = Union[str, Sequence[str], Callable[[sqlite3.Cursor], None]]
+# 迁移：(版本号, 描述, 步骤)
+Migration = Tuple[int, str, MigrationStep]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """获取数据库当前的结构版本（未执行过迁移时为0）"""
+    cursor = conn.execute('''
+        SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'
+    ''')
+    if cursor.fetchone() is None:
+        return 0
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def run_migrations(conn: sqlite3.Connection, migrations: Sequence[Migration]) -> List[int]:
+    """
+    按版本号顺序执行尚未执行的迁移
+
+    每个迁移在独立的写事务（BEGIN IMMEDIATE）中执行并记录到schema_version表，
+    事务开始后重新检查版本，多个进程同时启动时每个迁移只会执行一次。
+    迁移失败时回滚该迁移并抛出异常，已完成的迁移保留。
+
+    Args:
+        conn: 数据库连接（不能处于未提交的事务中）
+        migrations: 迁移列表，版本号必须从1开始连续递增
+
+    Returns:
+        本次执行的迁移版本号列表
+    """
+    versions = [version for version, _, _ in migrations]
+    if versions != list(range(1, len(migrations) + 1)):
+        raise ValueError(f"迁移版本号必须从1开始连续递增: {versions}")
+    if conn.in_transaction:
+        raise RuntimeError("执行迁移前必须先提交当前事务")
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+    applied = []
+    for version, description, step in migrations:
+        if version <= get_schema_version(conn):
+            continue
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 其他连接可能已在等待写锁期间完成了该迁移
+            if version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+
+            cursor = conn.cursor()
+            if callable(step):
+                step(cursor)
+            else:
+                for sql in ([step] if isinstance(step, str) else step):
+                    cursor.execute(sql)
+            cursor.execute('''
+                INSERT INTO schema_version (version, description) VALUES (?, ?)
+            ''', (version, description))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        applied.append(version)
+        print(f"🔧 数据库迁移 v{version}: {description}")
+
+    return applied
+
+
+def explain_query_plan(conn: sqlite3.Connection, sql: str, params: Sequence = ()) -> List[str]:
+    """获取查询计划的描述行"""
+    return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', tuple(params))]
+
+
+def check_query_plans(conn: sqlite3.Connection,
+                      checks: Sequence[Tuple[str, str, Sequence, str]]) -> List[Tuple[str, List[str]]]:
+    """
+    检查查询计划是否使用了预期的索引
+
+    Args:
+        conn: 数据库连接
+        checks: [(检查名称, SQL, 参数, 预期索引名)]
+
+    Returns:
+        未使用预期索引的检查 [(检查名称, 查询计划)]，全部通过时为空列表
+    """
+    failures = []
+    for name, sql, params, index in checks:
+        plan = explain_query_plan(conn, sql, params)
+        if not any(f"INDEX {index}" in line for line in plan):
+            failures.append((name, plan))
+    return failures
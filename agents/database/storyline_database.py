@@ -6,8 +6,16 @@
 
 import sqlite3
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from datetime import datetime
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
+from schema_migrations import run_migrations
+from aggregate_stats import create_stats_table, create_counter, rebuild_stats, read_stats
+from records import Record, record_factory
+from db_connection import writes
 
 class StorylineDatabase:
     """主线/支线数据库"""
@@ -21,86 +29,140 @@ class StorylineDatabase:
         self._create_tables()
         self._init_mainline()
     
+    def _connect(self) -> sqlite3.Connection:
+        """打开连接，查询结果为轻量记录（Record）而不是元组"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = record_factory
+        return conn
+    
     def _create_tables(self):
-        """创建数据库表"""
+        """创建数据库表（执行尚未执行的迁移）"""
         with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # 主线表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS mainline (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    current_phase TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # 支线表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS storylines (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    storyline_type TEXT NOT NULL,  -- arc/subplot
-                    status TEXT NOT NULL,  -- planned/active/completed
-                    start_chapter INTEGER,
-                    end_chapter INTEGER,
-                    actual_end_chapter INTEGER,  -- 实际结束章节
-                    main_theme TEXT,
-                    tone TEXT,
-                    setting TEXT,
-                    arc_type TEXT,  -- daily/adventure/crisis/transition
-                    summary TEXT,  -- 支线完成后的总结
-                    next_storyline_hint TEXT,  -- 下一个支线的提示
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # 支线关键事件表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS storyline_events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    storyline_id INTEGER NOT NULL,
-                    event_description TEXT NOT NULL,
-                    event_order INTEGER NOT NULL,
-                    chapter_number INTEGER,  -- 实际发生的章节（如果已发生）
-                    status TEXT DEFAULT 'pending',  -- pending/completed
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (storyline_id) REFERENCES storylines(id)
-                )
-            ''')
-            
-            # 支线角色关系表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS storyline_characters (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    storyline_id INTEGER NOT NULL,
-                    character_name TEXT NOT NULL,
-                    role TEXT,  -- protagonist/supporting/antagonist
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (storyline_id) REFERENCES storylines(id)
-                )
-            ''')
-            
-            # 主线阶段表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS mainline_phases (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    mainline_id INTEGER NOT NULL,
-                    phase_name TEXT NOT NULL,
-                    phase_description TEXT,
-                    start_chapter INTEGER,
-                    end_chapter INTEGER,
-                    status TEXT DEFAULT 'planned',  -- planned/active/completed
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (mainline_id) REFERENCES mainline(id)
-                )
-            ''')
-            
-            conn.commit()
+            run_migrations(conn, [
+                (1, "主线/支线基础表", self._create_base_tables),
+                (2, "支线、事件和角色索引", self._create_indexes),
+                (3, "触发器维护的统计表", self._create_stats),
+                (4, "支线分页排序索引", self._create_page_index),
+            ])
+    
+    def _create_base_tables(self, cursor):
+        """创建主线/支线基础表"""
+        # 主线表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS mainline (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                description TEXT,
+                current_phase TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 支线表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS storylines (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                storyline_type TEXT NOT NULL,  -- arc/subplot
+                status TEXT NOT NULL,  -- planned/active/completed
+                start_chapter INTEGER,
+                end_chapter INTEGER,
+                actual_end_chapter INTEGER,  -- 实际结束章节
+                main_theme TEXT,
+                tone TEXT,
+                setting TEXT,
+                arc_type TEXT,  -- daily/adventure/crisis/transition
+                summary TEXT,  -- 支线完成后的总结
+                next_storyline_hint TEXT,  -- 下一个支线的提示
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 支线关键事件表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS storyline_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                storyline_id INTEGER NOT NULL,
+                event_description TEXT NOT NULL,
+                event_order INTEGER NOT NULL,
+                chapter_number INTEGER,  -- 实际发生的章节（如果已发生）
+                status TEXT DEFAULT 'pending',  -- pending/completed
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (storyline_id) REFERENCES storylines(id)
+            )
+        ''')
+        
+        # 支线角色关系表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS storyline_characters (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                storyline_id INTEGER NOT NULL,
+                character_name TEXT NOT NULL,
+                role TEXT,  -- protagonist/supporting/antagonist
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (storyline_id) REFERENCES storylines(id)
+            )
+        ''')
+        
+        # 主线阶段表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS mainline_phases (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                mainline_id INTEGER NOT NULL,
+                phase_name TEXT NOT NULL,
+                phase_description TEXT,
+                start_chapter INTEGER,
+                end_chapter INTEGER,
+                status TEXT DEFAULT 'planned',  -- planned/active/completed
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (mainline_id) REFERENCES mainline(id)
+            )
+        ''')
+    
+    def _create_indexes(self, cursor):
+        """为常用查询创建索引"""
+        # 按状态列出支线并按起始章节排序
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_storylines_status
+            ON storylines (status, start_chapter)
+        ''')
+        
+        # 按支线列出事件
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_storyline_events_storyline
+            ON storyline_events (storyline_id, event_order)
+        ''')
+        
+        # 按支线列出角色
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_storyline_characters_storyline
+            ON storyline_characters (storyline_id)
+        ''')
+    
+    # 统计项：(统计名, 来源表, 键表达式, 数值表达式, 更新时需要重新计算的列)
+    # 支线和事件按状态分别计数，键为“storylines:状态”“events:状态”
+    STATS_COUNTERS = [
+        ("storylines_by_status", "storylines", "'storylines:' || COALESCE({row}.status, '')",
+         "1", ["status"]),
+        ("events_by_status", "storyline_events", "'events:' || COALESCE({row}.status, '')",
+         "1", ["status"]),
+        ("mainline_phase_count", "mainline_phases", "'mainline_phases'", "1", None),
+    ]
+    
+    def _create_stats(self, cursor):
+        """创建storyline_stats统计表及维护它的触发器，并按现有数据回填"""
+        create_stats_table(cursor, "storyline_stats")
+        for counter in self.STATS_COUNTERS:
+            create_counter(cursor, "storyline_stats", counter)
+        rebuild_stats(cursor, "storyline_stats", self.STATS_COUNTERS)
+    
+    @writes
+    def rebuild_stats(self):
+        """按现有数据重新计算统计表"""
+        with sqlite3.connect(self.db_path) as conn:
+            rebuild_stats(conn.cursor(), "storyline_stats", self.STATS_COUNTERS)
     
     def _init_mainline(self):
         """初始化主线（如果不存在）"""
@@ -120,18 +182,14 @@ class StorylineDatabase:
     
     # ==================== 主线管理 ====================
     
-    def get_mainline(self) -> Optional[Dict[str, Any]]:
+    def get_mainline(self) -> Optional[Record]:
         """获取主线信息"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM mainline LIMIT 1')
-            result = cursor.fetchone()
-            
-            if result:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, result))
-            return None
+            return cursor.fetchone()
     
+    @writes
     def update_mainline_phase(self, phase: str):
         """更新主线当前阶段"""
         with sqlite3.connect(self.db_path) as conn:
@@ -142,6 +200,7 @@ class StorylineDatabase:
             ''', (phase, datetime.now().isoformat()))
             conn.commit()
     
+    @writes
     def add_mainline_phase(
         self, 
         phase_name: str, 
@@ -160,9 +219,9 @@ class StorylineDatabase:
             conn.commit()
             return cursor.lastrowid
     
-    def get_mainline_phases(self, status: str = None) -> List[Dict[str, Any]]:
+    def get_mainline_phases(self, status: str = None) -> List[Record]:
         """获取主线阶段列表"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             if status:
@@ -177,12 +236,11 @@ class StorylineDatabase:
                     ORDER BY start_chapter
                 ''')
             
-            results = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, result)) for result in results]
+            return cursor.fetchall()
     
     # ==================== 支线管理 ====================
     
+    @writes
     def create_storyline(
         self,
         name: str,
@@ -209,21 +267,16 @@ class StorylineDatabase:
             conn.commit()
             return cursor.lastrowid
     
-    def get_storyline(self, storyline_id: int) -> Optional[Dict[str, Any]]:
+    def get_storyline(self, storyline_id: int) -> Optional[Record]:
         """获取支线信息"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM storylines WHERE id = ?', (storyline_id,))
-            result = cursor.fetchone()
-            
-            if result:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, result))
-            return None
+            return cursor.fetchone()
     
-    def get_storylines_by_status(self, status: str) -> List[Dict[str, Any]]:
+    def get_storylines_by_status(self, status: str) -> List[Record]:
         """根据状态获取支线列表"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT * FROM storylines 
@@ -231,13 +284,11 @@ class StorylineDatabase:
                 ORDER BY start_chapter
             ''', (status,))
             
-            results = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, result)) for result in results]
+            return cursor.fetchall()
     
-    def get_active_storyline(self, chapter_number: int) -> Optional[Dict[str, Any]]:
+    def get_active_storyline(self, chapter_number: int) -> Optional[Record]:
         """获取当前章节的活跃支线"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT * FROM storylines 
@@ -248,12 +299,9 @@ class StorylineDatabase:
                 LIMIT 1
             ''', (chapter_number, chapter_number))
             
-            result = cursor.fetchone()
-            if result:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, result))
-            return None
+            return cursor.fetchone()
     
+    @writes
     def activate_storyline(self, storyline_id: int):
         """激活支线（从planned变为active）"""
         with sqlite3.connect(self.db_path) as conn:
@@ -265,6 +313,7 @@ class StorylineDatabase:
             ''', (datetime.now().isoformat(), storyline_id))
             conn.commit()
     
+    @writes
     def complete_storyline(
         self, 
         storyline_id: int,
@@ -294,6 +343,7 @@ class StorylineDatabase:
     
     # ==================== 支线事件管理 ====================
     
+    @writes
     def add_storyline_event(
         self,
         storyline_id: int,
@@ -315,9 +365,9 @@ class StorylineDatabase:
         self, 
         storyline_id: int,
         status: str = None
-    ) -> List[Dict[str, Any]]:
+    ) -> List[Record]:
         """获取支线的关键事件列表"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             if status:
@@ -333,10 +383,9 @@ class StorylineDatabase:
                     ORDER BY event_order
                 ''', (storyline_id,))
             
-            results = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, result)) for result in results]
+            return cursor.fetchall()
     
+    @writes
     def complete_event(self, event_id: int, chapter_number: int):
         """标记事件为已完成"""
         with sqlite3.connect(self.db_path) as conn:
@@ -350,6 +399,7 @@ class StorylineDatabase:
     
     # ==================== 支线角色管理 ====================
     
+    @writes
     def add_storyline_character(
         self,
         storyline_id: int,
@@ -367,63 +417,99 @@ class StorylineDatabase:
             conn.commit()
             return cursor.lastrowid
     
-    def get_storyline_characters(self, storyline_id: int) -> List[Dict[str, Any]]:
+    def get_storyline_characters(self, storyline_id: int) -> List[Record]:
         """获取支线的角色列表"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT * FROM storyline_characters 
                 WHERE storyline_id = ?
             ''', (storyline_id,))
             
-            results = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, result)) for result in results]
+            return cursor.fetchall()
     
     # ==================== 统计与查询 ====================
     
     def get_database_stats(self) -> Dict[str, int]:
-        """获取数据库统计信息"""
+        """获取数据库统计信息（读取触发器维护的统计表）"""
         with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            stats = {}
-            
+            stats = read_stats(conn.cursor(), "storyline_stats")
+        
+        return {
             # 支线统计
-            cursor.execute("SELECT COUNT(*) FROM storylines WHERE status = 'planned'")
-            stats['planned_storylines'] = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM storylines WHERE status = 'active'")
-            stats['active_storylines'] = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM storylines WHERE status = 'completed'")
-            stats['completed_storylines'] = cursor.fetchone()[0]
-            
+            'planned_storylines': stats.get('storylines:planned', 0),
+            'active_storylines': stats.get('storylines:active', 0),
+            'completed_storylines': stats.get('storylines:completed', 0),
             # 事件统计
-            cursor.execute("SELECT COUNT(*) FROM storyline_events WHERE status = 'pending'")
-            stats['pending_events'] = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM storyline_events WHERE status = 'completed'")
-            stats['completed_events'] = cursor.fetchone()[0]
-            
+            'pending_events': stats.get('events:pending', 0),
+            'completed_events': stats.get('events:completed', 0),
             # 主线阶段统计
-            cursor.execute("SELECT COUNT(*) FROM mainline_phases")
-            stats['mainline_phases'] = cursor.fetchone()[0]
-            
-            return stats
+            'mainline_phases': stats.get('mainline_phases', 0),
+        }
+    
+    # 分页排序键：未设置起始章节的支线排在最前，行值比较不能直接用NULL
+    PAGE_KEY = "COALESCE(start_chapter, -1)"
+    
+    def _create_page_index(self, cursor):
+        """按分页排序键(起始章节, ID)建表达式索引，翻页时不必每页重新排序"""
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_storylines_page
+            ON storylines ({self.PAGE_KEY}, id)
+        ''')
+    
+    @staticmethod
+    def storyline_page_key(storyline) -> Tuple[int, int]:
+        """支线在分页顺序中的位置 (起始章节, ID)，作为下一页的after参数"""
+        start_chapter = storyline['start_chapter']
+        return (-1 if start_chapter is None else start_chapter, storyline['id'])
     
-    def get_all_storylines(self) -> List[Dict[str, Any]]:
+    def get_all_storylines(self) -> List[Record]:
         """获取所有支线"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT * FROM storylines 
-                ORDER BY start_chapter
+                ORDER BY {self.PAGE_KEY}, id
             ''')
             
-            results = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, result)) for result in results]
+            return cursor.fetchall()
+    
+    def get_storylines_page(self, after: Optional[Tuple[int, int]] = None,
+                            limit: int = 500) -> List[Record]:
+        """
+        按(起始章节, ID)顺序分页获取支线（键集分页，未设置起始章节的排在最前）
+        
+        Args:
+            after: 上一页最后一行的storyline_page_key，None表示第一页
+            limit: 每页行数
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            if after is None:
+                cursor.execute(f'''
+                    SELECT * FROM storylines
+                    ORDER BY {self.PAGE_KEY}, id
+                    LIMIT ?
+                ''', (limit,))
+            else:
+                # 单独的起始章节下界让表达式索引按范围定位，行值比较本身只能顺序扫描
+                cursor.execute(f'''
+                    SELECT * FROM storylines
+                    WHERE {self.PAGE_KEY} >= ? AND ({self.PAGE_KEY}, id) > (?, ?)
+                    ORDER BY {self.PAGE_KEY}, id
+                    LIMIT ?
+                ''', (after[0], *after, limit))
+            return cursor.fetchall()
+    
+    def iter_storylines(self, batch_size: int = 500) -> Iterator[Record]:
+        """逐个产出全部支线（顺序同get_all_storylines，分页读取）"""
+        after = None
+        while True:
+            page = self.get_storylines_page(after, batch_size)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = self.storyline_page_key(page[-1])
 
 # ==================== API层 ====================
 
@@ -451,9 +537,8 @@ class StorylineAPI:
             events = self.db.get_storyline_events(active_storyline['id'])
             characters = self.db.get_storyline_characters(active_storyline['id'])
             
-            active_storyline['events'] = events
-            active_storyline['characters'] = characters
-            context['active_storyline'] = active_storyline
+            context['active_storyline'] = dict(active_storyline, events=events,
+                                               characters=characters)
         
         # 获取已完成的支线（带总结）
         completed = self.db.get_storylines_by_status('completed')
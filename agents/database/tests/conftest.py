@@ -0,0 +1,20 @@
+"""
+数据库模块测试的公共配置
+各模块按同级模块导入，测试时把数据库目录加入sys.path
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_connection import close_all_connections
+
+
+@pytest.fixture(autouse=True)
+def close_connections():
+    """每个测试结束后关闭连接管理器持有的连接"""
+    yield
+    close_all_connections()
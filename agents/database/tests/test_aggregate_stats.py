@@ -0,0 +1,98 @@
+"""触发器增量维护的统计值与按来源表重新计算的结果一致"""
+
+import sqlite3
+
+from aggregate_stats import read_stats
+from plot_database import PlotDatabase
+from storyline_database import StorylineDatabase
+
+
+def _stats(db_path, stats_table):
+    """读取统计表，忽略增量维护留下的0值项（重新计算时不会生成）"""
+    with sqlite3.connect(db_path) as conn:
+        return {name: value for name, value in read_stats(conn.cursor(), stats_table).items() if value}
+
+
+def _assert_matches_rebuild(db, stats_table):
+    incremental = _stats(db.db_path, stats_table)
+    db.rebuild_stats()
+    assert incremental == _stats(db.db_path, stats_table)
+    return incremental
+
+
+def test_plot_stats_match_rebuild_after_mixed_workload(tmp_path):
+    db = PlotDatabase(str(tmp_path / "plot.db"))
+    chapter_ids = [db.add_chapter(number, f"第{number}章", word_count=number * 100)
+                   for number in range(1, 8)]
+    db.add_chapter(3, "第3章（一）", word_count=50, parent_chapter_id=chapter_ids[2])
+    db.update_chapter(chapter_ids[1], word_count=999)
+    db.add_plot_line("主线")
+    db.add_character_arc("路明非", chapter_ids[0], development="觉醒")
+
+    # 重复保存同一(当前章节, 合并因子)的摘要只更新原行
+    for content in ("初稿", "改稿", "定稿"):
+        db.save_merge_summary(6, 2, content)
+    db.save_merge_summary(6, 3, "另一个因子")
+    db.invalidate_merge_summaries(7)
+
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute('DELETE FROM chapters WHERE id = ?', (chapter_ids[-1],))
+        conn.execute('DELETE FROM plot_lines')
+
+    stats = _assert_matches_rebuild(db, "plot_stats")
+    assert stats['merge_summary_count'] == 2
+    assert db.get_database_stats()['merge_summary_count'] == 2
+
+
+def test_chapter_stats_count_only_canonical_chapters(tmp_path):
+    db = PlotDatabase(str(tmp_path / "plot.db"))
+    chapter_ids = [db.add_chapter(number, f"第{number}章", word_count=1000)
+                   for number in range(1, 6)]
+    db.add_chapter(2, "第2章（一）", word_count=300, parent_chapter_id=chapter_ids[1])
+    draft_id = db.add_chapter(3, "第3章（草稿）", word_count=2000, branch="draft")
+    rewrite_id = db.add_chapter(4, "第4章（重写）", word_count=1500)
+    assert db.get_chapter_totals() == (5, 5000)
+
+    # 切换主版本、修改主版本字数、删除主版本后由剩余版本补位
+    db.set_canonical_chapter(rewrite_id)
+    db.update_chapter(chapter_ids[0], word_count=800)
+    db.update_chapter(draft_id, word_count=2500)
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute('DELETE FROM chapters WHERE id = ?', (rewrite_id,))
+        conn.execute('DELETE FROM chapters WHERE id = ?', (chapter_ids[4],))
+        conn.execute('UPDATE chapters SET chapter_number = 6, word_count = 700 WHERE id = ?',
+                     (chapter_ids[2],))
+
+    assert db.get_chapter_totals() == (4, 3500)
+    assert db.get_chapter_totals(4) == (3, 2800)
+    stats = _assert_matches_rebuild(db, "plot_stats")
+    assert (stats['chapter_count'], stats['total_word_count']) == (4, 3500)
+
+
+def test_save_merge_summary_keeps_id(tmp_path):
+    db = PlotDatabase(str(tmp_path / "plot.db"))
+
+    first = db.save_merge_summary(6, 2, "初稿")
+    second = db.save_merge_summary(6, 2, "定稿")
+
+    assert first == second
+    assert db.get_merge_summary(6, 2)['summary_content'] == "定稿"
+
+
+def test_storyline_stats_match_rebuild_after_mixed_workload(tmp_path):
+    db = StorylineDatabase(str(tmp_path / "storylines.db"))
+    storyline_ids = [db.create_storyline(f"支线{index}", "side", index, index + 5,
+                                         "主题", "基调", "场景")
+                     for index in range(1, 5)]
+    db.activate_storyline(storyline_ids[0])
+    db.complete_storyline(storyline_ids[1], 8, "完结")
+    event_ids = [db.add_storyline_event(storyline_ids[0], f"事件{order}", order)
+                 for order in range(1, 4)]
+    db.complete_event(event_ids[0], 2)
+    db.add_mainline_phase("第二阶段", "目标", 10, 30)
+
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute('DELETE FROM storyline_events WHERE id = ?', (event_ids[-1],))
+        conn.execute('DELETE FROM storylines WHERE id = ?', (storyline_ids[-1],))
+
+    _assert_matches_rebuild(db, "storyline_stats")
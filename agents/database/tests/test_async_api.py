@@ -0,0 +1,125 @@
+"""异步API：读方法进入读线程池，@writes方法按提交顺序在单写线程中执行"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from async_api import AsyncPlotAPI, AsyncStorylineAPI, DatabaseExecutor
+from db_connection import is_write_method, writes
+from plot_api import PlotAPI
+from storyline_database import StorylineAPI
+
+
+class FakeAPI:
+    """记录每次调用所在线程的同步API"""
+
+    version = 3
+
+    def __init__(self):
+        self.calls = []
+
+    def read(self, value):
+        self.calls.append(("read", value, threading.current_thread().name))
+        return value
+
+    @writes
+    def write(self, value, delay=0.0):
+        time.sleep(delay)
+        self.calls.append(("write", value, threading.current_thread().name))
+        return value
+
+
+@pytest.fixture
+def executor():
+    executor = DatabaseExecutor(max_readers=2)
+    yield executor
+    executor.shutdown()
+
+
+def test_reads_and_writes_use_separate_pools(executor):
+    api = FakeAPI()
+    async_api = AsyncPlotAPI(api, executor)
+
+    async def run():
+        return await asyncio.gather(async_api.read(1), async_api.write(2))
+
+    assert asyncio.run(run()) == [1, 2]
+    threads = {kind: thread for kind, _, thread in api.calls}
+    assert threads["read"].startswith("db-reader")
+    assert threads["write"].startswith("db-writer")
+    # 非方法属性原样返回
+    assert async_api.version == 3
+
+
+def test_writes_run_one_at_a_time_in_submission_order(executor):
+    api = FakeAPI()
+    async_api = AsyncPlotAPI(api, executor)
+
+    async def run():
+        # 先提交的写操作更慢，也不会被后提交的写操作超过
+        await asyncio.gather(*(async_api.write(value, delay=0.02 * (5 - value))
+                               for value in range(5)))
+
+    asyncio.run(run())
+    assert [value for kind, value, _ in api.calls] == list(range(5))
+    assert len({thread for _, _, thread in api.calls}) == 1
+
+
+def test_plot_api_write_methods_are_marked(tmp_path, executor):
+    assert is_write_method(PlotAPI.add_chapter)
+    assert not is_write_method(PlotAPI.get_chapter)
+    async_api = AsyncPlotAPI(PlotAPI(str(tmp_path / "plot.db")), executor)
+
+    async def run():
+        chapter_id = await async_api.add_chapter(1, "第一章")
+        return chapter_id, await async_api.get_chapter(chapter_id)
+
+    chapter_id, chapter = asyncio.run(run())
+    assert chapter['title'] == "第一章"
+    assert chapter['id'] == chapter_id
+
+
+def test_storyline_api_falls_back_to_database_methods(tmp_path, executor):
+    async_api = AsyncStorylineAPI(StorylineAPI(str(tmp_path / "storylines.db")), executor)
+
+    async def run():
+        storyline_id = await async_api.create_storyline(
+            "支线", "side", 1, 5, "主题", "基调", "场景")
+        return await async_api.get_storyline(storyline_id)
+
+    assert asyncio.run(run())['name'] == "支线"
+
+
+def test_private_attributes_are_not_proxied(executor):
+    with pytest.raises(AttributeError):
+        AsyncPlotAPI(FakeAPI(), executor)._private
+
+
+def test_iterators_are_consumed_on_the_reader_thread(tmp_path, executor):
+    api = PlotAPI(str(tmp_path / "plot.db"))
+    for number in range(1, 6):
+        api.add_chapter(number, f"第{number}章")
+    async_api = AsyncPlotAPI(api, executor)
+    query_threads = []
+
+    def record_thread(query):
+        def recording_query(*args, **kwargs):
+            query_threads.append(threading.current_thread().name)
+            return query(*args, **kwargs)
+        return recording_query
+
+    # 两个迭代器逐页读取时调用的查询
+    for name in ("get_chapters_page", "get_chapters_in_range"):
+        setattr(api.db, name, record_thread(getattr(api.db, name)))
+
+    async def run():
+        return (await async_api.iter_chapters(['title'], batch_size=2),
+                await async_api.get_plot_summary(3))
+
+    chapters, summary = asyncio.run(run())
+    assert [chapter['chapter_number'] for chapter in chapters] == [1, 2, 3, 4, 5]
+    assert [chapter['chapter_number'] for chapter in summary['chapters']] == [1, 2, 3]
+    assert len(query_threads) >= 4
+    assert all(thread.startswith("db-reader") for thread in query_threads)
@@ -0,0 +1,79 @@
+"""章节标签索引：拼接字符串拆分为单个取值，随章节写入、修改和删除同步维护"""
+
+import sqlite3
+
+import pytest
+
+from chapter_facets import split_facet_values
+from plot_database import PlotDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = PlotDatabase(str(tmp_path / "plot.db"))
+    db.add_chapter(1, "第一章", character_focus="路明非, 诺诺（红发）", themes="成长、友情")
+    db.add_chapter(2, "第二章", character_focus="路明非，楚子航", themes="成长")
+    db.add_chapter(3, "第三章", character_focus="诺诺", themes="成长；命运", setting="卡塞尔学院")
+    return db
+
+
+def _numbers(chapters):
+    return [chapter['chapter_number'] for chapter in chapters]
+
+
+@pytest.mark.parametrize("text, facet, values", [
+    (None, None, []),
+    ("路明非, 楚子航，诺诺、路明非", None, ["路明非", "楚子航", "诺诺"]),
+    ("入学 → 考试 -> 屠龙", "key_events", ["入学", "考试", "屠龙"]),
+    ("路明非（梦境中，男子）", "character_focus", ["路明非"]),
+    ("路明非（梦境中，男子）", "mood", ["路明非（梦境中 男子）"]),
+])
+def test_split_facet_values(text, facet, values):
+    assert split_facet_values(text, facet) == values
+
+
+def test_chapters_with_facet(db):
+    assert _numbers(db.get_chapters_with_facet("character_focus", "诺诺")) == [1, 3]
+    assert _numbers(db.get_chapters_with_facet("character_focus", "路明非", 2)) == [2]
+    assert db.get_chapter_facets(db.get_chapter_by_number(3)["id"])["setting"] == ["卡塞尔学院"]
+    with pytest.raises(ValueError):
+        db.get_chapters_with_facet("notes", "路明非")
+
+
+def test_facet_frequencies(db):
+    frequencies = db.get_facet_frequencies("themes")
+    assert [(row['value'], row['chapter_count'], row['first_chapter']) for row in frequencies] == \
+        [("成长", 3, 1), ("友情", 1, 1), ("命运", 1, 3)]
+    assert [row['value'] for row in db.get_facet_frequencies("themes", 2, 3, limit=1)] == ["成长"]
+
+
+def test_facets_follow_chapter_changes(db):
+    first = db.get_chapter_by_number(1)['id']
+
+    db.update_chapter(first, character_focus="芬格尔")
+    assert _numbers(db.get_chapters_with_facet("character_focus", "诺诺")) == [3]
+    assert _numbers(db.get_chapters_with_facet("character_focus", "芬格尔")) == [1]
+
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute('UPDATE chapters SET chapter_number = 5 WHERE id = ?', (first,))
+        conn.execute("DELETE FROM chapters WHERE chapter_number = 3")
+    assert _numbers(db.get_chapters_with_facet("character_focus", "芬格尔")) == [5]
+    assert db.get_chapters_with_facet("character_focus", "诺诺") == []
+
+
+def test_rebuild_after_raw_column_update(db):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE chapters SET themes = '命运' WHERE chapter_number = 2")
+    assert _numbers(db.get_chapters_with_facet("themes", "命运")) == [3]
+
+    db.rebuild_chapter_facets()
+    assert _numbers(db.get_chapters_with_facet("themes", "命运")) == [2, 3]
+
+
+def test_only_canonical_versions_are_counted(db):
+    db.add_chapter(2, "第二章（重写）", character_focus="恺撒")
+
+    assert db.get_chapters_with_facet("character_focus", "恺撒") == []
+    db.set_canonical_chapter(db.get_chapter_versions(2)[-1]['id'])
+    assert _numbers(db.get_chapters_with_facet("character_focus", "恺撒")) == [2]
+    assert _numbers(db.get_chapters_with_facet("character_focus", "楚子航")) == []
@@ -0,0 +1,82 @@
+"""章节正文存储：压缩打包与解包、内容寻址去重、开头/结尾片段和段落读取"""
+
+import sqlite3
+
+import pytest
+
+from chapter_text_store import (TEXT_EDGE_CHARS, content_hash, pack_text, paragraph_offsets,
+                                unpack_text)
+from plot_database import PlotDatabase
+
+TEXT = "\n".join(f"  第{index}段，路明非抬头看着天空。" for index in range(400)) + "\n"
+
+
+@pytest.fixture
+def db(tmp_path):
+    return PlotDatabase(str(tmp_path / "plot.db"))
+
+
+def test_pack_unpack_round_trip():
+    blob = pack_text(TEXT)
+
+    assert unpack_text(blob["codec"], blob["content"]) == TEXT
+    assert blob["hash"] == content_hash(TEXT)
+    assert blob["char_length"] == len(TEXT)
+    assert len(blob["content"]) < len(TEXT.encode("utf-8"))
+    assert blob["head"] == TEXT[:TEXT_EDGE_CHARS]
+    assert blob["tail"] == TEXT[-TEXT_EDGE_CHARS:]
+    with pytest.raises(ValueError):
+        unpack_text("lzma", blob["content"])
+
+
+def test_paragraph_offsets_skip_blank_lines_and_indent():
+    text = "  第一段\n\n第二段  \n"
+
+    assert [text[start:end] for start, end in paragraph_offsets(text)] == ["第一段", "第二段"]
+
+
+def test_chapter_text_round_trip(db):
+    chapter_id = db.add_chapter(1, "第一章")
+    assert db.get_chapter_text(chapter_id) is None
+
+    db.save_chapter_text(chapter_id, TEXT)
+
+    assert db.get_chapter_text(chapter_id) == TEXT
+    info = db.get_chapter_text_info(chapter_id)
+    assert (info["hash"], info["char_length"], info["paragraph_count"]) == \
+        (content_hash(TEXT), len(TEXT), 400)
+    assert info["compressed_size"] < len(TEXT.encode("utf-8"))
+
+
+@pytest.mark.parametrize("chars", [0, 1, 100, TEXT_EDGE_CHARS, TEXT_EDGE_CHARS + 1, 10 ** 6])
+def test_head_and_tail_match_full_text(db, chars):
+    chapter_id = db.add_chapter(1, "第一章")
+    db.save_chapter_text(chapter_id, TEXT)
+
+    assert db.get_chapter_text_head(chapter_id, chars) == TEXT[:chars]
+    assert db.get_chapter_text_tail(chapter_id, chars) == (TEXT[-chars:] if chars else "")
+    assert db.get_chapter_text_tail(10 ** 6, chars) is None
+
+
+def test_paragraph_slices(db):
+    chapter_id = db.add_chapter(1, "第一章")
+    db.save_chapter_text(chapter_id, TEXT)
+    paragraphs = [line.strip() for line in TEXT.splitlines()]
+
+    assert db.get_chapter_paragraphs(chapter_id, 0, 3) == paragraphs[:3]
+    assert db.get_chapter_paragraphs(chapter_id, -2) == paragraphs[-2:]
+    assert db.get_chapter_paragraphs(10 ** 6) == []
+
+
+def test_identical_texts_are_stored_once(db):
+    first = db.add_chapter(1, "第一章")
+    second = db.add_chapter(1, "第一章（重写）")
+
+    db.save_chapter_text(first, TEXT)
+    db.save_chapter_text(second, TEXT)
+    db.save_chapter_text(first, TEXT + "后记")
+
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM text_blobs').fetchone()[0] == 2
+    assert db.get_chapter_text(first) == TEXT + "后记"
+    assert db.get_chapter_text(second) == TEXT
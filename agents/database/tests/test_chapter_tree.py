@@ -0,0 +1,93 @@
+"""章节树：递归CTE查询祖先、子孙和兄弟，游标按需逐层展开"""
+
+import sqlite3
+
+import pytest
+
+from chapter_tree import ChapterTreeCursor
+from plot_database import PlotDatabase
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """
+    1 第一章
+      ├ 1 第一节
+      │   └ 1 第一小节
+      └ 1 第二节
+    2 第二章
+    """
+    db = PlotDatabase(str(tmp_path / "plot.db"))
+    ids = {}
+    ids["第一章"] = db.add_chapter(1, "第一章")
+    ids["第二章"] = db.add_chapter(2, "第二章")
+    ids["第二节"] = db.add_chapter(1, "第二节", parent_chapter_id=ids["第一章"])
+    ids["第一节"] = db.add_chapter(1, "第一节", parent_chapter_id=ids["第一章"])
+    ids["第一小节"] = db.add_chapter(1, "第一小节", parent_chapter_id=ids["第一节"])
+    return db, ids
+
+
+def _titles(rows):
+    return [row['title'] for row in rows]
+
+
+def test_descendants_in_preorder(tree):
+    db, ids = tree
+
+    descendants = db.get_chapter_descendants(ids["第一章"])
+
+    # 同一父章节下按(章节编号, ID)排序
+    assert _titles(descendants) == ["第二节", "第一节", "第一小节"]
+    assert [row['relative_depth'] for row in descendants] == [1, 1, 2]
+    assert _titles(db.get_chapter_descendants(ids["第一章"], max_depth=1)) == ["第二节", "第一节"]
+    assert db.get_chapter_descendants(ids["第二章"]) == []
+
+
+def test_ancestors_siblings_and_children(tree):
+    db, ids = tree
+
+    assert _titles(db.get_chapter_ancestors(ids["第一小节"])) == ["第一章", "第一节"]
+    assert db.get_chapter_ancestors(ids["第一章"]) == []
+    assert _titles(db.get_chapter_siblings(ids["第一节"])) == ["第二节"]
+    assert _titles(db.get_chapter_siblings(ids["第二章"], include_self=True)) == ["第一章", "第二章"]
+
+    roots = db.get_child_chapters()
+    assert [(row['title'], row['child_count']) for row in roots] == [("第一章", 2), ("第二章", 0)]
+    assert db.get_chapter(ids["第一小节"])['depth_level'] == 2
+
+
+def test_cycle_does_not_recurse_forever(tree, monkeypatch):
+    db, ids = tree
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute('UPDATE chapters SET parent_chapter_id = ? WHERE id = ?',
+                     (ids["第一小节"], ids["第一章"]))
+    monkeypatch.setattr(db, "MAX_TREE_DEPTH", 10)
+
+    assert len(db.get_chapter_ancestors(ids["第一小节"])) == 10
+    assert max(row['relative_depth'] for row in db.get_chapter_descendants(ids["第一章"])) == 10
+
+
+def test_cursor_expands_only_visited_levels(tree, monkeypatch):
+    db, ids = tree
+    queries = []
+    get_child_chapters = db.get_child_chapters
+    monkeypatch.setattr(db, "get_child_chapters",
+                        lambda *args: queries.append(args) or get_child_chapters(*args))
+    cursor = ChapterTreeCursor(db)
+
+    assert _titles(cursor.walk(max_depth=1)) == ["第一章", "第二章"]
+    assert len(queries) == 1
+
+    assert _titles(cursor.walk()) == ["第一章", "第二节", "第一节", "第一小节", "第二章"]
+    # 第二节和第二章的child_count为0，不再查询
+    assert len(queries) == 3
+
+
+def test_cursor_node_navigation(tree):
+    db, ids = tree
+    node = ChapterTreeCursor(db).node(ids["第一小节"])
+
+    assert node.parent.title == "第一节"
+    assert _titles(node.ancestors()) == ["第一章", "第一节"]
+    assert _titles(node.parent.siblings()) == ["第二节"]
+    assert ChapterTreeCursor(db).node(10 ** 6) is None
@@ -0,0 +1,75 @@
+"""章节草稿分支：每个(分支, 编号)一个主版本，切换、删除和改编号后由触发器重新选出"""
+
+import sqlite3
+
+import pytest
+
+from plot_database import PlotDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = PlotDatabase(str(tmp_path / "plot.db"))
+    for number in range(1, 4):
+        db.add_chapter(number, f"第{number}章")
+    return db
+
+
+def _canonical_title(db, number, branch=PlotDatabase.MAIN_BRANCH):
+    chapter = db.get_chapter_by_number(number, branch)
+    return chapter['title'] if chapter else None
+
+
+def test_first_version_is_canonical_until_switched(db):
+    rewrite = db.add_chapter(2, "第2章（重写）")
+    assert _canonical_title(db, 2) == "第2章"
+
+    assert db.set_canonical_chapter(rewrite)
+    assert _canonical_title(db, 2) == "第2章（重写）"
+    assert not db.set_canonical_chapter(10 ** 6)
+
+    db.add_chapter(2, "第2章（终稿）", make_canonical=True)
+    versions = db.get_chapter_versions(2)
+    assert [(version['title'], version['is_canonical']) for version in versions] == \
+        [("第2章", False), ("第2章（重写）", False), ("第2章（终稿）", True)]
+
+
+def test_branch_falls_back_to_main_for_missing_numbers(db):
+    db.add_chapter(2, "第2章（if线）", branch="if")
+    db.add_chapter(4, "第4章（if线）", branch="if")
+
+    assert [chapter['title'] for chapter in db.get_chapters_in_range(1, None, ['title'], "if")] == \
+        ["第1章", "第2章（if线）", "第3章", "第4章（if线）"]
+    assert [chapter['title'] for chapter in db.get_chapters_in_range(1, None, ['title'])] == \
+        ["第1章", "第2章", "第3章"]
+    assert _canonical_title(db, 4) is None
+    assert [(row['branch'], row['chapter_count'], row['first_chapter'], row['last_chapter'])
+            for row in db.get_branches()] == [("main", 3, 1, 3), ("if", 2, 2, 4)]
+
+
+def test_deleting_or_moving_canonical_elects_another_version(db):
+    draft = db.add_chapter(3, "第3章（草稿）")
+    canonical = db.get_chapter_by_number(3)['id']
+
+    # 其他连接直接修改也由触发器维护主版本
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute('DELETE FROM chapters WHERE id = ?', (canonical,))
+    assert db.get_chapter_by_number(3)['id'] == draft
+
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE chapters SET chapter_number = 5 WHERE id = ?", (draft,))
+    assert _canonical_title(db, 3) is None
+    assert _canonical_title(db, 5) == "第3章（草稿）"
+
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE chapters SET branch = 'draft' WHERE id = ?", (draft,))
+    assert _canonical_title(db, 5) is None
+    assert _canonical_title(db, 5, "draft") == "第3章（草稿）"
+
+
+def test_sub_chapters_do_not_replace_canonical(db):
+    parent = db.get_chapter_by_number(1)['id']
+    db.add_chapter(1, "第1章（一）", parent_chapter_id=parent)
+
+    assert db.get_chapter_by_number(1)['id'] == parent
+    assert db.get_chapter_totals() == (3, 0)
@@ -0,0 +1,87 @@
+"""物化的角色卡片：来源数据变化时重新渲染，读取不写数据库"""
+
+import sqlite3
+
+import pytest
+
+from character_cards import CARD_FORMAT_VERSION, render_character_cards
+from character_database import CharacterDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = CharacterDatabase(str(tmp_path / "characters.db"))
+    lu = db.add_character("路明非", "卡塞尔学院的新生", "从衰仔到屠龙者")
+    db.add_character("楚子航", "狮心会会长", "")
+    db.add_personality_traits(lu, ["吐槽役"])
+    db.add_relationship("路明非", "楚子航", "师兄弟", "", 7)
+    return db
+
+
+def _card_rows(db):
+    with db.connections.connection() as conn:
+        return dict(conn.execute('SELECT character_id, full_card FROM character_cards'))
+
+
+def _rendered(db, name, size=None):
+    (profile,) = db.get_character_profiles([name], include_abilities=True)
+    return render_character_cards(profile)[size]
+
+
+def test_cards_are_stored_on_write(db):
+    rows = _card_rows(db)
+
+    assert set(rows) == {db.get_character_id("路明非"), db.get_character_id("楚子航")}
+    assert db.get_character_card("路明非") == rows[db.get_character_id("路明非")]
+    assert db.get_character_card("路明非", 150) == _rendered(db, "路明非", 150)
+    assert db.get_character_cards(["路明非", "芬格尔"], 500) == \
+        {"路明非": _rendered(db, "路明非", 500)}
+
+
+def test_cards_follow_source_changes(db):
+    before = db.get_character_card("路明非")
+
+    db.add_personality_traits(db.get_character_id("路明非"), ["勇敢"])
+    assert "勇敢" in db.get_character_card("路明非")
+
+    # 关系变化时重新渲染关系发起方的卡片
+    db.add_relationship("路明非", "楚子航", "战友", "", 9)
+    assert "战友" in db.get_character_card("路明非")
+
+    card = db.get_character_card("路明非")
+    assert card != before
+    assert card == _card_rows(db)[db.get_character_id("路明非")] == _rendered(db, "路明非")
+
+
+def test_reads_render_missing_cards_without_writing(db):
+    with sqlite3.connect(db.connections.db_path) as conn:
+        conn.execute("UPDATE characters SET background_story = '外部修改' WHERE name = '路明非'")
+    lu_id = db.get_character_id("路明非")
+    assert lu_id not in _card_rows(db)
+
+    assert "外部修改" in db.get_character_card("路明非")
+    assert lu_id not in _card_rows(db)
+
+    assert db.refresh_character_cards() == 1
+    assert db.refresh_character_cards() == 0
+    assert "外部修改" in _card_rows(db)[lu_id]
+
+
+def test_outdated_card_format_is_rerendered(db):
+    with db.connections.connection() as conn:
+        conn.execute('UPDATE character_cards SET format_version = ?, full_card = ?',
+                     (CARD_FORMAT_VERSION - 1, "旧格式"))
+
+    assert db.get_character_card("路明非") == _rendered(db, "路明非")
+    assert db.refresh_character_cards() == 2
+
+
+def test_readding_character_keeps_id_and_card(db):
+    lu_id = db.get_character_id("路明非")
+
+    assert db.add_character("路明非", "S级混血种", "从衰仔到屠龙者") == lu_id
+
+    rows = _card_rows(db)
+    assert len(rows) == 2
+    assert "S级混血种" in rows[lu_id]
+    assert "吐槽役" in rows[lu_id]
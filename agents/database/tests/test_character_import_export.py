@@ -0,0 +1,78 @@
+"""角色数据的批量导入导出：导出再导入得到相同的数据，导入出错时整体回滚"""
+
+import json
+
+import pytest
+
+from character_database import CharacterDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = CharacterDatabase(str(tmp_path / "characters.db"))
+    lu = db.add_character("路明非", "卡塞尔学院的新生", "从衰仔到屠龙者")
+    chu = db.add_character("楚子航", "狮心会会长", "")
+    db.add_character("诺诺", "学生会成员", "")
+    db.add_personality_traits(lu, ["吐槽役", "自卑"])
+    db.add_speech_patterns(chu, ["言简意赅"])
+    db.add_memorable_quotes(chu, [("我是狮心会的会长", "自我介绍", 8)])
+    db.add_character_alias("路明非", "明非")
+    db.add_relationship("路明非", "楚子航", "师兄弟", "同一任务小组", 7)
+    db.add_relationship("路明非", "诺诺", "暗恋", "", 9)
+    return db
+
+
+def _export(db, path, **kwargs):
+    db.export_to_json(str(path), **kwargs)
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _without_ids(exported):
+    """导入时按导出顺序重新分配角色ID"""
+    return [{key: value for key, value in profile.items() if key != "id"}
+            for profile in json.loads(exported)]
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 200])
+def test_export_import_round_trip(db, tmp_path, batch_size):
+    exported = _export(db, tmp_path / "export.json", batch_size=batch_size)
+    # 流式写出与一次性json.dump的格式一致
+    assert exported == json.dumps(json.loads(exported), ensure_ascii=False, indent=2)
+
+    copy = CharacterDatabase(str(tmp_path / "copy.db"))
+    assert copy.import_from_json(str(tmp_path / "export.json")) == 3
+
+    assert _without_ids(_export(copy, tmp_path / "copy.json")) == _without_ids(exported)
+
+
+def test_empty_export(tmp_path):
+    db = CharacterDatabase(str(tmp_path / "empty.db"))
+
+    assert _export(db, tmp_path / "export.json") == "[]"
+
+
+def test_import_updates_existing_characters_in_place(db):
+    lu_id = db.get_character_id("路明非")
+
+    db.import_characters([{"name": "路明非", "background_story": "S级混血种",
+                           "personality_traits": ["勇敢"]},
+                          {"name": "芬格尔", "relationships": {"路明非": {"type": "室友"}}}])
+
+    assert db.get_character_id("路明非") == lu_id
+    (profile,) = db.get_character_profiles(["路明非"])
+    assert profile["background_story"] == "S级混血种"
+    assert profile["personality_traits"] == ["勇敢"]
+    # 导入数据中没有的关联数据保持原样
+    assert set(profile["relationships"]) == {"楚子航", "诺诺"}
+    (profile,) = db.get_character_profiles(["芬格尔"])
+    assert profile["relationships"]["路明非"]["type"] == "室友"
+
+
+def test_import_rolls_back_on_unknown_relationship_target(db):
+    with pytest.raises(ValueError):
+        db.import_characters([{"name": "芬格尔", "background_story": "永远的大四学长"},
+                              {"name": "恺撒", "relationships": {"不存在的人": "朋友"}}])
+
+    assert db.get_character_id("芬格尔") is None
+    assert db.get_character_id("恺撒") is None
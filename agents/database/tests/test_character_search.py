@@ -0,0 +1,82 @@
+"""全文检索：中文子串匹配、按相关度排序，写入后索引与来源表保持一致"""
+
+import sqlite3
+
+import pytest
+
+from character_database import CharacterDatabase
+from text_search import build_fts_query, cjk_bigrams
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = CharacterDatabase(str(tmp_path / "characters.db"))
+    lu = db.add_character("路明非", "卡塞尔学院的新生，S级混血种", "")
+    chu = db.add_character("楚子航", "狮心会会长，曾经见过路明非的S级评定", "")
+    db.add_character("芬格尔", "永远的大四学长", "")
+    db.add_personality_traits(lu, ["吐槽役", "自卑"])
+    db.add_memorable_quotes(chu, [("我是狮心会的会长", "自我介绍", 8)])
+    db.add_spirit_word("君焰", 89, "青铜与火之王", "高温爆炸的言灵")
+    db.add_spirit_word("言灵·皇帝", 1, "黑王", "统御龙类的言灵")
+    return db
+
+
+def _names(results):
+    return [profile["name"] for profile in results]
+
+
+def test_bigram_tokens():
+    assert cjk_bigrams("路明非") == "路明 明非 非"
+    assert cjk_bigrams("S级Dragon") == "s 级 dragon"
+    assert build_fts_query("  ,. ") is None
+
+
+def test_search_matches_substrings_of_any_field(db):
+    assert _names(db.search_characters("新生")) == ["路明非"]
+    assert _names(db.search_characters("吐槽")) == ["路明非"]
+    assert _names(db.search_characters("会长")) == ["楚子航"]
+    assert db.search_characters("") == []
+
+
+def test_name_hits_rank_above_body_hits(db):
+    # 楚子航的背景里提到路明非，但角色名命中的排在前面
+    assert _names(db.search_characters("路明非")) == ["路明非", "楚子航"]
+    assert _names(db.search_characters("路明非", limit=1)) == ["路明非"]
+
+
+def test_index_follows_updates_and_deletes(db):
+    db.update_character("芬格尔", background_story="新闻部部长")
+    db.delete_character("路明非")
+
+    assert db.search_characters("大四") == []
+    assert _names(db.search_characters("新闻部")) == ["芬格尔"]
+    assert _names(db.search_characters("S级")) == ["楚子航"]
+
+
+def test_writes_from_other_connections_are_indexed_on_sync(db):
+    with sqlite3.connect(db.connections.db_path) as conn:
+        conn.execute("UPDATE characters SET background_story = '学生会主席' WHERE name = '芬格尔'")
+
+    # 触发器只记录待索引的行，搜索本身不写数据库
+    assert db.search_characters("主席") == []
+    db.sync_search_index()
+    assert _names(db.search_characters("主席")) == ["芬格尔"]
+
+
+def test_spirit_word_search(db):
+    assert [word["name"] for word in db.search_spirit_words("言灵")] == ["言灵·皇帝", "君焰"]
+    assert [word["name"] for word in db.search_spirit_words("火之王")] == ["君焰"]
+
+
+def test_readding_spirit_word_updates_in_place(db):
+    with db.connections.connection() as conn:
+        (spirit_word_id,) = conn.execute("SELECT id FROM spirit_words WHERE name = '君焰'").fetchone()
+
+    db.add_spirit_word("君焰", 89, "青铜与火之王", "释放高温的言灵")
+
+    with db.connections.connection() as conn:
+        assert conn.execute("SELECT id FROM spirit_words WHERE name = '君焰'").fetchone() == \
+            (spirit_word_id,)
+        assert conn.execute('SELECT COUNT(*) FROM spirit_word_search').fetchone() == (2,)
+    assert db.search_spirit_words("爆炸") == []
+    assert [word["name"] for word in db.search_spirit_words("释放")] == ["君焰"]
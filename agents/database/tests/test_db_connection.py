@@ -0,0 +1,102 @@
+"""连接管理层：线程级连接、事务嵌套和连接的关闭"""
+
+import gc
+import sqlite3
+import threading
+
+import pytest
+
+from db_connection import ConnectionManager, get_connection_manager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = ConnectionManager(str(tmp_path / "test.db"))
+    with manager.connection() as conn:
+        conn.execute('CREATE TABLE items (value INTEGER)')
+    yield manager
+    manager.close_all()
+
+
+def _run_in_thread(func):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def _count(manager):
+    with manager.connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+
+def test_connection_is_reused_within_a_thread(manager):
+    conn = manager.get_connection()
+
+    assert manager.get_connection() is conn
+    assert _run_in_thread(manager.get_connection) is not conn
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == "wal"
+
+
+def test_thread_connection_is_closed_when_thread_ends(manager):
+    _run_in_thread(lambda: _count(manager))
+    gc.collect()
+
+    assert manager._connections == [manager.get_connection()]
+
+
+def test_close_all_closes_connections_of_every_thread(manager):
+    other = _run_in_thread(manager.get_connection)
+    conn = manager.get_connection()
+
+    manager.close_all()
+
+    for closed in (conn, other):
+        with pytest.raises(sqlite3.ProgrammingError):
+            closed.execute('SELECT 1')
+    # 之后的调用重新建立连接
+    assert manager.get_connection() is not conn
+    assert _count(manager) == 0
+
+
+def test_nested_connection_commits_at_outermost_block(manager):
+    with manager.connection() as conn:
+        with manager.connection():
+            conn.execute('INSERT INTO items VALUES (1)')
+        assert manager.in_transaction()
+        assert _run_in_thread(lambda: _count(manager)) == 0
+
+    assert not manager.in_transaction()
+    assert _run_in_thread(lambda: _count(manager)) == 1
+
+
+def test_transaction_rolls_back_everything_on_error(manager):
+    with pytest.raises(RuntimeError):
+        with manager.transaction() as conn:
+            conn.execute('INSERT INTO items VALUES (1)')
+            with manager.transaction():
+                conn.execute('INSERT INTO items VALUES (2)')
+            raise RuntimeError("失败")
+
+    assert _count(manager) == 0
+
+
+def test_memory_database_rejects_other_threads():
+    manager = ConnectionManager(":memory:")
+    manager.get_connection()
+
+    def connect_from_other_thread():
+        try:
+            manager.get_connection()
+        except ValueError as error:
+            return error
+
+    assert isinstance(_run_in_thread(connect_from_other_thread), ValueError)
+    manager.close_all()
+
+
+def test_managers_are_shared_per_database_file(tmp_path):
+    path = tmp_path / "shared.db"
+
+    assert get_connection_manager(str(path)) is get_connection_manager(str(path.absolute()))
@@ -0,0 +1,105 @@
+"""离线抽取式摘要：句子切分、TextRank排序、按原文顺序选句，numpy与纯Python实现结果一致"""
+
+import pytest
+
+import extractive_summarizer as es
+
+CHAPTERS = [
+    {"title": "开学", "summary": "路明非收到卡塞尔学院的录取通知。路明非在卡塞尔学院参加入学考试。"
+                                 "今天天气很好。",
+     "key_events": "收到通知 → 入学考试", "character_focus": "路明非，古德里安", "mood": "紧张"},
+    {"title": "自由一日", "summary": "楚子航在卡塞尔学院参加自由一日。路明非在卡塞尔学院参加自由一日！",
+     "key_events": "自由一日", "character_focus": "路明非、楚子航", "mood": "紧张、热血"},
+    {"title": "屠龙", "summary": "路明非和楚子航在三峡屠龙。“龙王苏醒了。”他说。",
+     "key_events": "三峡潜水 -> 屠龙", "character_focus": "楚子航, 路明非", "setting": "三峡"},
+]
+
+
+def _corpus(count):
+    names = ["路明非", "楚子航", "诺诺", "恺撒", "芬格尔", "零"]
+    places = ["卡塞尔学院", "三峡", "芝加哥", "东京", "北京"]
+    actions = ["参加考试", "屠龙", "执行任务", "喝酒", "开会", "潜水"]
+    return [f"{names[index % 6]}在{places[index % 5]}{actions[index % 4 + index % 3]}第{index % 7}次。"
+            for index in range(count)]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    if request.param == "numpy" and es.np is None:
+        pytest.skip("numpy未安装")
+    if request.param == "python":
+        monkeypatch.setattr(es, "np", None)
+    return request.param
+
+
+def test_split_sentences_keeps_closing_quotes():
+    assert es.split_sentences("“龙王苏醒了。”他说。好的……走吧！\n——") == \
+        ["“龙王苏醒了。”", "他说。", "好的……", "走吧！"]
+    assert es.split_sentences(None) == []
+
+
+def test_central_sentence_ranks_first(backend):
+    sentences = ["路明非在卡塞尔学院学习屠龙", "路明非在卡塞尔学院考试",
+                 "楚子航在卡塞尔学院学习屠龙", "今天天气很好"]
+
+    order = es.rank_sentences(sentences)
+
+    assert order[0] == 0
+    assert order[-1] == 3
+    assert sorted(order) == [0, 1, 2, 3]
+
+
+def test_summary_keeps_original_order_and_limits(backend):
+    summaries = [chapter["summary"] for chapter in CHAPTERS]
+
+    summary = es.summarize(summaries, max_sentences=2, max_chars=None)
+    sentences = es.split_sentences(summary)
+    positions = [next(index for index, chapter in enumerate(CHAPTERS)
+                      if sentence.rstrip("。") in chapter["summary"]) for sentence in sentences]
+    assert len(sentences) == 2
+    assert positions == sorted(positions)
+    # 几乎相同的两句只选一句
+    assert not {"楚子航在卡塞尔学院参加自由一日。", "路明非在卡塞尔学院参加自由一日！"} <= set(sentences)
+
+    assert len(es.summarize(summaries, max_sentences=10, max_chars=30)) <= 30
+    assert es.summarize(["短句。"]) == "短句。"
+
+
+def test_empty_input_defaults():
+    node = es.extract_merge_node([])
+
+    assert node["title"] == "未知章节"
+    assert node["summary"] == "无章节信息"
+    assert {key: value for key, value in node.items() if key not in ("title", "summary")} == \
+        dict.fromkeys(("plot_point", "key_events", "character_focus", "setting", "mood", "themes"), "")
+    assert es.summarize([None, ""]) == ""
+    assert es.representative([None, " "], ["路明非屠龙。"]) == ""
+
+
+def test_merge_node_fields(backend):
+    node = es.extract_merge_node(CHAPTERS)
+
+    assert node["title"] in {"开学", "自由一日", "屠龙"}
+    assert node["key_events"] == "收到通知 → 入学考试 → 自由一日 → 三峡潜水 → 屠龙"
+    assert node["character_focus"] == "路明非，古德里安，楚子航"
+    assert node["mood"] == "紧张、热血"
+    assert node["setting"] == "三峡"
+
+
+def test_numpy_and_python_results_match(monkeypatch):
+    if es.np is None:
+        pytest.skip("numpy未安装")
+    sentences = _corpus(120)
+    records = [{"title": f"第{index}章", "summary": "".join(sentences[index:index + 6]),
+                "key_events": " → ".join(sentence[:6] for sentence in sentences[index:index + 4])}
+               for index in range(0, 120, 6)]
+    # 较小的上限和批大小，覆盖TF-IDF预选和分批累加
+    monkeypatch.setattr(es, "MAX_RANKED_SENTENCES", 50)
+    monkeypatch.setattr(es, "PAIR_BATCH", 64)
+
+    def run():
+        return es.rank_sentences(sentences), es.summarize(sentences), es.extract_merge_node(records)
+
+    with_numpy = run()
+    monkeypatch.setattr(es, "np", None)
+    assert run() == with_numpy
@@ -0,0 +1,94 @@
+"""合并节点按输入内容哈希缓存：命中时不再调用AI"""
+
+import asyncio
+
+import pytest
+
+from plot_database import PlotDatabase
+
+
+class FakeMergeAgent:
+    """记录每组生成输入的合并Agent"""
+
+    generator_id = "fake"
+
+    def __init__(self):
+        self.generated = []
+
+    async def generate_merge_nodes_async(self, chapter_groups, max_concurrency=4):
+        self.generated.extend(chapter_groups)
+        return [{field: "+".join(record[field] for record in records)
+                 for field in PlotDatabase.MERGE_NODE_FIELDS} for records in chapter_groups]
+
+
+def _record(name: str) -> dict:
+    return {field: f"{name}.{field}" for field in PlotDatabase.MERGE_NODE_FIELDS}
+
+
+@pytest.fixture
+def merge_system(tmp_path):
+    # 需要openai-agents和pydantic
+    plot_merge_system = pytest.importorskip("plot_merge_system")
+    system = plot_merge_system.PlotMergeSystem(str(tmp_path / "plot.db"))
+    system.merge_agent = FakeMergeAgent()
+    return system
+
+
+def _generate(system, inputs):
+    merged_structure = {"cache_hits": 0, "cache_misses": 0}
+    nodes = asyncio.run(system._generate_merge_nodes(inputs, 1, merged_structure))
+    return nodes, (merged_structure["cache_hits"], merged_structure["cache_misses"])
+
+
+def test_cache_miss_then_hit(merge_system):
+    a, b, c, d, e = (_record(name) for name in "abcde")
+    inputs = [[a, b], [c, d], [e], []]
+
+    nodes, lookups = _generate(merge_system, inputs)
+    assert lookups == (0, 2)
+    assert merge_system.merge_agent.generated == [[a, b], [c, d]]
+    assert nodes[0]["summary"] == "a.summary+b.summary"
+    # 单条输入直接使用该记录，空输入为None
+    assert nodes[2] is e and nodes[3] is None
+
+    cached, lookups = _generate(merge_system, inputs)
+    assert lookups == (2, 0)
+    assert len(merge_system.merge_agent.generated) == 2
+    for node, expected in zip(cached[:2], nodes[:2]):
+        assert {field: node[field] for field in PlotDatabase.MERGE_NODE_FIELDS} == expected
+
+    stats = merge_system.get_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["total_hits"]) == (2, 2, 2, 2)
+
+
+def test_identical_inputs_in_one_batch_are_generated_once(merge_system):
+    a, b = _record("a"), _record("b")
+
+    nodes, lookups = _generate(merge_system, [[a, b], [dict(a), dict(b)]])
+
+    assert lookups == (0, 1)
+    assert merge_system.merge_agent.generated == [[a, b]]
+    assert nodes[0] == nodes[1]
+
+
+def test_cache_key_depends_on_generator(merge_system):
+    records = [_record("a"), _record("b")]
+    _generate(merge_system, [records])
+
+    merge_system.merge_agent.generator_id = "other"
+    _, lookups = _generate(merge_system, [records])
+
+    assert lookups == (0, 1)
+    assert len(merge_system.merge_agent.generated) == 2
+
+
+def test_regenerating_cached_node_keeps_hit_count(tmp_path):
+    db = PlotDatabase(str(tmp_path / "plot.db"))
+    db.save_cached_merge_nodes([("hash", 2, _record("old"))])
+    db.record_merge_cache_hits(["hash", "hash"])
+
+    db.save_cached_merge_nodes([("hash", 3, _record("new"))])
+
+    cached = db.get_cached_merge_nodes(["hash"])["hash"]
+    assert (cached["input_count"], cached["summary"], cached["hit_count"]) == (3, "new.summary", 2)
+    assert db.get_merge_cache_stats()["entries"] == 1
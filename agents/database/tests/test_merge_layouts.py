@@ -0,0 +1,51 @@
+"""segment布局的覆盖分解和两种布局AI调用计数的不变量"""
+
+import pytest
+
+from merge_layouts import (LAYOUTS, count_incremental_calls, count_merge_calls,
+                           segment_cover, segment_layers)
+
+MERGE_FACTORS = [2, 3, 4, 5]
+
+
+@pytest.mark.parametrize("merge_factor", MERGE_FACTORS)
+def test_segment_cover_is_minimal_aligned_partition(merge_factor):
+    for count in range(200):
+        cover, uncovered = segment_cover(count, merge_factor)
+
+        # 节点按章节顺序首尾相接，从第0章覆盖到uncovered
+        position = 0
+        for layer, start, end in cover:
+            size = merge_factor ** layer
+            assert (start, end - start) == (position, size)
+            assert start % size == 0
+            position = end
+        assert position == uncovered
+        # 剩余不足一个第1层的块
+        assert 0 <= count - uncovered < merge_factor
+
+        # 层号不增，除最高层外每层不超过merge_factor-1个节点
+        layers = [layer for layer, _, _ in cover]
+        assert layers == sorted(layers, reverse=True)
+        for layer in set(layers) - {segment_layers(count, merge_factor)}:
+            assert layers.count(layer) < merge_factor
+
+
+@pytest.mark.parametrize("merge_factor", MERGE_FACTORS)
+def test_segment_nodes_are_generated_once(merge_factor):
+    # segment节点生成后不再变化：逐章生成的累计调用等于从零生成一次
+    for chapters in range(0, 300, 7):
+        assert count_incremental_calls(chapters, merge_factor, "segment") == \
+            count_merge_calls(chapters, merge_factor, "segment")
+
+
+@pytest.mark.parametrize("merge_factor", MERGE_FACTORS)
+def test_incremental_calls_bounds(merge_factor):
+    for chapters in range(0, 300, 7):
+        incremental = {layout: count_incremental_calls(chapters, merge_factor, layout)
+                       for layout in LAYOUTS}
+        scratch = count_merge_calls(chapters, merge_factor, "blocks")
+
+        assert incremental["blocks"]["calls"] >= scratch["calls"]
+        assert incremental["segment"]["calls"] <= incremental["blocks"]["calls"]
+        assert incremental["segment"]["inputs"] <= incremental["blocks"]["inputs"]
@@ -0,0 +1,73 @@
+"""内存名称解析：正式名、别名和文本提及，写入后保持与别名表一致"""
+
+import sqlite3
+
+import pytest
+
+from database_api import CharacterAPI
+
+
+@pytest.fixture
+def api(tmp_path):
+    api = CharacterAPI(str(tmp_path / "characters.db"))
+    api.db.add_character("路明非", "卡塞尔学院的新生", "从衰仔到屠龙者")
+    api.db.add_character("楚子航", "狮心会会长", "")
+    api.db.add_character_alias("路明非", "明非")
+    return api
+
+
+def test_resolves_names_and_aliases(api):
+    assert api.resolve_name("路明非") == "路明非"
+    assert api.resolve_name("明非") == "路明非"
+    assert api.resolve_name("芬格尔") is None
+    assert api.resolve_names(["明非", "楚子航", "芬格尔"]) == \
+        {"明非": "路明非", "楚子航": "楚子航", "芬格尔": None}
+
+
+def test_finds_mentions_by_name_and_alias(api):
+    mentions = api.find_character_mentions("明非看着楚子航，路明非想起了那个雨夜。")
+
+    assert mentions == {"路明非": 2, "楚子航": 1}
+
+
+def test_relationship_queries_accept_aliases(api):
+    api.db.add_relationship("路明非", "楚子航", "师兄弟", "", 7)
+
+    assert api.get_relationship_strength("明非", "楚子航") == 7
+
+
+def test_write_from_other_connection_reloads_names(api):
+    api.db.EXTERNAL_CHECK_INTERVAL = 0
+    assert api.resolve_name("Ricardo") is None
+
+    with sqlite3.connect(api.db.connections.db_path) as conn:
+        conn.execute('''
+            INSERT INTO character_aliases (character_id, alias, alias_type)
+            SELECT id, 'Ricardo', '英文名' FROM characters WHERE name = '路明非'
+        ''')
+
+    assert api.resolve_name("Ricardo") == "路明非"
+
+
+def test_own_writes_do_not_reload_resolver(api, monkeypatch):
+    assert api.resolve_name("明非") == "路明非"
+    loads = []
+    resolver = api.db.name_resolver
+    monkeypatch.setattr(resolver, "load", lambda load=resolver.load: loads.append(1) or load())
+
+    api.db.add_character_alias("楚子航", "师兄")
+    api.db.add_character("芬格尔", "永远的大四学长", "")
+
+    assert api.resolve_name("师兄") == "楚子航"
+    assert api.resolve_name("芬格尔") == "芬格尔"
+    assert loads == []
+
+
+def test_failed_write_invalidates_resolver(api):
+    assert api.resolve_name("明非") == "路明非"
+
+    with pytest.raises(ValueError):
+        api.db.add_relationship("路明非", "不存在的人", "朋友")
+
+    assert api.db.name_resolver._version is None
+    assert api.resolve_name("明非") == "路明非"
@@ -0,0 +1,91 @@
+"""键集分页迭代器跨页边界时不重复、不遗漏"""
+
+import pytest
+
+from plot_database import PlotDatabase
+from storyline_database import StorylineDatabase
+
+
+@pytest.fixture
+def plot_db(tmp_path):
+    db = PlotDatabase(str(tmp_path / "plot.db"))
+    for number in range(1, 26):
+        chapter_id = db.add_chapter(number, f"第{number}章", word_count=number * 100)
+        # 部分章节有子章节和草稿版本，同一编号出现多行
+        if number % 4 == 0:
+            db.add_chapter(number, f"第{number}章（一）", parent_chapter_id=chapter_id)
+        if number % 5 == 0:
+            db.add_chapter(number, f"第{number}章（草稿）", branch="draft")
+    return db
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 4, 25, 100])
+def test_iter_chapters_matches_full_scan(plot_db, batch_size):
+    expected = sorted(plot_db.get_all_chapters(['id', 'chapter_number', 'depth_level']),
+                      key=PlotDatabase.chapter_page_key)
+
+    chapters = list(plot_db.iter_chapters(['id'], batch_size=batch_size))
+
+    assert [chapter['id'] for chapter in chapters] == [chapter['id'] for chapter in expected]
+
+
+@pytest.mark.parametrize("batch_size", [1, 4, 7, 100])
+@pytest.mark.parametrize("start, end", [(1, None), (5, 17), (24, 30)])
+def test_iter_chapters_in_range_yields_each_number_once(plot_db, batch_size, start, end):
+    expected = plot_db.get_chapters_in_range(start, end, ['id'])
+
+    chapters = list(plot_db.iter_chapters_in_range(start, end, ['id'], batch_size=batch_size))
+
+    assert [chapter['id'] for chapter in chapters] == [chapter['id'] for chapter in expected]
+    numbers = [chapter['chapter_number'] for chapter in chapters]
+    assert numbers == list(range(start, min(end or 25, 25) + 1))
+
+
+def test_plot_summary_totals(plot_db):
+    summary = plot_db.get_plot_summary(10)
+
+    assert summary['total_chapters'] == plot_db.get_chapter_totals(10)[0]
+    assert summary['total_word_count'] == sum(number * 100 for number in range(1, 11))
+    assert [chapter['chapter_number'] for chapter in summary['chapters']] == list(range(1, 11))
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 5, 100])
+def test_iter_merge_summaries_matches_full_scan(plot_db, batch_size):
+    for current_chapter in (6, 9, 12):
+        for merge_factor in (2, 3):
+            plot_db.save_merge_summary(current_chapter, merge_factor, f"{current_chapter}/{merge_factor}")
+
+    summaries = list(plot_db.iter_merge_summaries(batch_size=batch_size))
+
+    assert [summary['id'] for summary in summaries] == \
+        [summary['id'] for summary in plot_db.get_all_merge_summaries()]
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 3, 100])
+def test_iter_storylines_matches_full_scan(tmp_path, batch_size):
+    db = StorylineDatabase(str(tmp_path / "storylines.db"))
+    for index in range(7):
+        # 起始章节有重复，排序依赖(start_chapter, id)
+        db.create_storyline(f"支线{index}", "side", index // 2 * 10 + 1, index // 2 * 10 + 9,
+                            "主题", "基调", "场景")
+
+    storylines = list(db.iter_storylines(batch_size=batch_size))
+
+    assert [storyline['id'] for storyline in storylines] == \
+        [storyline['id'] for storyline in db.get_all_storylines()]
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 3, 100])
+def test_iter_storylines_keeps_rows_without_start_chapter(tmp_path, batch_size):
+    db = StorylineDatabase(str(tmp_path / "storylines.db"))
+    for index, start_chapter in enumerate([5, None, 1, None, None, 5, None]):
+        db.create_storyline(f"支线{index}", "side", start_chapter, None, "主题", "基调", "场景")
+
+    # NULL起始章节的四行跨越页边界
+    storylines = list(db.iter_storylines(batch_size=batch_size))
+
+    assert [storyline['id'] for storyline in storylines] == \
+        [storyline['id'] for storyline in db.get_all_storylines()]
+    assert [storyline['start_chapter'] for storyline in storylines] == [None] * 4 + [1, 5, 5]
+    assert db.get_storylines_page(StorylineDatabase.storyline_page_key(storylines[1]), 2) == \
+        storylines[2:4]
@@ -0,0 +1,70 @@
+"""写入会话：暂存的写入在一个事务中提交，任何一步失败或with块抛出异常时都不落盘"""
+
+import pytest
+
+from plot_api import PlotAPI
+from plot_session import StagedChapter
+
+
+@pytest.fixture
+def api(tmp_path):
+    api = PlotAPI(str(tmp_path / "plot.db"))
+    api.db.add_chapter(1, "第一章")
+    api.db.save_merge_summary(1, 2, "旧摘要")
+    return api
+
+
+def _chapter_numbers(api):
+    return [chapter['chapter_number'] for chapter in api.db.get_chapters_in_range(1, None)]
+
+
+def _stage_chapter(session):
+    chapter = session.add_chapter(2, "第二章", "路明非入学", 3000, make_canonical=True)
+    session.save_chapter_text(chapter, "路明非抬头看着天空。")
+    session.add_character_arc("路明非", chapter, development="入学")
+    session.invalidate_merge_summaries(1)
+    return chapter
+
+
+def test_with_block_commits_all_staged_writes(api):
+    with api.session() as session:
+        chapter = _stage_chapter(session)
+        # 暂存期间不写数据库
+        assert chapter.id is None
+        assert _chapter_numbers(api) == [1]
+        assert len(session) == 4
+
+    assert session.committed
+    assert api.db.get_chapter_by_number(2)['id'] == chapter.id
+    assert api.db.get_chapter_text(chapter.id) == "路明非抬头看着天空。"
+    assert [arc['development'] for arc in api.db.get_character_development_timeline("路明非")] == ["入学"]
+    assert api.db.get_merge_summary(1, 2) is None
+    with pytest.raises(RuntimeError):
+        session.add_chapter(3, "第三章")
+
+
+def test_exception_in_with_block_discards_staged_writes(api):
+    with pytest.raises(KeyError):
+        with api.session() as session:
+            _stage_chapter(session)
+            raise KeyError("生成失败")
+
+    assert len(session) == 0
+    assert _chapter_numbers(api) == [1]
+    assert api.db.get_merge_summary(1, 2) is not None
+
+
+def test_failed_commit_rolls_back_earlier_writes(api):
+    session = api.session()
+    chapter = _stage_chapter(session)
+    # 其他会话的暂存章节没有ID，提交到这一步时失败
+    session.set_canonical_chapter(StagedChapter(2, "别的会话"))
+
+    with pytest.raises(ValueError):
+        api.commit_session(session)
+
+    assert chapter.id is None
+    assert not session.committed
+    assert _chapter_numbers(api) == [1]
+    assert api.db.get_character_development_timeline("路明非") == []
+    assert api.db.get_merge_summary(1, 2) is not None
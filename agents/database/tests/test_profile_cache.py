@@ -0,0 +1,61 @@
+"""角色档案缓存：命中直到数据变更，任何连接的写入都会使其失效"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from database_api import CharacterAPI
+
+
+@pytest.fixture
+def api(tmp_path):
+    api = CharacterAPI(str(tmp_path / "characters.db"))
+    api.db.add_character("路明非", "卡塞尔学院的新生", "从衰仔到屠龙者")
+    api.db.add_character("楚子航", "狮心会会长", "")
+    return api
+
+
+def _run_in_thread(func):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_profile_cache_hits_until_write(api):
+    profile = api.get_character("路明非")
+    assert api.get_character("路明非") is profile
+
+    api.db.update_character("路明非", background_story="S级混血种")
+
+    updated = api.get_character("路明非")
+    assert updated is not profile
+    assert updated["background_story"] == "S级混血种"
+
+
+def test_write_from_other_connection_invalidates_profile(api):
+    api.db.EXTERNAL_CHECK_INTERVAL = 0
+    assert api.get_character("路明非")["background_story"] == "卡塞尔学院的新生"
+
+    with sqlite3.connect(api.db.connections.db_path) as conn:
+        conn.execute("UPDATE characters SET background_story = '外部修改' WHERE name = '路明非'")
+
+    assert api.get_character("路明非")["background_story"] == "外部修改"
+
+
+def test_data_version_is_shared_across_threads(api):
+    profile = api.get_character("楚子航")
+
+    assert _run_in_thread(lambda: api.db.data_version) == api.db.data_version
+    # 其他线程的读取使用同一份缓存
+    assert _run_in_thread(lambda: api.get_character("楚子航")) is profile
+
+
+def test_unknown_character_is_not_cached_as_profile(api):
+    assert api.get_character("芬格尔") is None
+
+    api.db.add_character("芬格尔", "永远的大四学长", "")
+
+    assert api.get_character("芬格尔")["background_story"] == "永远的大四学长"
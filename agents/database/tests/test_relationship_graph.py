@@ -0,0 +1,76 @@
+"""内存关系图：查询结果与关系表一致，本进程写入增量更新，外部写入后重新加载"""
+
+import sqlite3
+
+import pytest
+
+from database_api import CharacterAPI
+
+
+@pytest.fixture
+def api(tmp_path):
+    api = CharacterAPI(str(tmp_path / "characters.db"))
+    for name in ("路明非", "楚子航", "恺撒", "诺诺", "芬格尔"):
+        api.db.add_character(name, f"{name}的背景", "")
+    api.db.add_relationship("路明非", "楚子航", "师兄弟", "", 7)
+    api.db.add_relationship("楚子航", "恺撒", "对手", "", 6)
+    api.db.add_relationship("恺撒", "诺诺", "恋人", "", 9)
+    api.db.add_relationship("路明非", "芬格尔", "室友", "", 2)
+    return api
+
+
+def test_relationship_queries(api):
+    assert api.get_relationship_strength("路明非", "楚子航") == 7
+    assert api.get_relationship_type("路明非", "楚子航") == "师兄弟"
+    # 关系有方向，邻域和路径不区分方向
+    assert api.get_relationship_type("楚子航", "路明非") == ""
+    assert not api.are_characters_related("路明非", "诺诺")
+    assert set(api.get_relationships("路明非")) == {"楚子航", "芬格尔"}
+
+    assert api.get_related_characters("路明非", hops=2) == \
+        {"楚子航": 1, "芬格尔": 1, "恺撒": 2}
+    assert api.get_related_characters("路明非", hops=3, min_strength=5) == \
+        {"楚子航": 1, "恺撒": 2, "诺诺": 3}
+    assert api.get_relationship_path("路明非", "诺诺") == ["路明非", "楚子航", "恺撒", "诺诺"]
+    assert api.get_connecting_characters("路明非", "恺撒") == ["楚子航"]
+
+
+def test_own_writes_do_not_reload_graph(api, monkeypatch):
+    assert api.get_relationships("恺撒")
+    loads = []
+    graph = api.db.relationship_graph
+    monkeypatch.setattr(graph, "load", lambda load=graph.load: loads.append(1) or load())
+
+    api.db.add_relationship("路明非", "诺诺", "暗恋", "", 8)
+
+    assert api.get_relationship_strength("路明非", "诺诺") == 8
+    assert api.get_relationship_path("路明非", "诺诺") == ["路明非", "诺诺"]
+    assert loads == []
+
+
+def test_write_from_other_connection_reloads_graph(api):
+    api.db.EXTERNAL_CHECK_INTERVAL = 0
+    assert api.get_relationship_strength("路明非", "芬格尔") == 2
+
+    with sqlite3.connect(api.db.connections.db_path) as conn:
+        conn.execute("UPDATE character_relationships SET strength = 5 WHERE strength = 2")
+
+    assert api.get_relationship_strength("路明非", "芬格尔") == 5
+
+
+def test_lookups_skip_change_count_query_until_write(api, monkeypatch):
+    api.get_relationships("路明非")
+    reads = []
+    read_change_count = api.db._read_change_count
+    monkeypatch.setattr(api.db, "_read_change_count",
+                        lambda: reads.append(1) or read_change_count())
+
+    for _ in range(100):
+        assert api.get_relationship_strength("路明非", "楚子航") == 7
+        assert api.get_character("楚子航") is not None
+    assert reads == []
+
+    # 本进程写入后立即重新读取计数
+    api.db.update_character("楚子航", background_story="狮心会会长，言灵·君焰")
+    assert api.get_character("楚子航")["background_story"] == "狮心会会长，言灵·君焰"
+    assert reads
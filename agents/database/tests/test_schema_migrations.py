@@ -0,0 +1,80 @@
+"""迁移执行器和各数据库初始化的幂等性，以及常用查询的索引检查"""
+
+import sqlite3
+
+import pytest
+
+from schema_migrations import get_schema_version, run_migrations
+from plot_database import PlotDatabase
+from storyline_database import StorylineDatabase
+from character_database import CharacterDatabase
+
+
+def _schema(path: str) -> list:
+    with sqlite3.connect(path) as conn:
+        return sorted(conn.execute('SELECT type, name, tbl_name, sql FROM sqlite_master'),
+                      key=lambda row: (row[0], row[1]))
+
+
+def test_run_migrations_applies_each_version_once(tmp_path):
+    counts = []
+    migrations = [
+        (1, "建表", "CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"),
+        (2, "索引", ["CREATE INDEX idx_items_name ON items (name)"]),
+        (3, "函数", lambda cursor: counts.append(
+            cursor.execute('SELECT COUNT(*) FROM items').fetchone()[0])),
+    ]
+    conn = sqlite3.connect(str(tmp_path / "migrations.db"))
+
+    assert run_migrations(conn, migrations) == [1, 2, 3]
+    assert run_migrations(conn, migrations) == []
+    assert get_schema_version(conn) == 3
+    assert counts == [0]
+
+
+def test_failed_migration_is_rolled_back(tmp_path):
+    def fail(cursor):
+        cursor.execute('CREATE TABLE half_done (id INTEGER)')
+        raise RuntimeError("迁移失败")
+
+    conn = sqlite3.connect(str(tmp_path / "migrations.db"))
+    first = (1, "建表", "CREATE TABLE items (id INTEGER PRIMARY KEY)")
+
+    with pytest.raises(RuntimeError):
+        run_migrations(conn, [first, (2, "失败", fail)])
+    assert get_schema_version(conn) == 1
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+
+    # 修复后重新执行只补上失败的迁移
+    assert run_migrations(conn, [first, (2, "修复", "CREATE TABLE fixed (id INTEGER)")]) == [2]
+
+
+def test_migration_versions_must_be_consecutive(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "migrations.db"))
+    with pytest.raises(ValueError):
+        run_migrations(conn, [(1, "", "SELECT 1"), (3, "", "SELECT 1")])
+
+
+@pytest.mark.parametrize("database", [PlotDatabase, StorylineDatabase, CharacterDatabase])
+def test_database_init_is_idempotent(tmp_path, database):
+    path = str(tmp_path / "test.db")
+    database(path)
+    schema = _schema(path)
+    with sqlite3.connect(path) as conn:
+        version = get_schema_version(conn)
+
+    database(path)
+
+    assert version > 0
+    assert _schema(path) == schema
+    with sqlite3.connect(path) as conn:
+        assert get_schema_version(conn) == version
+        assert conn.execute('SELECT COUNT(*) FROM schema_version').fetchone()[0] == version
+
+
+def test_plot_queries_use_indexes(tmp_path):
+    db = PlotDatabase(str(tmp_path / "plot.db"))
+    for number in range(1, 4):
+        db.add_chapter(number, f"第{number}章")
+
+    assert db.check_query_plans() == []
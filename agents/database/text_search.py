@@ -0,0 +1,61 @@
+"""
+中文全文检索工具
+提供FTS5使用的CJK二元分词（bigram）和检索表达式构建
+"""
+
+import re
+from typing import List, Optional
+
+# 连续的中日韩字符（非ASCII的字母/数字）或ASCII单词
+_TOKEN_RE = re.compile(r'[^\W\x00-\x7f_]+|[A-Za-z0-9]+')
+
+
+def cjk_bigrams(text: Optional[str]) -> str:
+    """
+    将文本切分为FTS5可索引的词元串
+
+    中文连续片段切成重叠的二元组，并补上片段末尾的单字，
+    这样任意单字和任意连续子串都能被检索到；ASCII单词转为小写。
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        以空格分隔的词元串
+    """
+    if not text:
+        return ""
+
+    tokens = []
+    for run in _TOKEN_RE.findall(text):
+        if run.isascii():
+            tokens.append(run.lower())
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        tokens.append(run[-1])
+    return " ".join(tokens)
+
+
+def build_fts_query(keyword: str) -> Optional[str]:
+    """
+    把用户关键词转换为FTS5 MATCH表达式
+
+    每个中文片段转成二元组短语（等价于子串匹配），单字和ASCII单词用前缀匹配，
+    多个片段之间为AND关系。
+
+    Args:
+        keyword: 搜索关键词
+
+    Returns:
+        MATCH表达式；关键词中没有可检索字符时返回None
+    """
+    clauses: List[str] = []
+    for run in _TOKEN_RE.findall(keyword or ""):
+        if run.isascii():
+            clauses.append(f'"{run.lower()}"*')
+        elif len(run) == 1:
+            clauses.append(f'"{run}"*')
+        else:
+            bigrams = " ".join(run[i:i + 2] for i in range(len(run) - 1))
+            clauses.append(f'"{bigrams}"')
+    return " AND ".join(clauses) if clauses else None
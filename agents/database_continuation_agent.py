@@ -28,7 +28,7 @@ def get_character_detail_from_db(character_name: str) -> str:
 
 
 @function_tool
-def get_plot_summary_from_db(current_chapter: int = None, merge_factor: int = 3) -> str:
+async def get_plot_summary_from_db(current_chapter: int = None, merge_factor: int = 3) -> str:
     """从数据库获取分层合并的情节大纲摘要
     
     Args:
@@ -45,15 +45,12 @@ def get_plot_summary_from_db(current_chapter: int = None, merge_factor: int = 3)
         
         # 如果没有指定当前章节，使用数据库中的最大章节号
         if current_chapter is None:
-            plot_api = get_plot_api()
-            all_chapters = plot_api.get_all_chapters()
-            if all_chapters:
-                current_chapter = max(chapter['chapter_number'] for chapter in all_chapters)
-            else:
+            current_chapter = get_plot_api().get_max_chapter_number()
+            if not current_chapter:
                 return "数据库中没有章节数据"
         
         # 获取分层合并的情节摘要
-        summary = merge_system.format_merged_plot_summary(current_chapter, merge_factor)
+        summary = await merge_system.format_merged_plot_summary_async(current_chapter, merge_factor)
         return summary
         
     except Exception as e:
@@ -108,7 +108,19 @@ class NewCharacterDetector:
                 json_str = result.final_output
             
             data = json.loads(json_str)
-            return CharacterDetectionResult(**data)
+            result = CharacterDetectionResult(**data)
+            
+            # 按名称/别名批量解析：模型报告的"新角色"可能只是已有角色的昵称或全名
+            resolved = self.char_api.resolve_names(
+                [c.name for c in result.new_characters] + result.existing_characters_mentioned)
+            known = [c for c in result.new_characters if resolved[c.name]]
+            for new_char in known:
+                print(f"ℹ️ {new_char.name} 是已有角色 {resolved[new_char.name]} 的别名，跳过")
+            result.new_characters = [c for c in result.new_characters if not resolved[c.name]]
+            mentioned = [resolved[name] or name for name in result.existing_characters_mentioned]
+            mentioned += [resolved[c.name] for c in known]
+            result.existing_characters_mentioned = list(dict.fromkeys(mentioned))
+            return result
         except Exception as e:
             print(f"检测失败: {e}")
             return CharacterDetectionResult(
@@ -184,7 +196,7 @@ class NewCharacterDetector:
         db = CharacterDatabase(db_path)
         
         try:
-            db.add_character(
+            char_id = db.add_character(
                 name=new_char.name,
                 background_story=background,
                 character_arc=f"{new_char.role_type}，在第{new_char.first_appearance_chapter}章登场"
@@ -192,17 +204,11 @@ class NewCharacterDetector:
             
             # 添加性格特点
             if detailed_info.get('personality_traits'):
-                db.add_personality_traits(
-                    db.get_character_id(new_char.name),
-                    detailed_info['personality_traits']
-                )
+                db.add_personality_traits(char_id, detailed_info['personality_traits'])
             
             # 添加说话方式
             if detailed_info.get('speech_patterns'):
-                db.add_speech_patterns(
-                    db.get_character_id(new_char.name),
-                    detailed_info['speech_patterns']
-                )
+                db.add_speech_patterns(char_id, detailed_info['speech_patterns'])
             
             # 添加关系
             for rel in detailed_info.get('relationships', []):
@@ -367,25 +367,16 @@ class WritingQualityController:
         """保存改进后的章节"""
         
         from datetime import datetime
-        import sqlite3
+        from database.plot_api import PlotAPI
         
-        # 更新数据库
+        # 更新数据库：正文写入主版本的章节正文存储（相同正文只存一份），摘要写回章节
         current_dir = os.path.dirname(os.path.abspath(__file__))
-        plot_db = os.path.join(current_dir, 'database', 'plot_outline.db')
+        plot_api = PlotAPI(os.path.join(current_dir, 'database', 'plot_outline.db'))
         
-        with sqlite3.connect(plot_db) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE chapters 
-                SET notes = ?,
-                    summary = ?
-                WHERE chapter_number = ?
-            ''', (
-                content,
-                content[:500] + "...",
-                chapter_number
-            ))
-            conn.commit()
+        chapter = plot_api.get_chapter_by_number(chapter_number)
+        if chapter:
+            plot_api.save_chapter_text(chapter['id'], content)
+            plot_api.update_chapter(chapter['id'], summary=content[:500] + "...")
         
         # 保存到文件
         output_dir = os.path.join(current_dir, 'output')
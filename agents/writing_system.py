@@ -11,6 +11,7 @@ sys.path.append(os.path.dirname(__file__))
 from database.plot_api import PlotAPI
 from database.database_api import CharacterAPI
 from database.plot_merge_system import PlotMergeSystem
+from database.async_api import AsyncPlotAPI, AsyncCharacterAPI
 from openai import AsyncOpenAI
 from agents import Agent, Runner
 from pydantic import BaseModel
@@ -96,6 +97,8 @@ class PlotPlannerAgent:
     def __init__(self):
         self.plot_api = PlotAPI()
         self.character_api = CharacterAPI()
+        self.async_plot_api = AsyncPlotAPI(self.plot_api)
+        self.async_character_api = AsyncCharacterAPI(self.character_api)
         self.merge_system = PlotMergeSystem()
         
         # 创建规划师Agent
@@ -133,7 +136,7 @@ class PlotPlannerAgent:
             model="gpt-4o"
         )
     
-    def get_context_for_planning(self, current_chapter: int) -> str:
+    async def get_context_for_planning(self, current_chapter: int) -> str:
         """获取规划所需的上下文信息"""
         
         context_parts = []
@@ -145,7 +148,7 @@ class PlotPlannerAgent:
         
         if current_chapter > 10:
             # 之前章节的简略摘要（使用合并因子5）
-            merged_summary = self.merge_system.format_merged_plot_summary(
+            merged_summary = await self.merge_system.format_merged_plot_summary_async(
                 current_chapter - 1, 
                 merge_factor=5
             )
@@ -158,22 +161,33 @@ class PlotPlannerAgent:
         context_parts.append("-" * 40)
         
         start_chapter = max(1, current_chapter - 10)
-        for ch_num in range(start_chapter, current_chapter):
-            chapter = self.plot_api.get_chapter_by_number(ch_num)
-            if chapter:
-                context_parts.append(f"\n第{ch_num}章: {chapter['title']}")
-                context_parts.append(f"  摘要: {chapter['summary']}")
-                context_parts.append(f"  情节要点: {chapter['plot_point']}")
-                context_parts.append(f"  关键事件: {chapter['key_events']}")
-                context_parts.append(f"  角色焦点: {chapter['character_focus']}")
-                context_parts.append(f"  场景设定: {chapter['setting']}")
-                context_parts.append(f"  情感基调: {chapter['mood']}")
+        main_characters = ["路明非", "楚子航", "恺撒", "诺诺", "夏弥"]
+        # 最近章节、角色轨迹（一次查询取出各角色截至上一章的最近发展）和角色资料
+        # 在读线程池中并发查询，不阻塞事件循环
+        recent_chapters, latest_arcs, *characters = await asyncio.gather(
+            self.async_plot_api.get_chapters_in_range(
+                start_chapter, current_chapter - 1,
+                columns=['title', 'summary', 'plot_point', 'key_events',
+                         'character_focus', 'setting', 'mood']),
+            self.async_plot_api.get_latest_character_arcs(
+                main_characters, as_of_chapter=current_chapter - 1),
+            *(self.async_character_api.get_character(char_name)
+              for char_name in main_characters))
+        for chapter in recent_chapters:
+            context_parts.append(f"\n第{chapter['chapter_number']}章: {chapter['title']}")
+            context_parts.append(f"  摘要: {chapter['summary']}")
+            context_parts.append(f"  情节要点: {chapter['plot_point']}")
+            context_parts.append(f"  关键事件: {chapter['key_events']}")
+            context_parts.append(f"  角色焦点: {chapter['character_focus']}")
+            context_parts.append(f"  场景设定: {chapter['setting']}")
+            context_parts.append(f"  情感基调: {chapter['mood']}")
         
         # 3. 获取最近1章的详细文本（如果有）
         if current_chapter > 1:
             context_parts.append(f"\n📝 第{current_chapter-1}章详细内容：")
             context_parts.append("-" * 40)
-            prev_chapter = self.plot_api.get_chapter_by_number(current_chapter - 1)
+            prev_chapter = (recent_chapters[-1] if recent_chapters and
+                            recent_chapters[-1]['chapter_number'] == current_chapter - 1 else None)
             if prev_chapter and prev_chapter.get('summary'):
                 context_parts.append(prev_chapter['summary'])
         
@@ -181,17 +195,13 @@ class PlotPlannerAgent:
         context_parts.append("\n👥 主要角色当前状态：")
         context_parts.append("-" * 40)
         
-        main_characters = ["路明非", "楚子航", "恺撒", "诺诺", "夏弥"]
-        for char_name in main_characters:
-            character = self.character_api.get_character(char_name)
+        for char_name, character in zip(main_characters, characters):
             if character:
                 context_parts.append(f"\n{char_name}:")
                 context_parts.append(f"  背景: {character.get('background_story', '')[:200]}...")
                 
-                # 获取角色最近的发展轨迹
-                timeline = self.plot_api.get_character_development_timeline(char_name)
-                if timeline:
-                    latest_arc = timeline[-1]
+                if latest_arcs[char_name]:
+                    latest_arc = latest_arcs[char_name][-1]
                     context_parts.append(f"  最近发展: {latest_arc.get('development', '')}")
                     context_parts.append(f"  情感状态: {latest_arc.get('emotional_state', '')}")
         
@@ -203,7 +213,7 @@ class PlotPlannerAgent:
         print(f"📋 开始规划第{current_chapter}章...")
         
         # 获取上下文
-        context = self.get_context_for_planning(current_chapter)
+        context = await self.get_context_for_planning(current_chapter)
         
         # 构建规划提示词
         prompt = f"""
@@ -475,7 +485,7 @@ class ContinuationManager:
         
         # Step 3: 保存到数据库
         print(f"\n💾 Step 3: 保存到数据库...")
-        self._save_to_database(chapter_content)
+        self._save_to_database(chapter_content, outline)
         
         print(f"✅ 已保存到数据库")
         print("=" * 80)
@@ -483,31 +493,38 @@ class ContinuationManager:
         
         return chapter_content
     
-    def _save_to_database(self, chapter: ChapterContent):
-        """保存章节内容到数据库"""
-        
-        # 保存章节信息
-        chapter_id = self.plot_api.add_chapter(
-            chapter_number=chapter.chapter_number,
-            title=chapter.title,
-            summary=chapter.summary,
-            word_count=chapter.word_count,
-            plot_point=chapter.plot_point,
-            key_events=chapter.key_events,
-            character_focus=chapter.character_focus,
-            setting=chapter.setting,
-            mood=chapter.mood,
-            themes=chapter.themes,
-            notes=f"AI续写于{datetime.now().isoformat()}"
-        )
-        
-        # 保存章节完整文本（作为笔记）
-        # 注意：这里只保存到数据库的notes字段，实际文本可以保存到独立文件
-        
-        # 保存角色发展轨迹
-        # TODO: 解析章节内容中的角色发展，保存到character_arcs表
+    def _save_to_database(self, chapter: ChapterContent, outline: Optional[PlotOutline] = None):
+        """保存章节内容到数据库（章节信息、正文、角色轨迹在同一个事务中提交）"""
+        
+        with self.plot_api.session() as session:
+            # 保存章节信息
+            staged = session.add_chapter(
+                chapter_number=chapter.chapter_number,
+                title=chapter.title,
+                summary=chapter.summary,
+                word_count=chapter.word_count,
+                plot_point=chapter.plot_point,
+                key_events=chapter.key_events,
+                character_focus=chapter.character_focus,
+                setting=chapter.setting,
+                mood=chapter.mood,
+                themes=chapter.themes,
+                notes=f"AI续写于{datetime.now().isoformat()}",
+                make_canonical=True
+            )
+            
+            # 保存章节完整正文（压缩存储）
+            session.save_chapter_text(staged, chapter.content)
+            
+            # 保存角色发展轨迹（大纲中的角色变化）
+            if outline:
+                for character_name, development in outline.character_arcs.items():
+                    session.add_character_arc(character_name, staged, development=development)
+            
+            # 新章节改变了包含它的合并摘要
+            session.invalidate_merge_summaries(chapter.chapter_number)
         
-        return chapter_id
+        return staged.id
 
 # ==================== 测试函数 ====================
 